@@ -1,4 +1,6 @@
 import os
+import time
+import uuid
 import streamlit as st
 import requests
 from pages.chat import show_chat_interface
@@ -9,6 +11,58 @@ if hasattr(st, 'secrets') and 'API_URL' in st.secrets:
 else:
     API_URL = os.getenv("API_URL", "http://localhost:8000")
 
+JOB_POLL_INTERVAL = 1.0  # seconds between ingestion progress checks
+
+
+def _ingestion_progress(job: dict):
+    """Map an ingestion job's stage counters to a (fraction, label) for st.progress"""
+    stage = job.get("stage", "queued")
+    if stage == "ingesting":
+        # extraction, chunking and embedding overlap, so track files fully read
+        # and batches stored out of those submitted so far
+        files_read = (
+            job.get("files_extracted", 0) + job.get("files_unchanged", 0)
+        ) / max(job.get("files_total", 1), 1)
+        batches_stored = job.get("batches_upserted", 0) / max(job.get("batches_submitted", 0), 1)
+        fraction = 0.05 + 0.45 * files_read + 0.45 * files_read * batches_stored
+        return fraction, (
+            f"Processed {job.get('pages_extracted', 0)} pages into {job.get('chunks_created', 0)} chunks... "
+            f"{job.get('batches_upserted', 0)} batches stored, "
+            f"{job.get('chunks_unchanged', 0)} unchanged chunks skipped"
+        )
+    if stage == "topic_map":
+        return 0.95, "Grouping your material into topics..."
+    if stage in ("finalizing", "done"):
+        return 0.98, "Finishing up..."
+    if stage == "clearing":
+        return 0.02, "Clearing previous documents..."
+    return 0.0, "Waiting for a worker..."
+
+
+def wait_for_ingestion(job_id: str):
+    """Poll an ingestion job with a progress bar; returns its result, or None on failure"""
+    progress_bar = st.progress(0.0, text="Queued...")
+    
+    while True:
+        response = requests.get(
+            f"{API_URL}/upload/jobs/{job_id}",
+            headers={"X-Workspace-Id": st.session_state.workspace_id},
+            timeout=10
+        )
+        job = response.json().get("job") or {}
+        
+        if job.get("status") == "completed":
+            progress_bar.progress(1.0, text="Done")
+            return job.get("result", {})
+        if job.get("status") == "failed" or not job:
+            progress_bar.empty()
+            st.error(f"Processing failed: {job.get('error', 'job not found')}")
+            return None
+        
+        fraction, label = _ingestion_progress(job)
+        progress_bar.progress(min(fraction, 1.0), text=label)
+        time.sleep(JOB_POLL_INTERVAL)
+
 # Page config
 st.set_page_config(
     page_title="Crammer - AI Study Assistant",
@@ -388,6 +442,11 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Initialize session state
+# Each browser session studies in its own workspace (a separate namespace on the
+# backend); the id is kept in the URL so a refresh doesn't lose the material
+if "workspace_id" not in st.session_state:
+    st.session_state.workspace_id = st.query_params.get("workspace") or uuid.uuid4().hex
+    st.query_params["workspace"] = st.session_state.workspace_id
 if "uploaded" not in st.session_state:
     st.session_state.uploaded = False
 if "current_page" not in st.session_state:
@@ -447,7 +506,7 @@ else:
             st.markdown('<div class="mb-2"></div>', unsafe_allow_html=True)
             
             if st.button("Upload & Process", type="primary"):
-                with st.spinner("Processing documents..."):
+                with st.spinner("Uploading documents..."):
                     try:
                         files = [
                             ("files", (file.name, file.getvalue(), file.type))
@@ -457,11 +516,16 @@ else:
                         response = requests.post(
                             f"{API_URL}/upload/multiple",
                             files=files,
-                            timeout=300
+                            headers={"X-Workspace-Id": st.session_state.workspace_id},
+                            timeout=60
                         )
                         
-                        if response.status_code == 200:
-                            result = response.json()
+                        job_id = response.json().get("job_id") if response.status_code == 200 else None
+                        result = wait_for_ingestion(job_id) if job_id else None
+                        
+                        if response.status_code == 200 and not job_id:
+                            st.error(f"Upload failed: {response.json().get('error')}")
+                        elif result:
                             st.success("✓ Documents processed successfully")
                             
                             col1, col2, col3 = st.columns(3)
@@ -475,7 +539,7 @@ else:
                             st.session_state.uploaded = True
                             st.balloons()
                             st.rerun()
-                        else:
+                        elif response.status_code != 200:
                             st.error(f"Upload failed: {response.status_code}")
                     
                     except Exception as e:
@@ -497,7 +561,11 @@ else:
             if st.button("Clear All", key="clear_all"):
                 with st.spinner("Clearing..."):
                     try:
-                        response = requests.post(f"{API_URL}/clear", timeout=30)
+                        response = requests.post(
+                            f"{API_URL}/clear",
+                            headers={"X-Workspace-Id": st.session_state.workspace_id},
+                            timeout=30
+                        )
                         result = response.json()
                         
                         if result.get("success"):
@@ -505,6 +573,7 @@ else:
                             st.session_state.uploaded = False
                             if "chat_messages" in st.session_state:
                                 st.session_state.chat_messages = []
+                            st.session_state.pop("chat_session_id", None)
                             if "flashcards" in st.session_state:
                                 st.session_state.flashcards = []
                             st.rerun()
@@ -0,0 +1,355 @@
+# bm25_index.py - Local keyword (BM25) index over chunk text, fused with vector search
+#
+# Dense retrieval misses exact terms (formula names, acronyms); BM25 catches them.
+# One inverted index per workspace namespace, filled as chunks are upserted and
+# persisted as JSON (ids + metadata) next to an .npz of the postings and document
+# lengths, so loading doesn't re-tokenize every chunk.
+import os
+import re
+import json
+import math
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from vector_store import _matches, _file_stem, _namespace_for
+
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() in ("1", "true", "yes")
+BM25_INDEX_PATH = os.getenv("BM25_INDEX_PATH", str(Path(__file__).parent / "bm25_index"))
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60  # standard reciprocal rank fusion constant
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this "
+    "to was were which with".split()
+)
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in _STOPWORDS]
+
+
+class _Corpus:
+    """Inverted index of one namespace. Deleted rows are tombstoned until compaction"""
+    
+    def __init__(self):
+        self.ids = []
+        self.metadata = []
+        self.lengths = []
+        self.alive = []
+        self.rows = {}  # vector id -> row
+        self.postings = {}  # term -> ([rows], [term frequencies])
+        self.total_length = 0
+        self.dirty = False
+        self._compiled = {}  # term -> (live rows, tfs, their lengths) as numpy arrays, dropped when the term's rows change
+        self._weights = {}  # term -> ((live docs, total length) scored against, rows, BM25 term scores)
+        self._arrays = None  # (live mask, lengths) as numpy arrays
+    
+    def add(self, vector_id: str, metadata: dict):
+        if vector_id in self.rows:
+            return  # ids are content hashes: same id, same text
+        
+        counts = Counter(tokenize(metadata.get("text", "")))
+        row = len(self.ids)
+        self.rows[vector_id] = row
+        self.ids.append(vector_id)
+        self.metadata.append(metadata)
+        self.lengths.append(sum(counts.values()))
+        self.alive.append(True)
+        self.total_length += self.lengths[row]
+        
+        for term, tf in counts.items():
+            rows, tfs = self.postings.get(term, ([], []))
+            if isinstance(rows, np.ndarray):  # loaded from disk; becomes appendable when first extended
+                rows, tfs = rows.tolist(), tfs.tolist()
+            rows.append(row)
+            tfs.append(tf)
+            self.postings[term] = (rows, tfs)
+            self._compiled.pop(term, None)
+        self._arrays = None
+        self.dirty = True
+    
+    def delete(self, vector_id: str):
+        row = self.rows.pop(vector_id, None)
+        if row is None:
+            return
+        self.alive[row] = False
+        self.total_length -= self.lengths[row]
+        for term in set(tokenize(self.metadata[row].get("text", ""))):
+            self._compiled.pop(term, None)
+        self._arrays = None
+        self.dirty = True
+    
+    @property
+    def live_count(self) -> int:
+        return len(self.rows)
+    
+    def needs_compaction(self) -> bool:
+        return len(self.ids) > 1000 and self.live_count < len(self.ids) // 2
+    
+    def _term_weights(self, term: str):
+        """
+        Rows containing `term` and their BM25 contribution. The term's live rows are
+        compiled once per change to that term; the scores are recomputed (O(rows))
+        only when the document count or average length moved since they were cached.
+        """
+        compiled = self._compiled.get(term)
+        if compiled is None:
+            rows, tfs = self.postings[term]
+            rows, tfs = np.asarray(rows, dtype=np.int64), np.asarray(tfs, dtype=np.float32)
+            alive, lengths = self._arrays
+            live = alive[rows]
+            rows, tfs = rows[live], tfs[live]
+            compiled = (rows, tfs, lengths[rows])
+            self._compiled[term] = compiled
+            self._weights.pop(term, None)
+        
+        stamp = (self.live_count, self.total_length)
+        cached = self._weights.get(term)
+        if cached is None or cached[0] != stamp:
+            rows, tfs, lengths = compiled
+            n_docs, df = self.live_count, len(rows)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            avg_length = max(self.total_length / n_docs, 1.0)
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / avg_length)
+            cached = (stamp, rows, (idf * tfs * (BM25_K1 + 1) / (tfs + norm)).astype(np.float32))
+            self._weights[term] = cached
+        return cached[1], cached[2]
+    
+    def search(self, terms: List[str], top_k: int, filter: Optional[dict] = None) -> List[dict]:
+        if self.live_count == 0:
+            return []
+        if self._arrays is None:
+            self._arrays = (np.asarray(self.alive, dtype=bool), np.asarray(self.lengths, dtype=np.float32))
+        
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in set(terms):
+            if term in self.postings:
+                rows, weights = self._term_weights(term)
+                scores[rows] += weights
+        
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) == 0:
+            return []
+        
+        # Rank a generous slice, then apply the (Python-level) metadata filter to it
+        window = min(len(candidates), top_k * 20 if filter else top_k)
+        best = candidates[np.argpartition(-scores[candidates], window - 1)[:window]]
+        best = best[np.argsort(-scores[best])]
+        
+        results = []
+        for row in best:
+            if filter and not _matches(self.metadata[row], filter):
+                continue
+            results.append({"id": self.ids[row], "score": float(scores[row]), "metadata": self.metadata[row]})
+            if len(results) == top_k:
+                break
+        return results
+
+
+class BM25Index:
+    """
+    Per-namespace BM25 keyword index, mirroring what is upserted to the vector
+    store. Writes stay in memory until flush() rewrites `{namespace}.json` and
+    `{namespace}.npz`.
+    """
+    
+    def __init__(self, path: str = BM25_INDEX_PATH):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._corpora: Dict[str, _Corpus] = {}
+        self._lock = threading.Lock()
+    
+    def add(self, vectors: List[dict], namespace: str = ""):
+        """Index upserted vectors ({"id", "metadata": {"text", ...}}) by their text"""
+        with self._lock:
+            corpus = self._get(namespace)
+            for vector in vectors:
+                corpus.add(vector["id"], dict(vector.get("metadata") or {}))
+    
+    def delete(self, ids: Iterable[str], namespace: str = ""):
+        with self._lock:
+            corpus = self._get(namespace)
+            for vector_id in ids:
+                corpus.delete(vector_id)
+            if corpus.needs_compaction():
+                self._corpora[namespace] = self._rebuild(
+                    [(corpus.ids[row], corpus.metadata[row]) for row in corpus.rows.values()]
+                )
+    
+    def delete_namespace(self, namespace: str = ""):
+        with self._lock:
+            self._corpora[namespace] = _Corpus()
+            for file in self._files(namespace):
+                if file.exists():
+                    file.unlink()
+    
+    def search(self, query: str, top_k: int, namespace: str = "",
+               filter: Optional[dict] = None) -> List[dict]:
+        """Top-k chunks by BM25 score: [{"id", "score", "metadata"}], best first"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            return self._get(namespace).search(terms, top_k, filter)
+    
+    def sample_texts(self, limit: int, namespace: str = "", sources: Optional[List[str]] = None) -> List[str]:
+        """Up to `limit` chunk texts spread evenly over the namespace (optionally only `sources`)"""
+        with self._lock:
+            corpus = self._get(namespace)
+            rows = [
+                row for row in sorted(corpus.rows.values())
+                if not sources or corpus.metadata[row].get("source") in sources
+            ]
+            step = max(1, len(rows) // max(limit, 1))
+            return [corpus.metadata[row].get("text", "") for row in rows[::step][:limit]]
+    
+    def count(self, namespace: str = "") -> int:
+        with self._lock:
+            return self._get(namespace).live_count
+    
+    def flush(self):
+        with self._lock:
+            for namespace, corpus in self._corpora.items():
+                if corpus.dirty:
+                    self._save(namespace, corpus)
+                    corpus.dirty = False
+    
+    def _get(self, namespace: str) -> _Corpus:
+        """Namespace corpus, loaded from disk on first use; caller holds the lock"""
+        corpus = self._corpora.get(namespace)
+        if corpus is None:
+            corpus = self._load(namespace)
+            self._corpora[namespace] = corpus
+        return corpus
+    
+    def _rebuild(self, docs) -> _Corpus:
+        corpus = _Corpus()
+        for vector_id, metadata in docs:
+            corpus.add(vector_id, metadata)
+        return corpus
+    
+    def warm(self):
+        """
+        Load every namespace persisted on disk (run at startup, in the background).
+        Loading happens outside the lock, so searches of loaded namespaces aren't held up.
+        """
+        for file in self.path.glob("*.json"):
+            namespace = _namespace_for(file.stem)
+            with self._lock:
+                if namespace in self._corpora:
+                    continue
+            corpus = self._load(namespace)
+            with self._lock:
+                self._corpora.setdefault(namespace, corpus)
+    
+    def _files(self, namespace: str):
+        stem = _file_stem(namespace)
+        return self.path / f"{stem}.json", self.path / f"{stem}.npz"
+    
+    def _load(self, namespace: str) -> _Corpus:
+        file, postings_file = self._files(namespace)
+        if not file.exists():
+            return _Corpus()
+        
+        try:
+            with open(file, encoding="utf-8") as f:
+                data = json.load(f)
+            corpus = self._load_postings(postings_file, data)
+            if corpus is None:  # no (matching) postings file: re-tokenize the chunk texts
+                corpus = self._rebuild(zip(data["ids"], data["metadata"]))
+            corpus.dirty = False
+            print(f"✅ Loaded BM25 index for '{namespace or 'default'}' ({corpus.live_count} chunks)")
+            return corpus
+        except Exception as e:
+            print(f"⚠️ Could not load BM25 index for '{namespace or 'default'}': {e}")
+            return _Corpus()
+    
+    @staticmethod
+    def _load_postings(postings_file: Path, data: dict) -> Optional[_Corpus]:
+        if not postings_file.exists():
+            return None
+        with np.load(postings_file, allow_pickle=False) as arrays:
+            if arrays["ids"].tolist() != data["ids"]:
+                return None  # written by an interrupted save
+            terms, offsets = arrays["terms"].tolist(), arrays["offsets"]
+            rows, tfs, lengths = arrays["rows"], arrays["tfs"], arrays["lengths"]
+        
+        corpus = _Corpus()
+        corpus.ids = data["ids"]
+        corpus.metadata = data["metadata"]
+        corpus.lengths = lengths.tolist()
+        corpus.alive = [True] * len(corpus.ids)
+        corpus.rows = {vector_id: row for row, vector_id in enumerate(corpus.ids)}
+        corpus.total_length = int(lengths.sum())
+        corpus.postings = {
+            term: (rows[offsets[i]:offsets[i + 1]], tfs[offsets[i]:offsets[i + 1]])
+            for i, term in enumerate(terms)
+        }
+        return corpus
+    
+    def _save(self, namespace: str, corpus: _Corpus):
+        rows = sorted(corpus.rows.values())
+        data = {
+            "ids": [corpus.ids[row] for row in rows],
+            "metadata": [corpus.metadata[row] for row in rows]
+        }
+        
+        # Postings of the live rows, renumbered to their position in `data`, as CSR arrays
+        new_row = np.full(len(corpus.ids), -1, dtype=np.int64)
+        new_row[rows] = np.arange(len(rows))
+        terms = list(corpus.postings)
+        term_rows = [np.asarray(corpus.postings[term][0], dtype=np.int64) for term in terms]
+        all_rows = new_row[np.concatenate(term_rows)] if terms else np.empty(0, dtype=np.int64)
+        all_tfs = np.concatenate([np.asarray(corpus.postings[term][1], dtype=np.int32) for term in terms]) \
+            if terms else np.empty(0, dtype=np.int32)
+        term_index = np.repeat(np.arange(len(terms)), [len(term_row) for term_row in term_rows])
+        keep = all_rows >= 0
+        counts = np.bincount(term_index[keep], minlength=len(terms))
+        
+        file, postings_file = self._files(namespace)
+        try:
+            with open(f"{postings_file}.tmp", "wb") as f:
+                np.savez(
+                    f,
+                    ids=np.array(data["ids"], dtype=str),
+                    terms=np.array([term for term, count in zip(terms, counts) if count], dtype=str),
+                    offsets=np.concatenate([[0], np.cumsum(counts[counts > 0])]).astype(np.int64),
+                    rows=all_rows[keep].astype(np.int32),
+                    tfs=all_tfs[keep],
+                    lengths=np.array([corpus.lengths[row] for row in rows], dtype=np.int32)
+                )
+            with open(f"{file}.tmp", "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(f"{postings_file}.tmp", postings_file)
+            os.replace(f"{file}.tmp", file)
+        except Exception as e:
+            print(f"⚠️ Could not persist BM25 index for '{namespace or 'default'}': {e}")
+
+
+def reciprocal_rank_fusion(result_lists: List[List[dict]], top_k: int, k: int = RRF_K) -> List[dict]:
+    """
+    Merge ranked result lists ({"id", "metadata", ...}) by reciprocal rank fusion:
+    score = sum over lists of 1 / (k + rank). Returns the top_k fused results.
+    """
+    fused = {}
+    for results in result_lists:
+        for rank, match in enumerate(results, start=1):
+            entry = fused.setdefault(match["id"], {"id": match["id"], "score": 0.0, "metadata": match["metadata"]})
+            entry["score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda entry: entry["score"], reverse=True)[:top_k]
+
+
+def get_bm25_index() -> BM25Index:
+    """The process-wide keyword index, shared by ingestion and retrieval"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = BM25Index(BM25_INDEX_PATH)
+        return _index
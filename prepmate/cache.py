@@ -0,0 +1,232 @@
+# cache.py - In-process caches for the RAG engine
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+import numpy as np
+
+
+# Bumped whenever a workspace's vectors change (upload or clear) so cached answers
+# that were generated from its old material are never served. Counted per
+# workspace, so one user's upload doesn't invalidate everyone else's cache.
+_index_generations = {}
+_generation_lock = threading.Lock()
+
+
+def get_index_generation(workspace: str = "") -> int:
+    return _index_generations.get(workspace, 0)
+
+
+def bump_index_generation(workspace: str = "") -> int:
+    """Mark a workspace's vectors as changed; invalidates its semantic cache entries"""
+    with _generation_lock:
+        _index_generations[workspace] = _index_generations.get(workspace, 0) + 1
+        return _index_generations[workspace]
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query so trivial variations share a cache entry"""
+    return " ".join(query.lower().split())
+
+
+class EmbeddingCache:
+    """
+    Bounded LRU + TTL cache of normalized query -> embedding vector. With a
+    persist_path, a background thread saves it every `persist_interval` seconds
+    when it changed, as one NumPy .npz file (keys, timestamps, float32 vectors).
+    """
+    
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 86400,
+                 persist_path: Optional[str] = None, persist_interval: float = 60):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.persist_path = persist_path
+        self.persist_interval = persist_interval
+        
+        self._entries = OrderedDict()  # key -> (timestamp, vector)
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        
+        if persist_path:
+            self._load()
+            threading.Thread(target=self._save_periodically, name="embed-cache-save", daemon=True).start()
+    
+    def get(self, query: str) -> Optional[List[float]]:
+        """Return the cached vector for a query, or None on miss/expiry"""
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[0] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+    
+    def peek(self, query: str) -> bool:
+        """Whether a query has a live entry; unlike get, not counted as a hit or miss"""
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and time.time() - entry[0] <= self.ttl_seconds
+    
+    def put(self, query: str, vector: List[float]):
+        """Store a query vector, evicting the least recently used entry if full"""
+        key = normalize_query(query)
+        with self._lock:
+            self._entries[key] = (time.time(), list(vector))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._dirty = True
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._dirty = True
+    
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+    
+    def save(self):
+        """Persist the cache entries to the configured .npz file"""
+        if not self.persist_path:
+            return
+        
+        with self._lock:
+            entries = list(self._entries.items())
+            self._dirty = False
+        
+        try:
+            tmp_path = f"{self.persist_path}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    keys=np.array([key for key, _ in entries], dtype=str),
+                    timestamps=np.array([ts for _, (ts, _) in entries], dtype=np.float64),
+                    vectors=np.array([vec for _, (_, vec) in entries], dtype=np.float32)
+                )
+            os.replace(tmp_path, self.persist_path)
+        except Exception as e:
+            print(f"⚠️ Could not persist embedding cache: {e}")
+    
+    def _save_periodically(self):
+        while True:
+            time.sleep(self.persist_interval)
+            if self._dirty:
+                self.save()
+    
+    def _load(self):
+        if not os.path.exists(self.persist_path):
+            return
+        
+        try:
+            with np.load(self.persist_path, allow_pickle=False) as data:
+                keys, timestamps, vectors = data["keys"], data["timestamps"], data["vectors"]
+            now = time.time()
+            for key, ts, vec in list(zip(keys, timestamps, vectors))[-self.max_size:]:
+                if now - ts <= self.ttl_seconds:
+                    self._entries[str(key)] = (float(ts), vec.tolist())
+            print(f"✅ Loaded {len(self._entries)} cached query embeddings")
+        except Exception as e:
+            print(f"⚠️ Could not load embedding cache: {e}")
+
+
+class SemanticAnswerCache:
+    """
+    Cache of LLM answers keyed by query embedding. A lookup hits when a cached
+    query of the same mode and workspace is within `threshold` cosine similarity
+    and was answered against the workspace's current index generation.
+    """
+    
+    def __init__(self, threshold: float = 0.95, max_size: int = 256):
+        self.threshold = threshold
+        self.max_size = max_size
+        
+        self._entries = []  # (mode, workspace, generation, result) - rows match self._vectors
+        self._vectors = None  # unit-normalized query embeddings, one row per entry
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, mode: str, vector: List[float], generation: int, workspace: str = ""):
+        """Return (result, similarity) for the closest matching answer, or None"""
+        query = _unit(vector)
+        with self._lock:
+            self._drop_stale(generation, workspace)
+            
+            if self._vectors is not None and len(self._entries) > 0:
+                scores = self._vectors @ query
+                for i in np.argsort(-scores):
+                    if scores[i] < self.threshold:
+                        break
+                    if self._entries[i][0] == mode and self._entries[i][1] == workspace:
+                        self.hits += 1
+                        return self._entries[i][3], float(scores[i])
+            
+            self.misses += 1
+            return None
+    
+    def put(self, mode: str, vector: List[float], generation: int, result: dict, workspace: str = ""):
+        """Cache an answer; ignored if the workspace changed while it was generated"""
+        with self._lock:
+            if generation != get_index_generation(workspace):
+                return
+            
+            row = _unit(vector)[np.newaxis, :]
+            self._entries.append((mode, workspace, generation, result))
+            self._vectors = row if self._vectors is None else np.vstack([self._vectors, row])
+            
+            if len(self._entries) > self.max_size:
+                overflow = len(self._entries) - self.max_size
+                self._entries = self._entries[overflow:]
+                self._vectors = self._vectors[overflow:]
+    
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._vectors = None
+    
+    def stats(self, workspace: str = "") -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "threshold": self.threshold,
+                "index_generation": get_index_generation(workspace),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+    
+    def _drop_stale(self, generation: int, workspace: str):
+        """Evict a workspace's answers generated against its older index (caller holds the lock)"""
+        keep = [
+            i for i, entry in enumerate(self._entries)
+            if entry[1] != workspace or entry[2] == generation
+        ]
+        if len(keep) == len(self._entries):
+            return
+        
+        self._entries = [self._entries[i] for i in keep]
+        self._vectors = self._vectors[keep] if keep else None
+
+
+def _unit(vector: List[float]) -> np.ndarray:
+    v = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(v)
+    return v / norm if norm > 0 else v
@@ -0,0 +1,227 @@
+# card_store.py - Persistent flashcards with SM-2 spaced-repetition scheduling
+#
+# Generated cards are saved per workspace in SQLite, so a browser refresh doesn't
+# cost a new LLM generation: students review the cards that are due, and the LLM
+# is only called for topics that have no cards yet. Due cards are read through an
+# index on (workspace, due_at), so fetching the next k is O(log n + k).
+#
+# Each workspace has a material version, bumped by ingestion whenever its chunks
+# change. Cards remember the version they were generated from and are only reused
+# for a topic while it is current (their review schedule is kept either way).
+import os
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+CARD_STORE_PATH = os.getenv("CARD_STORE_PATH", str(Path(__file__).parent / "flashcards.db"))
+
+# SM-2 parameters
+SM2_INITIAL_EASE = 2.5
+SM2_MIN_EASE = 1.3
+SM2_PASS_QUALITY = 3  # grades 0-5; below this the card lapses
+LAPSE_DELAY = 10 * 60  # a forgotten card comes back after 10 minutes, then restarts at 1 day
+
+DAY = 24 * 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cards (
+    id INTEGER PRIMARY KEY,
+    workspace TEXT NOT NULL,
+    topic TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+    front TEXT NOT NULL,
+    back TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    due_at REAL NOT NULL,
+    interval_days REAL NOT NULL DEFAULT 0,
+    ease REAL NOT NULL DEFAULT 2.5,
+    repetitions INTEGER NOT NULL DEFAULT 0,
+    lapses INTEGER NOT NULL DEFAULT 0,
+    reviewed_at REAL,
+    material_version INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (workspace, front)
+);
+CREATE TABLE IF NOT EXISTS materials (
+    workspace TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS cards_due ON cards (workspace, due_at);
+CREATE INDEX IF NOT EXISTS cards_topic ON cards (workspace, topic);
+"""
+
+_COLUMNS = "id, topic, front, back, due_at, interval_days, ease, repetitions, lapses, reviewed_at"
+
+_card_store = None
+_card_store_lock = threading.Lock()
+
+
+def normalize_topic(topic: Optional[str]) -> str:
+    """Topics match case-insensitively (the column is NOCASE) with whitespace collapsed"""
+    return " ".join((topic or "").split())
+
+
+def sm2_schedule(quality: int, repetitions: int, interval_days: float, ease: float):
+    """
+    One SM-2 step. Returns (repetitions, interval_days, ease, seconds until due).
+    A failed recall resets the repetitions and is retried after LAPSE_DELAY.
+    """
+    ease = max(SM2_MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    if quality < SM2_PASS_QUALITY:
+        return 0, 0.0, ease, LAPSE_DELAY
+    
+    if repetitions == 0:
+        interval_days = 1.0
+    elif repetitions == 1:
+        interval_days = 6.0
+    else:
+        interval_days = round(interval_days * ease, 1)
+    return repetitions + 1, interval_days, ease, interval_days * DAY
+
+
+class CardStore:
+    """Thread-safe SQLite store of flashcards and their review schedule"""
+    
+    def __init__(self, path: str = CARD_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+    
+    @staticmethod
+    def _card(row) -> dict:
+        card = dict(row)
+        card["topic"] = card["topic"] or None
+        return card
+    
+    def add_cards(self, workspace: str, cards: List[dict], topic: Optional[str] = None) -> List[dict]:
+        """
+        Save new cards (due immediately) and return them with their ids. A card whose
+        front is already stored in the workspace keeps its existing id and schedule,
+        moves to the new topic (if one is given) and is marked as generated from
+        the current material.
+        """
+        if not cards:
+            return []
+        now = time.time()
+        fronts = [card["front"] for card in cards]
+        with self._lock:
+            version = self._material_version(workspace)
+            self._db.executemany(
+                "INSERT INTO cards (workspace, topic, front, back, created_at, due_at, ease, material_version) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (workspace, front) DO UPDATE SET material_version = excluded.material_version, "
+                "topic = COALESCE(NULLIF(excluded.topic, ''), topic)",
+                [
+                    (workspace, normalize_topic(card.get("topic") or topic), card["front"], card["back"],
+                     now, now, SM2_INITIAL_EASE, version)
+                    for card in cards
+                ]
+            )
+            self._db.commit()
+            rows = {
+                row["front"]: row for row in self._db.execute(
+                    f"SELECT {_COLUMNS} FROM cards WHERE workspace = ? AND front IN ({','.join('?' * len(fronts))})",
+                    [workspace, *fronts]
+                )
+            }
+        return [self._card(rows[card["front"]]) for card in cards if card["front"] in rows]
+    
+    def cards_for_topic(self, workspace: str, topic: str, limit: int) -> List[dict]:
+        """Stored cards generated for this topic from the current material, oldest first"""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {_COLUMNS} FROM cards WHERE workspace = ? AND topic = ? AND material_version = ? "
+                "ORDER BY id LIMIT ?",
+                (workspace, normalize_topic(topic), self._material_version(workspace), limit)
+            ).fetchall()
+        return [self._card(row) for row in rows]
+    
+    def due_cards(self, workspace: str, limit: int = 20, now: Optional[float] = None) -> List[dict]:
+        """The cards due for review, most overdue first (an index range scan)"""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {_COLUMNS} FROM cards WHERE workspace = ? AND due_at <= ? ORDER BY due_at LIMIT ?",
+                (workspace, time.time() if now is None else now, limit)
+            ).fetchall()
+        return [self._card(row) for row in rows]
+    
+    def review(self, workspace: str, card_id: int, quality: int) -> Optional[dict]:
+        """Record a review graded 0-5 and reschedule the card; None if it doesn't exist"""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT repetitions, interval_days, ease, lapses FROM cards WHERE workspace = ? AND id = ?",
+                (workspace, card_id)
+            ).fetchone()
+            if row is None:
+                return None
+            
+            repetitions, interval_days, ease, delay = sm2_schedule(
+                quality, row["repetitions"], row["interval_days"], row["ease"]
+            )
+            self._db.execute(
+                "UPDATE cards SET repetitions = ?, interval_days = ?, ease = ?, lapses = ?, "
+                "due_at = ?, reviewed_at = ? WHERE id = ?",
+                (repetitions, interval_days, ease, row["lapses"] + (quality < SM2_PASS_QUALITY),
+                 now + delay, now, card_id)
+            )
+            self._db.commit()
+            updated = self._db.execute(f"SELECT {_COLUMNS} FROM cards WHERE id = ?", (card_id,)).fetchone()
+        return self._card(updated)
+    
+    def stats(self, workspace: str) -> dict:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT COUNT(*) AS total, "
+                "COALESCE(SUM(due_at <= ?), 0) AS due, "
+                "COALESCE(SUM(repetitions > 0), 0) AS learned, "
+                "MIN(due_at) AS next_due_at "
+                "FROM cards WHERE workspace = ?",
+                (time.time(), workspace)
+            ).fetchone()
+        return dict(row)
+    
+    def delete_card(self, workspace: str, card_id: int) -> bool:
+        with self._lock:
+            deleted = self._db.execute(
+                "DELETE FROM cards WHERE workspace = ? AND id = ?", (workspace, card_id)
+            ).rowcount
+            self._db.commit()
+        return deleted > 0
+    
+    def bump_material(self, workspace: str) -> int:
+        """Mark a workspace's material as changed; its topics' cards get regenerated on request"""
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO materials (workspace, version) VALUES (?, 1) "
+                "ON CONFLICT (workspace) DO UPDATE SET version = version + 1",
+                (workspace,)
+            )
+            self._db.commit()
+            return self._material_version(workspace)
+    
+    def _material_version(self, workspace: str) -> int:
+        """Current material version of a workspace (caller holds the lock)"""
+        row = self._db.execute("SELECT version FROM materials WHERE workspace = ?", (workspace,)).fetchone()
+        return row["version"] if row else 0
+    
+    def delete_workspace(self, workspace: str) -> int:
+        """Forget every card of a workspace; returns how many were removed"""
+        with self._lock:
+            deleted = self._db.execute("DELETE FROM cards WHERE workspace = ?", (workspace,)).rowcount
+            self._db.commit()
+        return deleted
+
+
+def get_card_store() -> CardStore:
+    """The process-wide card store"""
+    global _card_store
+    with _card_store_lock:
+        if _card_store is None:
+            _card_store = CardStore()
+            print(f"🗃️ Flashcard store: {CARD_STORE_PATH}")
+        return _card_store
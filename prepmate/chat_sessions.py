@@ -0,0 +1,142 @@
+# chat_sessions.py - Server-side chat sessions: a sliding window of recent turns + a rolling summary
+#
+# The client sends only the new message and its session id. Each session keeps
+# the most recent messages verbatim (at most SESSION_WINDOW_MESSAGES, within
+# HISTORY_TOKEN_BUDGET). When the window fills up, its oldest SESSION_SUMMARY_BATCH
+# messages are folded into an LLM-written summary before they can slide out, so
+# every message is in the prompt either verbatim or summarized and the history
+# part of every prompt stays roughly constant in size.
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from context_packer import HISTORY_TOKEN_BUDGET, MESSAGE_OVERHEAD_TOKENS, count_tokens
+
+SESSION_WINDOW_MESSAGES = int(os.getenv("SESSION_WINDOW_MESSAGES", "8"))  # 4 exchanges kept verbatim
+SESSION_SUMMARY_BATCH = int(os.getenv("SESSION_SUMMARY_BATCH", "4"))  # messages folded per summary call
+SESSION_SUMMARY_WORDS = 200
+MAX_SESSIONS = int(os.getenv("MAX_CHAT_SESSIONS", "1000"))
+SESSION_TTL = float(os.getenv("CHAT_SESSION_TTL", str(24 * 3600)))
+
+
+class ChatSession:
+    """One conversation: rolling summary of older turns + the recent messages"""
+    
+    def __init__(self, session_id: str, workspace: str):
+        self.session_id = session_id
+        self.workspace = workspace
+        self.summary = ""
+        self.messages = []  # recent {"role", "content"} messages, oldest first
+        self.turns = 0
+        self.summarized_messages = 0
+        self.updated_at = time.time()
+        self.summarizing = False  # one summary call at a time per session
+        self._lock = threading.Lock()
+    
+    def _window_start(self) -> int:
+        """Index of the oldest message still in the sliding window (caller holds the lock)"""
+        start = max(0, len(self.messages) - SESSION_WINDOW_MESSAGES)
+        used = 0
+        for index in range(len(self.messages) - 1, start - 1, -1):
+            used += count_tokens(self.messages[index]["content"]) + MESSAGE_OVERHEAD_TOKENS
+            if used > HISTORY_TOKEN_BUDGET:
+                return index + 1
+        return start
+    
+    def prompt_history(self) -> Tuple[str, List[dict]]:
+        """(summary of older turns, recent messages in the window) for the next prompt"""
+        with self._lock:
+            return self.summary, self.messages[self._window_start():]
+    
+    def add_turn(self, message: str, response: str):
+        with self._lock:
+            self.messages.append({"role": "user", "content": message})
+            self.messages.append({"role": "assistant", "content": response})
+            self.turns += 1
+            self.updated_at = time.time()
+    
+    def claim_overflow(self) -> Optional[List[dict]]:
+        """
+        Reserve the oldest messages for summarizing once the window is full: at
+        least SESSION_SUMMARY_BATCH, and every message that already slid out of
+        the window (a long message can push several out at once). None while
+        the window has room or a summary is already running.
+        """
+        with self._lock:
+            overflow = self._window_start()
+            full = len(self.messages) >= SESSION_WINDOW_MESSAGES
+            if self.summarizing or not (overflow or full):
+                return None
+            self.summarizing = True
+            return self.messages[:max(overflow, min(SESSION_SUMMARY_BATCH, len(self.messages)))]
+    
+    def fold(self, summary: Optional[str], folded: List[dict]):
+        """Replace the claimed messages with the new summary (keep them if summarizing failed)"""
+        with self._lock:
+            if summary:
+                self.summary = summary
+                self.messages = self.messages[len(folded):]
+                self.summarized_messages += len(folded)
+            self.summarizing = False
+    
+    def info(self) -> dict:
+        with self._lock:
+            return {
+                "session_id": self.session_id,
+                "turns": self.turns,
+                "window_messages": len(self.messages),
+                "summarized_messages": self.summarized_messages,
+                "summary": self.summary,
+                "updated_at": self.updated_at
+            }
+
+
+class ChatSessionStore:
+    """Bounded LRU + TTL registry of chat sessions, keyed by (workspace, session id)"""
+    
+    def __init__(self, max_sessions: int = MAX_SESSIONS, ttl_seconds: float = SESSION_TTL):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get_or_create(self, session_id: Optional[str], workspace: str) -> ChatSession:
+        """
+        The caller's session, or a fresh one (with a new id) when `session_id` is
+        missing, unknown or expired. Sessions are only visible inside their workspace.
+        """
+        with self._lock:
+            key = (workspace, session_id)
+            session = self._sessions.get(key) if session_id else None
+            if session is not None and time.time() - session.updated_at > self.ttl_seconds:
+                del self._sessions[key]
+                session = None
+            
+            if session is None:
+                session = ChatSession(session_id or uuid.uuid4().hex, workspace)
+                key = (workspace, session.session_id)
+                self._sessions[key] = session
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            self._sessions.move_to_end(key)
+            return session
+    
+    def get(self, session_id: str, workspace: str) -> Optional[ChatSession]:
+        with self._lock:
+            return self._sessions.get((workspace, session_id))
+    
+    def delete(self, session_id: str, workspace: str) -> bool:
+        with self._lock:
+            return self._sessions.pop((workspace, session_id), None) is not None
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+
+def format_transcript(messages: List[dict]) -> str:
+    """Render messages as "Student: ..." / "Tutor: ..." lines for the summary prompt"""
+    names = {"user": "Student", "assistant": "Tutor"}
+    return "\n".join(f"{names.get(m['role'], m['role'])}: {m['content']}" for m in messages)
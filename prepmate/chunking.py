@@ -0,0 +1,85 @@
+# chunking.py - Incremental text splitting for the streaming ingestion pipeline
+from typing import Iterable, Iterator, List
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+SPLIT_WINDOW = 16 * CHUNK_SIZE  # characters buffered before the splitter runs
+
+
+def iter_chunks(pages: Iterable[dict], chunk_size: int = CHUNK_SIZE,
+                overlap: int = CHUNK_OVERLAP, window: int = SPLIT_WINDOW) -> Iterator[dict]:
+    """
+    Split a stream of page records ({"doc_index", "source", "page", "text"}) into
+    overlapping chunks without materializing the whole corpus.
+    
+    Page text is appended to a buffer of ~`window` characters; once full, the buffer
+    is split and every chunk except the last (which may continue on the next page)
+    is emitted. The last chunk becomes the start of the next buffer, so memory stays
+    bounded by the window. Chunks never span documents, and each chunk records the
+    page it starts on: {"text", "source", "page", "doc_index"}.
+    """
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=overlap,
+        add_start_index=True
+    )
+    
+    buffer = ""
+    page_starts = []  # (offset in buffer, page number), ascending
+    current_doc = None
+    source = None
+    
+    def split(final: bool):
+        nonlocal buffer, page_starts
+        docs = splitter.create_documents([buffer])
+        if not final and len(docs) > 1:
+            keep_from = docs[-1].metadata["start_index"]
+            docs = docs[:-1]
+        else:
+            keep_from = len(buffer)
+        
+        for doc in docs:
+            start = doc.metadata["start_index"]
+            page = page_starts[0][1]
+            for offset, page_number in page_starts:
+                if offset > start:
+                    break
+                page = page_number
+            yield {"text": doc.page_content, "source": source, "page": page, "doc_index": current_doc}
+        
+        # Carry the unfinished tail (and the pages it spans) into the next window
+        buffer = buffer[keep_from:]
+        carried = [(offset - keep_from, page) for offset, page in page_starts if offset >= keep_from]
+        last_before = [page for offset, page in page_starts if offset < keep_from]
+        if last_before and (not carried or carried[0][0] > 0):
+            carried.insert(0, (0, last_before[-1]))
+        page_starts = carried
+    
+    for record in pages:
+        if record["doc_index"] != current_doc:
+            if buffer.strip():
+                yield from split(final=True)
+            buffer, page_starts = "", []
+            current_doc, source = record["doc_index"], record["source"]
+        
+        page_starts.append((len(buffer), record["page"]))
+        buffer += record["text"] + "\n"
+        
+        if len(buffer) >= window:
+            yield from split(final=False)
+    
+    if buffer.strip():
+        yield from split(final=True)
+
+
+def iter_batches(items: Iterable, batch_size: int) -> Iterator[List]:
+    """Group a stream into lists of at most batch_size items"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
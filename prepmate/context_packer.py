@@ -0,0 +1,136 @@
+# context_packer.py - Token-aware packing of retrieved chunks and chat history into prompts
+#
+# Retrieval returns chunks best-first; overlapping neighbours (the splitter keeps
+# CHUNK_OVERLAP characters in common) are trimmed, and chunks are added by
+# relevance until the mode's token budget is spent. A final guard keeps every
+# prompt inside the model's context window.
+import os
+from typing import List, Tuple
+from chunking import CHUNK_OVERLAP
+
+# Context tokens per mode (a 1000-character chunk is ~250 tokens)
+CONTEXT_BUDGETS = {
+    "teaching": int(os.getenv("CONTEXT_BUDGET_TEACHING", "1200")),
+    "qa": int(os.getenv("CONTEXT_BUDGET_QA", "800")),  # k=3 chunks of ~250 tokens
+    "flashcards": int(os.getenv("CONTEXT_BUDGET_FLASHCARDS", "2000")),
+    "chat": int(os.getenv("CONTEXT_BUDGET_CHAT", "1000")),
+}
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1000"))
+LLM_CONTEXT_WINDOW = int(os.getenv("LLM_CONTEXT_WINDOW", "131072"))  # llama-3.1-8b-instant
+RESPONSE_TOKEN_RESERVE = int(os.getenv("RESPONSE_TOKEN_RESERVE", "2048"))
+MESSAGE_OVERHEAD_TOKENS = 4  # role + separators per chat message
+MIN_OVERLAP = 32  # shorter shared text is coincidence, not splitter overlap
+
+try:
+    import tiktoken
+    # Llama 3's tokenizer is tiktoken-based; cl100k_base is a close stand-in
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken when installed, else a ~4 characters/token estimate"""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def count_message_tokens(messages: List[dict]) -> int:
+    return sum(count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+
+def _overlap(before: str, after: str) -> int:
+    """Length of the longest suffix of `before` that is a prefix of `after` (splitter overlap)"""
+    head = after[:MIN_OVERLAP]
+    if len(head) < MIN_OVERLAP:
+        return 0
+    tail_start = max(0, len(before) - CHUNK_OVERLAP - MIN_OVERLAP)
+    position = before.find(head, tail_start)
+    while position != -1:
+        if after.startswith(before[position:]):
+            return len(before) - position
+        position = before.find(head, position + 1)
+    return 0
+
+
+def dedupe_chunks(chunks: List[str]) -> List[str]:
+    """
+    Drop chunks already contained in a better-ranked one and trim the text a
+    chunk shares with an adjacent, better-ranked chunk. Keeps relevance order.
+    """
+    kept = []
+    for text in chunks:
+        text = text.strip()
+        if not text or any(text in other for other in kept):
+            continue
+        for other in kept:
+            shared = _overlap(other, text)  # `other` precedes this chunk
+            if shared:
+                text = text[shared:].strip()
+            shared = _overlap(text, other)  # `other` follows this chunk
+            if shared:
+                text = text[:-shared].strip()
+        if text:
+            kept.append(text)
+    return kept
+
+
+def pack_context(chunks: List[str], budget: int) -> Tuple[str, int]:
+    """
+    Fill `budget` tokens with deduplicated chunks in relevance order, skipping
+    any that don't fit. Returns (context joined by blank lines, chunks used).
+    """
+    packed = []
+    used = 0
+    for text in dedupe_chunks(chunks):
+        tokens = count_tokens(text)
+        if used + tokens > budget:
+            continue
+        packed.append(text)
+        used += tokens
+    print(f"📦 Packed {len(packed)}/{len(chunks)} chunks into {used}/{budget} context tokens")
+    return "\n\n".join(packed), len(packed)
+
+
+def trim_history(history: List[dict], budget: int = HISTORY_TOKEN_BUDGET) -> List[dict]:
+    """The most recent chat messages that fit in `budget` tokens, oldest first"""
+    kept = []
+    used = 0
+    for message in reversed(history or []):
+        tokens = count_tokens(message.get("content", "")) + MESSAGE_OVERHEAD_TOKENS
+        if used + tokens > budget:
+            break
+        kept.append(message)
+        used += tokens
+    return kept[::-1]
+
+
+def fit_to_window(messages: List[dict], window: int = LLM_CONTEXT_WINDOW,
+                  reserve: int = RESPONSE_TOKEN_RESERVE) -> List[dict]:
+    """
+    Last-resort guard: drop the oldest history messages, then truncate the final
+    user message, until the prompt leaves `reserve` tokens of the window for the reply.
+    """
+    limit = window - reserve
+    messages = list(messages)
+    total = count_message_tokens(messages)
+    
+    # keep the system prompt (first) and the current turn (last)
+    while total > limit and len(messages) > 2:
+        dropped = messages.pop(1)
+        total -= count_tokens(dropped["content"]) + MESSAGE_OVERHEAD_TOKENS
+    
+    if total > limit:
+        last = messages[-1]
+        excess = total - limit
+        content = last["content"]
+        # trim by the estimated characters per token, then re-check
+        while excess > 0 and content:
+            content = content[:max(0, len(content) - 4 * excess)]
+            excess = count_message_tokens(messages[:-1]) + count_tokens(content) + MESSAGE_OVERHEAD_TOKENS - limit
+        messages[-1] = {**last, "content": content}
+        print(f"⚠️ Prompt truncated to fit the {window}-token context window")
+    return messages
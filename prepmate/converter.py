@@ -1,14 +1,24 @@
 # converter.py - Using Pinecone Inference API with llama-text-embed-v2 (1024d)
 import os
-from typing import List
+from typing import Iterable, List, Tuple
 from fastapi import UploadFile
-from io import BytesIO
 from dotenv import load_dotenv
-from PyPDF2 import PdfReader
-from unstructured.partition.auto import partition
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from pinecone import Pinecone, ServerlessSpec
+from pinecone import Pinecone
 import time
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from cache import bump_index_generation
+from jobs import create_job, run_in_background
+from extraction import extract_pages
+from chunking import iter_chunks, iter_batches
+from manifest import get_manifest, file_hash, chunk_hash, vector_id_for
+from workspaces import DEFAULT_WORKSPACE
+from vector_store import VECTOR_STORE, INDEX_NAME, get_vector_store
+from embeddings import EMBEDDER, get_embedder
+from bm25_index import get_bm25_index
+from topic_map import TOPIC_MAP, build_topic_map, get_topic_maps, sample_ids
+from card_store import get_card_store
 
 # Load environment variables
 from pathlib import Path
@@ -16,228 +26,328 @@ load_dotenv(dotenv_path=Path(__file__).parent / ".env")
 
 # Configuration
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
-INDEX_NAME = "crammer"
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "96"))  # chunks per embed + upsert batch
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "4"))  # batches in flight
+MAX_BATCH_RETRIES = int(os.getenv("INGEST_MAX_RETRIES", "3"))
+RETRY_BASE_DELAY = 1.0  # seconds, doubled on every retry
+DELETE_BATCH_SIZE = 1000  # Pinecone limit per delete-by-id call
 
-# Validate API key
-if not PINECONE_API_KEY:
-    raise ValueError("❌ PINECONE_API_KEY not found! Create a .env file with your API key.")
+_store = None
+_embedder = None
+_backend_lock = threading.Lock()
+_workspace_locks = {}
+_workspace_locks_guard = threading.Lock()
 
-print(f"✅ API Key loaded: {PINECONE_API_KEY[:10]}...")
 
-# Initialize Pinecone
-pc = Pinecone(api_key=PINECONE_API_KEY)
+def _backend():
+    """
+    (vector store, embedder), connected on first use rather than at import so
+    bench_ingestion.py can drive the pipeline without an API key
+    """
+    global _store, _embedder
+    with _backend_lock:
+        if _store is None:
+            pc = None
+            if "pinecone" in (VECTOR_STORE, EMBEDDER):  # fully local setups need no API key
+                if not PINECONE_API_KEY:
+                    raise ValueError("❌ PINECONE_API_KEY not found! Create a .env file with your API key.")
+                print(f"✅ API Key loaded: {PINECONE_API_KEY[:10]}...")
+                pc = Pinecone(api_key=PINECONE_API_KEY)
+            
+            if VECTOR_STORE == "pinecone" and INDEX_NAME not in pc.list_indexes().names():
+                raise ValueError(f"❌ Index '{INDEX_NAME}' not found! Please create it in Pinecone dashboard first.")
+            print(f"✅ Vector store '{VECTOR_STORE}' ready (index '{INDEX_NAME}')")
+            store = get_vector_store(pc)
+            print(f"  Current vectors: {store.total_count()}")
+            
+            _embedder = get_embedder(pc)
+            print(f"✅ Using embedder {_embedder.name}")
+            _store = store
+        return _store, _embedder
 
-# Create index if it doesn't exist
-if INDEX_NAME not in pc.list_indexes().names():
-    raise ValueError(f"❌ Index '{INDEX_NAME}' not found! Please create it in Pinecone dashboard first.")
-else:
-    print(f"✅ Index '{INDEX_NAME}' found!")
-    index = pc.Index(INDEX_NAME)
-    stats = index.describe_index_stats()
-    print(f"  Current vectors: {stats.get('total_vector_count', 0)}")
 
-print("✅ Using Pinecone Inference API (llama-text-embed-v2, 1024d) - No local embeddings!")
+# Keyword index mirroring the vector store, for hybrid (BM25 + dense) retrieval
+keyword_index = get_bm25_index()
+topic_maps = get_topic_maps()
+card_store = get_card_store()
 
 
-def clear_pinecone_index():
-    """Delete all vectors from Pinecone index"""
+def _workspace_lock(workspace: str) -> threading.Lock:
+    """
+    The lock serializing writes to one workspace. Ingestion jobs share a worker
+    pool, so two uploads to the same workspace would otherwise race on its
+    manifest and stale-chunk deletion.
+    """
+    with _workspace_locks_guard:
+        return _workspace_locks.setdefault(workspace, threading.Lock())
+
+
+def clear_pinecone_index(workspace: str = DEFAULT_WORKSPACE):
+    """Delete all vectors of one workspace; other workspaces' namespaces are untouched"""
     try:
-        print("🗑️ Clearing Pinecone index...")
-        index = pc.Index(INDEX_NAME)
+        print(f"🗑️ Clearing workspace '{workspace or 'default'}'...")
+        store = _backend()[0]
+        manifest = get_manifest(workspace)
         
-        stats = index.describe_index_stats()
-        vector_count = stats.get('total_vector_count', 0)
+        # describe_index_stats is eventually consistent: a fresh upload may still
+        # count 0, so only trust it when the manifest doesn't know any vectors either
+        vector_count = max(store.count(workspace), len(manifest.vector_ids()))
         
         if vector_count == 0:
-            print("✅ Index already empty")
+            keyword_index.delete_namespace(workspace)
+            topic_maps.delete(workspace)
+            card_store.delete_workspace(workspace)
+            manifest.clear()
+            print("✅ Workspace already empty")
             return True
         
         print(f"Deleting {vector_count} vectors...")
-        index.delete(delete_all=True)
-        
-        # Verify deletion
-        time.sleep(3)
-        stats = index.describe_index_stats()
-        remaining = stats.get('total_vector_count', 0)
-        
-        if remaining == 0:
-            print("✅ Cleared all vectors from Pinecone")
-            return True
-        else:
-            print(f"⚠️ Still {remaining} vectors remaining")
-            return False
+        store.delete_namespace(workspace)
+        store.flush()
+        keyword_index.delete_namespace(workspace)
+        topic_maps.delete(workspace)
+        card_store.delete_workspace(workspace)
+        manifest.clear()
+        bump_index_generation(workspace)
         
+        # delete_all is acknowledged once applied; stats may lag a few seconds
+        print("✅ Cleared the workspace's vectors")
+        return True
+    
     except Exception as e:
         print(f"❌ Error clearing Pinecone: {e}")
         return False
 
 
-async def extract_text_from_files(files: List[UploadFile]) -> str:
-    """Extract raw text from multiple uploaded files"""
-    print(f"📄 Extracting text from {len(files)} file(s)...")
-    all_texts = []
+async def read_upload_files(files: List[UploadFile]) -> List[Tuple[str, bytes]]:
+    """Read uploaded files into (filename, bytes) pairs for the ingestion pipeline"""
+    return [(file.filename, await file.read()) for file in files]
 
-    for file in files:
-        print(f"  Processing: {file.filename}")
-        file_bytes = await file.read()
-        
+
+def _with_retries(fn, description: str):
+    """Call fn, retrying with exponential backoff; re-raises the last error"""
+    for attempt in range(MAX_BATCH_RETRIES + 1):
         try:
-            if file.filename.lower().endswith('.pdf'):
-                buffer = BytesIO(file_bytes)
-                pdf_reader = PdfReader(buffer)
-                
-                text = ""
-                for page_num, page in enumerate(pdf_reader.pages):
-                    page_text = page.extract_text()
-                    text += page_text + "\n"
-                    print(f"    Page {page_num + 1}: {len(page_text)} characters")
-                
-                all_texts.append(text)
-                print(f"  ✅ Extracted {len(text)} characters from {file.filename}")
-            
-            else:
-                buffer = BytesIO(file_bytes)
-                elements = partition(file=buffer)
-                text = "\n".join([el.text for el in elements if getattr(el, "text", "")])
-                all_texts.append(text)
-                print(f"  ✅ Extracted {len(text)} characters from {file.filename}")
-        
+            return fn()
         except Exception as e:
-            print(f"  ❌ Error processing {file.filename}: {e}")
+            if attempt == MAX_BATCH_RETRIES:
+                raise
+            delay = RETRY_BASE_DELAY * (2 ** attempt)
+            print(f"  ⚠️ {description} failed ({e}), retrying in {delay:.0f}s...")
+            time.sleep(delay)
 
-    combined_text = "\n".join(all_texts)
-    print(f"📊 Total extracted: {len(combined_text)} characters")
-    return combined_text
 
+def upload_chunks_pipelined(store, chunks: Iterable, source_filename: str, on_progress=None,
+                            workspace: str = DEFAULT_WORKSPACE, embedder=None) -> dict:
+    """
+    Embed and upsert chunks in batches as a two-stage pipeline:
+    embedding of later batches overlaps with upserting of earlier ones, at most
+    INGEST_CONCURRENCY batches are in flight (back-pressure), and each stage is
+    retried with backoff.
+    
+    `chunks` may be a list or a lazy stream of chunk strings / chunk records
+    ({"text", "page", "id", "source", "chunk_index", ...}); the stream is only
+    advanced when a batch slot frees up, so memory is bounded by
+    INGEST_CONCURRENCY * EMBED_BATCH_SIZE chunks. Records without an "id" get
+    `{source_filename}-{n}`. `embedder` defaults to the configured one.
+    """
+    embedder = embedder or _backend()[1]
+    print(f"  Pipeline: batches of {EMBED_BATCH_SIZE}, {INGEST_CONCURRENCY} in flight")
+    report = on_progress or (lambda **fields: None)
+    report(batches_submitted=0, batches_upserted=0, vectors_upserted=0)
+    
+    slots = threading.BoundedSemaphore(INGEST_CONCURRENCY)
+    progress_lock = threading.Lock()
+    progress = {"uploaded": 0, "batches": 0, "sample_ids": []}
+    
+    def upsert_stage(batch_num: int, vectors_to_upsert: list) -> int:
+        try:
+            upserted = _with_retries(
+                lambda: store.upsert(vectors_to_upsert, namespace=workspace),
+                f"Upsert of batch {batch_num}"
+            )
+            keyword_index.add(vectors_to_upsert, workspace)
+            bump_index_generation(workspace)
+            with progress_lock:
+                progress["uploaded"] += upserted
+                # first + last id of each batch is enough for the verification sample
+                progress["sample_ids"].extend({vectors_to_upsert[0]["id"], vectors_to_upsert[-1]["id"]})
+                progress["batches"] += 1
+                uploaded = progress["uploaded"]
+                report(batches_upserted=progress["batches"], vectors_upserted=uploaded)
+            print(f"  ✅ Batch {batch_num} uploaded ({uploaded} total)")
+            return upserted
+        finally:
+            slots.release()
+    
+    def embed_stage(batch_num: int, start: int, batch_records: List[dict]):
+        try:
+            embeddings = _with_retries(
+                lambda: embedder.embed_passages([record["text"] for record in batch_records]),
+                f"Embedding of batch {batch_num}"
+            )
+        except Exception:
+            slots.release()
+            raise
+        
+        # Prepare vectors for upload
+        vectors_to_upsert = []
+        for j, (record, values) in enumerate(zip(batch_records, embeddings)):
+            chunk = record["text"]
+            metadata = {
+                "text": chunk,
+                "source": record.get("source") or source_filename,
+                "chunk_index": record.get("chunk_index", start + j),
+                "chunk_length": len(chunk)
+            }
+            if record.get("page") is not None:
+                metadata["page"] = record["page"]
+            vectors_to_upsert.append({
+                "id": record.get("id") or f"{source_filename}-{start + j}",
+                "values": values,
+                "metadata": metadata
+            })
+        
+        # Hand off to the upsert stage; this worker is free to embed the next batch
+        return upsert_pool.submit(upsert_stage, batch_num, vectors_to_upsert)
+    
+    records = (chunk if isinstance(chunk, dict) else {"text": chunk} for chunk in chunks)
+    batches = iter_batches(records, EMBED_BATCH_SIZE)
+    
+    embed_futures = []
+    chunks_seen = 0
+    with ThreadPoolExecutor(max_workers=INGEST_CONCURRENCY, thread_name_prefix="embed") as embed_pool, \
+         ThreadPoolExecutor(max_workers=INGEST_CONCURRENCY, thread_name_prefix="upsert") as upsert_pool:
+        for batch_num in itertools.count(1):
+            slots.acquire()  # wait until a batch leaves the pipeline before pulling more input
+            batch_records = next(batches, None)
+            if batch_records is None:
+                slots.release()
+                break
+            
+            print(f"  Processing batch {batch_num} ({len(batch_records)} chunks)...")
+            embed_futures.append(
+                (batch_num, embed_pool.submit(embed_stage, batch_num, chunks_seen, batch_records))
+            )
+            chunks_seen += len(batch_records)
+            report(chunks_created=chunks_seen, batches_submitted=batch_num)
+        
+        total_uploaded = 0
+        failed_batches = []
+        for batch_num, embed_future in embed_futures:
+            try:
+                total_uploaded += embed_future.result().result()
+            except Exception as batch_error:
+                print(f"  ❌ Batch {batch_num} failed: {batch_error}")
+                failed_batches.append(batch_num)
+    
+    return {
+        "chunks": chunks_seen,
+        "vectors_upserted": total_uploaded,
+        "failed_batches": failed_batches,
+        "sample_ids": progress["sample_ids"]
+    }
 
-def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
-    """Split text into smaller overlapping chunks"""
-    print(f"✂️ Chunking text (size={chunk_size}, overlap={overlap})...")
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=overlap
-    )
-    chunks = splitter.split_text(text)
-    print(f"✅ Created {len(chunks)} chunks")
-    return chunks
+
+def verify_upload(store, vector_ids: List[str], sample_size: int = 100, timeout: float = 60,
+                  workspace: str = DEFAULT_WORKSPACE) -> dict:
+    """
+    Background consistency check: fetch a sample of the upserted ids until they are
+    all readable from the store (Pinecone is eventually consistent for reads).
+    """
+    step = max(1, len(vector_ids) // sample_size)
+    sample = vector_ids[::step][:sample_size]
+    if not sample:
+        return {"verified": True, "sampled": 0, "found": 0}
+    
+    deadline = time.time() + timeout
+    delay = 0.5
+    found = 0
+    while True:
+        found = len(store.fetch(sample, namespace=workspace))
+        if found == len(sample):
+            print(f"✅ Upload verified: {found}/{len(sample)} sampled vectors readable")
+            return {"verified": True, "sampled": len(sample), "found": found}
+        if time.time() + delay > deadline:
+            break
+        time.sleep(delay)
+        delay = min(delay * 2, 8)
+    
+    print(f"⚠️ Upload verification timed out: {found}/{len(sample)} sampled vectors readable")
+    return {"verified": False, "sampled": len(sample), "found": found}
 
 
-def store_in_pinecone(chunks: List[str], source_filename: str = "unknown"):
+def store_in_pinecone(chunks: Iterable, source_filename: str = "unknown", verify: bool = True,
+                      on_progress=None, workspace: str = DEFAULT_WORKSPACE):
     """
-    Converts chunks to embeddings using Pinecone Inference API and uploads to Pinecone
+    Converts chunks to embeddings using Pinecone Inference API and uploads to Pinecone.
+    `chunks` may be a list or a lazy stream (see upload_chunks_pipelined).
+    Returns as soon as every batch is acknowledged; if `verify` is set, a background
+    job confirms the vectors are queryable (see /upload/jobs/{job_id}).
     """
+    store, embedder = _backend()
     print(f"\n{'='*60}")
     print(f"🔄 STARTING PINECONE UPLOAD")
     print(f"{'='*60}")
-    print(f"  Chunks to upload: {len(chunks)}")
-    print(f"  Index name: {INDEX_NAME}")
-    print(f"  Embedding model: llama-text-embed-v2 (1024d)")
+    if hasattr(chunks, "__len__"):
+        print(f"  Chunks to upload: {len(chunks)}")
+    print(f"  Vector store: {VECTOR_STORE} (index {INDEX_NAME})")
+    print(f"  Embedding model: {embedder.name}")
     print(f"  Source: {source_filename}")
-    
-    if len(chunks) == 0:
-        print("⚠️ No chunks to store!")
-        return None
+    print(f"  Workspace: {workspace or 'default'}")
     
     try:
-        # Get index reference
-        index = pc.Index(INDEX_NAME)
-        
-        # Check index before upload
-        print(f"\n📊 BEFORE UPLOAD:")
-        stats_before = index.describe_index_stats()
-        vectors_before = stats_before.get('total_vector_count', 0)
-        print(f"  Existing vectors: {vectors_before}")
-        
         # Upload vectors using Pinecone Inference API
         print(f"\n🚀 UPLOADING WITH PINECONE INFERENCE API...")
         
-        # Batch process chunks (96 at a time - llama-text-embed-v2 limit)
-        batch_size = 96
-        total_uploaded = 0
-        
-        for i in range(0, len(chunks), batch_size):
-            batch_chunks = chunks[i:i + batch_size]
-            batch_num = (i // batch_size) + 1
-            total_batches = (len(chunks) + batch_size - 1) // batch_size
-            
-            print(f"  Processing batch {batch_num}/{total_batches} ({len(batch_chunks)} chunks)...")
-            
-            try:
-                # Generate embeddings using Pinecone Inference API
-                embeddings_response = pc.inference.embed(
-                    model="llama-text-embed-v2",
-                    inputs=batch_chunks,
-                    parameters={"input_type": "passage", "truncate": "END"}
-                )
-                
-                # Prepare vectors for upload
-                vectors_to_upsert = []
-                for j, (chunk, embedding) in enumerate(zip(batch_chunks, embeddings_response)):
-                    vector_id = f"{source_filename}-{i + j}"
-                    vectors_to_upsert.append({
-                        "id": vector_id,
-                        "values": embedding.values,
-                        "metadata": {
-                            "text": chunk,
-                            "source": source_filename,
-                            "chunk_index": i + j,
-                            "chunk_length": len(chunk)
-                        }
-                    })
-                
-                # Upsert to Pinecone
-                index.upsert(vectors=vectors_to_upsert)
-                total_uploaded += len(vectors_to_upsert)
-                print(f"  ✅ Batch {batch_num} uploaded ({total_uploaded}/{len(chunks)} total)")
-                
-            except Exception as batch_error:
-                print(f"  ⚠️ Error in batch {batch_num}: {batch_error}")
-                continue
+        uploaded = upload_chunks_pipelined(store, chunks, source_filename, on_progress, workspace)
+        total_chunks = uploaded["chunks"]
+        total_uploaded = uploaded["vectors_upserted"]
         
-        print(f"\n  Upload completed! {total_uploaded} vectors uploaded.")
+        if total_chunks == 0:
+            print("⚠️ No chunks to store!")
+            return {"chunks_created": 0, "vectors_upserted": 0, "verification_job_id": None}
         
-        # Wait and verify
-        print(f"\n⏳ VERIFYING UPLOAD (checking every 2 seconds)...")
-        max_attempts = 10
-        for attempt in range(max_attempts):
-            time.sleep(2)
-            stats = index.describe_index_stats()
-            vectors_now = stats.get('total_vector_count', 0)
-            new_vectors = vectors_now - vectors_before
-            
-            print(f"  Attempt {attempt+1}/{max_attempts}: {vectors_now} total ({new_vectors} new)")
-            
-            if new_vectors >= total_uploaded:
-                print(f"\n✅ SUCCESS! All {new_vectors} vectors uploaded!")
-                return True
-            elif new_vectors > 0:
-                print(f"  ⏳ Partial upload detected, waiting...")
+        if uploaded["failed_batches"]:
+            raise Exception(
+                f"{len(uploaded['failed_batches'])} batch(es) failed after {MAX_BATCH_RETRIES} retries "
+                f"(batches {uploaded['failed_batches']}); {total_uploaded}/{total_chunks} vectors uploaded"
+            )
         
-        # Final check
-        stats_final = index.describe_index_stats()
-        total_vectors = stats_final.get('total_vector_count', 0)
-        new_vectors = total_vectors - vectors_before
+        print(f"\n  Upload completed! {total_uploaded} vectors uploaded.")
         
+        # Upsert responses are the source of truth: each batch reports how many
+        # vectors Pinecone durably wrote, so no need to poll index stats here
         print(f"\n{'='*60}")
         print(f"📊 FINAL STATUS:")
-        print(f"  Expected: {len(chunks)} vectors")
-        print(f"  Uploaded: {new_vectors} vectors")
-        print(f"  Total in index: {total_vectors}")
+        print(f"  Expected: {total_chunks} vectors")
+        print(f"  Upserted: {total_uploaded} vectors")
         print(f"{'='*60}\n")
         
-        if total_vectors == 0:
+        if total_uploaded == 0:
             raise Exception(
-                "❌ CRITICAL: No vectors in Pinecone after upload!\n"
+                "❌ CRITICAL: Pinecone acknowledged no vectors!\n"
                 "Possible causes:\n"
                 "1. Invalid Pinecone API key\n"
                 "2. Wrong index name\n"
                 "3. Insufficient permissions\n"
                 "Please check your Pinecone dashboard at https://app.pinecone.io"
             )
-        elif new_vectors < len(chunks):
-            print(f"⚠️ WARNING: Only {new_vectors}/{len(chunks)} vectors uploaded")
+        elif total_uploaded < total_chunks:
+            print(f"⚠️ WARNING: Only {total_uploaded}/{total_chunks} vectors upserted")
         
-        return True
+        verification_job_id = None
+        if verify:
+            verification_job_id = create_job("verify_upload", source=source_filename, workspace=workspace)
+            run_in_background(
+                verification_job_id, verify_upload, store, uploaded["sample_ids"], workspace=workspace
+            )
+        
+        return {
+            "chunks_created": total_chunks,
+            "vectors_upserted": total_uploaded,
+            "verification_job_id": verification_job_id
+        }
     
     except Exception as e:
         print(f"\n❌ ERROR DURING UPLOAD:")
@@ -247,85 +357,266 @@ def store_in_pinecone(chunks: List[str], source_filename: str = "unknown"):
         raise
 
 
-async def process_uploaded_files(files: List[UploadFile], clear_existing: bool = True):
+def delete_vectors(store, vector_ids: List[str], workspace: str = DEFAULT_WORKSPACE) -> int:
+    """Delete vectors by id in batches; returns how many ids were removed"""
+    vector_ids = list(vector_ids)
+    for i in range(0, len(vector_ids), DELETE_BATCH_SIZE):
+        batch = vector_ids[i:i + DELETE_BATCH_SIZE]
+        _with_retries(lambda: store.delete(batch, namespace=workspace), "Delete of stale vectors")
+    keyword_index.delete(vector_ids, workspace)
+    if vector_ids:
+        bump_index_generation(workspace)
+    return len(vector_ids)
+
+
+def list_sources(workspace: str = DEFAULT_WORKSPACE) -> dict:
+    """Every file ingested into a workspace with its hash, chunk count and last update time"""
+    return get_manifest(workspace).sources()
+
+
+def delete_source(filename: str, workspace: str = DEFAULT_WORKSPACE):
+    """
+    Remove one uploaded file's vectors from the index using the ids recorded in the
+    manifest. Returns the number of vectors deleted, or None if the file is unknown.
+    """
+    with _workspace_lock(workspace):
+        manifest = get_manifest(workspace)
+        entry = manifest.get_source(filename)
+        if entry is None:
+            return None
+        
+        print(f"🗑️ Deleting {len(entry['chunks'])} vectors of {filename}...")
+        store = _backend()[0]
+        deleted = delete_vectors(store, entry["chunks"].values(), workspace)
+        store.flush()
+        keyword_index.flush()
+        manifest.remove_source(filename)
+        card_store.bump_material(workspace)
+        rebuild_topic_map(workspace)
+    print(f"✅ Removed {filename} from the index")
+    return deleted
+
+
+def rebuild_topic_map(workspace: str = DEFAULT_WORKSPACE):
+    """
+    Re-cluster the workspace's chunks into its topic map (see topic_map.py).
+    At most TOPIC_MAP_MAX_CHUNKS chunks are sampled; their vectors are read back
+    from the vector store. Failures are logged - the map is an optimization.
+    """
+    if not TOPIC_MAP:
+        return None
+    try:
+        started = time.time()
+        store = _backend()[0]
+        ids = sample_ids(get_manifest(workspace).vector_ids())
+        if not ids:
+            topic_maps.delete(workspace)
+            return None
+        
+        topic_map = build_topic_map(store.fetch_vectors(ids, workspace))
+        topic_maps.save(workspace, topic_map)
+        print(f"🧭 Topic map: {len(topic_map['topics'])} topics from {topic_map['chunks']} chunks "
+              f"({time.time() - started:.1f}s)")
+        return topic_map
+    except Exception as e:
+        print(f"⚠️ Could not build the topic map: {e}")
+        return None
+
+
+def _new_chunks_only(chunks: Iterable[dict], manifest, seen: dict, counts: dict, report) -> Iterable[dict]:
+    """
+    Give every chunk a content-derived id and drop the ones that are already in the
+    index: chunks the manifest recorded for the same file, and repeats within this
+    upload. `seen` collects {source: {chunk hash: vector id}} for the manifest.
+    """
+    indexed = {}  # source -> chunk hashes the manifest already has for it
+    for record in chunks:
+        source = record["source"]
+        digest = chunk_hash(source, record["text"])
+        vector_id = vector_id_for(digest)
+        source_chunks = seen.setdefault(source, {})
+        counts["total"] += 1
+        
+        if digest in source_chunks:
+            counts["duplicate"] += 1
+            continue
+        source_chunks[digest] = vector_id
+        
+        if source not in indexed:
+            previous = manifest.get_source(source)
+            indexed[source] = previous["chunks"] if previous else {}
+        if digest in indexed[source]:
+            counts["unchanged"] += 1
+            report(chunks_unchanged=counts["unchanged"])
+            continue
+        
+        record["id"] = vector_id
+        record["chunk_index"] = len(source_chunks) - 1
+        yield record
+
+
+def ingest_documents(documents: List[Tuple[str, bytes]], clear_existing: bool = False, on_progress=None,
+                     workspace: str = DEFAULT_WORKSPACE):
     """
     Orchestrates the entire ingestion flow:
-    clear (optional) → extract → chunk → embed → store
+    clear (optional) → skip unchanged files → extract → chunk → dedupe → embed → store
+    → delete stale chunks → topic map
+    
+    The stages are a generator chain: pages stream out of the extraction pool into
+    the incremental splitter and straight into embedding batches, so peak memory
+    is bounded by the batch pipeline rather than the size of the corpus.
+    
+    Ingestion is incremental: files whose bytes match the manifest are skipped,
+    chunk ids are content hashes so only new/changed chunks are embedded, and
+    chunks that disappeared from a re-uploaded file are deleted from the index.
+    
+    Everything is scoped to `workspace`: vectors go to its Pinecone namespace and
+    dedup uses its own manifest, so users sharing the index never see or clear
+    each other's material.
+    
+    Blocking; run it in a worker thread. `on_progress(**fields)` receives the
+    current stage and per-stage counters as they change. Runs for the same
+    workspace are serialized; a run waiting for another reports stage "waiting".
     """
+    lock = _workspace_lock(workspace)
+    if not lock.acquire(blocking=False):
+        (on_progress or (lambda **fields: None))(stage="waiting")
+        print(f"⏳ Waiting for another ingestion into workspace {workspace or 'default'}...")
+        lock.acquire()
+    try:
+        return _ingest_documents(documents, clear_existing, on_progress, workspace)
+    finally:
+        lock.release()
+
+
+def _ingest_documents(documents: List[Tuple[str, bytes]], clear_existing: bool, on_progress,
+                      workspace: str):
+    """ingest_documents, with the workspace lock held"""
+    report = on_progress or (lambda **fields: None)
+    store = _backend()[0]
+    manifest = get_manifest(workspace)
+    
     print("\n" + "=" * 70)
     print(f"🚀 INGESTION PIPELINE START")
-    print(f"   Files: {len(files)}")
+    print(f"   Files: {len(documents)}")
+    print(f"   Workspace: {workspace or 'default'}")
     print(f"   Clear existing: {clear_existing}")
     print("=" * 70)
     
     # Step 0: Clear existing vectors if requested
     if clear_existing:
-        clear_pinecone_index()
-        time.sleep(3)
+        report(stage="clearing")
+        clear_pinecone_index(workspace)
     
-    # Step 1: Extract text
-    print("\n📖 STEP 1: EXTRACT TEXT")
-    raw_text = await extract_text_from_files(files)
+    # A later file with the same name replaces an earlier one in the same upload
+    by_name = {filename: file_bytes for filename, file_bytes in documents}
+    file_hashes = {filename: file_hash(file_bytes) for filename, file_bytes in by_name.items()}
+    changed = [
+        (filename, file_bytes) for filename, file_bytes in by_name.items()
+        if not manifest.is_unchanged(filename, file_hashes[filename])
+    ]
+    files_unchanged = len(by_name) - len(changed)
+    if files_unchanged:
+        print(f"⏭️ Skipping {files_unchanged} unchanged file(s)")
     
-    if len(raw_text) == 0:
-        print("❌ No text extracted from files!")
-        return {
-            "message": "No text could be extracted from the files",
-            "files_processed": len(files),
-            "chunks_created": 0,
-            "total_vectors_in_index": 0,
-            "index_name": INDEX_NAME
-        }
-
-    # Step 2: Chunk
-    print("\n✂️ STEP 2: CHUNK TEXT")
-    chunks = chunk_text(raw_text)
+    # Steps 1-3: Extract → Chunk → Embed + Store, streamed
+    print("\n📖 STEPS 1-3: EXTRACT → CHUNK → STORE IN PINECONE (streaming)")
+    report(stage="ingesting", files_total=len(documents), files_unchanged=files_unchanged,
+           files_extracted=0, pages_extracted=0, chunks_created=0, chunks_unchanged=0)
+    # Every chunk record carries its own file name; this label is only for logs
+    source_name = ", ".join(filename for filename, _ in changed) or "unknown"
     
-    if len(chunks) == 0:
-        print("❌ No chunks created!")
-        return {
-            "message": "Failed to create chunks",
-            "files_processed": len(files),
-            "chunks_created": 0,
-            "total_vectors_in_index": 0,
-            "index_name": INDEX_NAME
-        }
-
-    # Step 3: Embed + Store in Pinecone
-    print("\n💾 STEP 3: STORE IN PINECONE")
-    source_name = files[0].filename if files else "unknown"
+    files_done = itertools.count(1)
+    
+    def on_file_done(filename: str, characters: int, pages: int):
+        print(f"  ✅ Extracted {characters} characters ({pages} pages) from {filename}")
+        report(files_extracted=next(files_done))
+    
+    def tracked_pages():
+        for pages_extracted, page in enumerate(extract_pages(changed, on_file_done), start=1):
+            report(pages_extracted=pages_extracted)
+            yield page
+    
+    seen = {}
+    counts = {"total": 0, "duplicate": 0, "unchanged": 0}
+    chunks = _new_chunks_only(iter_chunks(tracked_pages()), manifest, seen, counts, report)
     
     try:
-        store_in_pinecone(chunks, source_name)
+        stored = store_in_pinecone(chunks, source_name, on_progress=on_progress, workspace=workspace)
     except Exception as e:
         print(f"❌ Failed to store in Pinecone: {e}")
         return {
             "message": f"Error storing in Pinecone: {str(e)}",
-            "files_processed": len(files),
-            "chunks_created": len(chunks),
+            "files_processed": len(documents),
+            "chunks_created": 0,
             "total_vectors_in_index": 0,
             "index_name": INDEX_NAME,
             "error": str(e)
         }
-
-    # Step 4: Get final stats
-    print("\n📊 STEP 4: FINAL VERIFICATION")
-    index = pc.Index(INDEX_NAME)
-    stats = index.describe_index_stats()
-    total_vectors = stats.get('total_vector_count', 0)
+    
+    if counts["total"] == 0 and files_unchanged == 0:
+        print("❌ No text extracted from files!")
+        return {
+            "message": "No text could be extracted from the files",
+            "files_processed": len(documents),
+            "chunks_created": 0,
+            "total_vectors_in_index": 0,
+            "index_name": INDEX_NAME
+        }
+    
+    # Step 4: Drop chunks that are no longer in the re-uploaded files, then record
+    # what each file now contains. Files that yielded no text keep their old entry.
+    vectors_deleted = 0
+    for filename, new_chunks in seen.items():
+        previous = manifest.get_source(filename)
+        if previous is not None:
+            stale = set(previous["chunks"].values()) - set(new_chunks.values())
+            if stale:
+                print(f"🧹 Removing {len(stale)} stale chunk(s) of {filename}")
+                vectors_deleted += delete_vectors(store, stale, workspace)
+    
+    # Local stores persist here; only then does the manifest claim the chunks exist
+    store.flush()
+    keyword_index.flush()
+    for filename, new_chunks in seen.items():
+        manifest.record_source(filename, file_hashes[filename], new_chunks)
+    
+    # Step 5: Cluster the workspace into topics when its chunks changed
+    if stored["vectors_upserted"] or vectors_deleted:
+        card_store.bump_material(workspace)
+    topic_map = topic_maps.get(workspace)
+    if stored["vectors_upserted"] or vectors_deleted or topic_map is None:
+        report(stage="topic_map")
+        topic_map = rebuild_topic_map(workspace)
+    
+    # Step 6: Get final stats
+    # Stats are eventually consistent and may not include this upload yet;
+    # the verification job reports when the new vectors are readable
+    print("\n📊 STEP 6: INDEX STATS")
+    report(stage="finalizing")
+    total_vectors = max(store.count(workspace), stored["vectors_upserted"])
     
     print("=" * 70)
     print(f"✅ INGESTION COMPLETE")
-    print(f"   Files processed: {len(files)}")
-    print(f"   Chunks created: {len(chunks)}")
-    print(f"   Vectors in Pinecone: {total_vectors}")
+    print(f"   Files processed: {len(documents)} ({files_unchanged} unchanged)")
+    print(f"   Chunks created: {counts['total']}")
+    print(f"   Chunks unchanged: {counts['unchanged']}")
+    print(f"   Vectors upserted: {stored['vectors_upserted']}")
+    print(f"   Vectors deleted: {vectors_deleted}")
+    print(f"   Vectors in workspace: {total_vectors}")
     print("=" * 70 + "\n")
 
     return {
         "message": "Files processed successfully!",
-        "files_processed": len(files),
-        "chunks_created": len(chunks),
+        "files_processed": len(documents),
+        "files_unchanged": files_unchanged,
+        "chunks_created": counts["total"],
+        "chunks_unchanged": counts["unchanged"] + counts["duplicate"],
+        "vectors_upserted": stored["vectors_upserted"],
+        "vectors_deleted": vectors_deleted,
         "total_vectors_in_index": total_vectors,
         "index_name": INDEX_NAME,
-        "previous_vectors_cleared": clear_existing
-    }
\ No newline at end of file
+        "previous_vectors_cleared": clear_existing,
+        "topics": len(topic_map["topics"]) if topic_map else 0,
+        "verification_job_id": stored["verification_job_id"]
+    }
@@ -0,0 +1,155 @@
+# embeddings.py - Pluggable text embedders: Pinecone Inference (default) or a local CPU model
+#
+# Select with EMBEDDER=pinecone|local. The local backend loads a
+# sentence-transformers model once per process (optionally with the ONNX
+# runtime) and embeds in batches on the CPU, so ingestion isn't bound by the
+# remote inference API's rate limits.
+#
+# Note: the vector store must match the embedder's dimension - the local
+# default (all-MiniLM-L6-v2) is 384d, while the `crammer` Pinecone index is
+# 1024d, so pair EMBEDDER=local with VECTOR_STORE=local or a 384d index.
+import os
+import time
+import threading
+from typing import List
+
+EMBEDDER = os.getenv("EMBEDDER", "pinecone").lower()
+PINECONE_EMBED_MODEL = "llama-text-embed-v2"
+PINECONE_EMBED_BATCH_SIZE = 96  # llama-text-embed-v2 limit per embed call
+LOCAL_EMBED_MODEL = os.getenv("LOCAL_EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+LOCAL_EMBED_BACKEND = os.getenv("LOCAL_EMBED_BACKEND", "torch")  # or "onnx"
+LOCAL_EMBED_BATCH_SIZE = int(os.getenv("LOCAL_EMBED_BATCH_SIZE", "64"))
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+class Embedder:
+    """Base class: subclasses implement _embed(texts, input_type); this tracks throughput"""
+    
+    name = "embedder"
+    
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            kind: {"calls": 0, "texts": 0, "seconds": 0.0}
+            for kind in ("passage", "query")
+        }
+    
+    def embed_passages(self, texts: List[str]) -> List[List[float]]:
+        """Embed document chunks for storage"""
+        return self._timed(texts, "passage")
+    
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed several search queries in one call"""
+        return self._timed(texts, "query")
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_queries([text])[0]
+    
+    def stats(self) -> dict:
+        """Calls, texts and throughput (texts/second of embedding time) per input type"""
+        with self._stats_lock:
+            result = {"embedder": self.name}
+            for kind, counters in self._stats.items():
+                seconds = counters["seconds"]
+                result[kind] = {
+                    **counters,
+                    "seconds": round(seconds, 3),
+                    "texts_per_second": round(counters["texts"] / seconds, 1) if seconds else 0.0,
+                    "avg_call_ms": round(1000 * seconds / counters["calls"], 1) if counters["calls"] else 0.0
+                }
+            return result
+    
+    def _timed(self, texts: List[str], input_type: str) -> List[List[float]]:
+        if not texts:
+            return []
+        
+        started = time.perf_counter()
+        vectors = self._embed(texts, input_type)
+        elapsed = time.perf_counter() - started
+        
+        with self._stats_lock:
+            counters = self._stats[input_type]
+            counters["calls"] += 1
+            counters["texts"] += len(texts)
+            counters["seconds"] += elapsed
+        return vectors
+    
+    def _embed(self, texts: List[str], input_type: str) -> List[List[float]]:
+        raise NotImplementedError
+
+
+class PineconeEmbedder(Embedder):
+    """Remote embeddings through the Pinecone Inference API"""
+    
+    def __init__(self, pc, model: str = PINECONE_EMBED_MODEL):
+        super().__init__()
+        self.pc = pc
+        self.model = model
+        self.name = f"pinecone/{model}"
+    
+    def _embed(self, texts: List[str], input_type: str) -> List[List[float]]:
+        vectors = []
+        for i in range(0, len(texts), PINECONE_EMBED_BATCH_SIZE):
+            response = self.pc.inference.embed(
+                model=self.model,
+                inputs=texts[i:i + PINECONE_EMBED_BATCH_SIZE],
+                parameters={"input_type": input_type, "truncate": "END"}
+            )
+            vectors.extend(embedding.values for embedding in response)
+        return vectors
+
+
+class LocalEmbedder(Embedder):
+    """
+    CPU embeddings with a sentence-transformers model, loaded once and kept warm.
+    Calls are serialized: the model already uses every core for one batch, so
+    concurrent callers just queue up and get batched throughput.
+    """
+    
+    def __init__(self, model: str = LOCAL_EMBED_MODEL, backend: str = LOCAL_EMBED_BACKEND,
+                 batch_size: int = LOCAL_EMBED_BATCH_SIZE):
+        super().__init__()
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise ImportError(
+                "❌ EMBEDDER=local needs sentence-transformers: pip install sentence-transformers"
+                + (" onnxruntime" if backend == "onnx" else "")
+            )
+        
+        print(f"Loading local embedding model {model} ({backend})...")
+        self.model = SentenceTransformer(model, device="cpu", backend=backend)
+        self.batch_size = batch_size
+        self.name = f"local/{model}"
+        self._lock = threading.Lock()
+        print(f"✅ Local embedder ready ({self.model.get_sentence_embedding_dimension()}d)")
+    
+    def _embed(self, texts: List[str], input_type: str) -> List[List[float]]:
+        with self._lock:
+            vectors = self.model.encode(
+                texts,
+                batch_size=self.batch_size,
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+        return vectors.tolist()
+
+
+def get_embedder(pc=None) -> Embedder:
+    """
+    The process-wide embedder selected by EMBEDDER, shared by ingestion and
+    retrieval so the local model is loaded once; `pc` is the Pinecone client.
+    """
+    global _embedder
+    with _embedder_lock:
+        if _embedder is None:
+            if EMBEDDER == "local":
+                _embedder = LocalEmbedder()
+            elif EMBEDDER == "pinecone":
+                _embedder = PineconeEmbedder(pc)
+            else:
+                raise ValueError(f"❌ Unknown EMBEDDER '{EMBEDDER}' (use 'pinecone' or 'local')")
+        return _embedder
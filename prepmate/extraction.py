@@ -0,0 +1,160 @@
+# extraction.py - CPU-bound text extraction, fanned out to a process pool
+#
+# Kept free of Pinecone/LLM imports: worker processes import this module
+# on start-up, so it must be cheap and side-effect free.
+import os
+import math
+import tempfile
+import threading
+import multiprocessing
+from io import BytesIO
+from typing import Iterator, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from PyPDF2 import PdfReader
+from unstructured.partition.auto import partition
+
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(os.cpu_count() or 2)))
+MIN_PAGES_PER_TASK = int(os.getenv("PDF_MIN_PAGES_PER_TASK", "8"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Lazily start the shared extraction pool (spawned, so it is safe in a threaded server)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=EXTRACTION_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+# ========== WORKER TASKS (run in the pool, must be top-level) ==========
+
+def extract_pdf_pages(pdf_path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """Extract pages [start, end) of a PDF on disk. Returns (1-based page number, text) pairs"""
+    pdf_reader = PdfReader(pdf_path)
+    return [
+        (page_num + 1, pdf_reader.pages[page_num].extract_text() or "")
+        for page_num in range(start, min(end, len(pdf_reader.pages)))
+    ]
+
+
+def extract_document(file_bytes: bytes) -> List[Tuple[int, str]]:
+    """Extract a non-PDF document with unstructured; returned as a single page"""
+    elements = partition(file=BytesIO(file_bytes))
+    text = "\n".join([el.text for el in elements if getattr(el, "text", "")])
+    return [(1, text)]
+
+
+def _run_task(filename: str, fn, *args) -> List[Tuple[int, str]]:
+    try:
+        return fn(*args)
+    except Exception as e:
+        print(f"  ❌ Error processing {filename}: {e}")
+        return []
+
+
+# ========== PLANNING + ORCHESTRATION (API process) ==========
+
+def _count_pdf_pages(file_bytes: bytes) -> Optional[int]:
+    try:
+        return len(PdfReader(BytesIO(file_bytes)).pages)
+    except Exception:
+        return None
+
+
+def _plan_tasks(documents: List[Tuple[str, bytes]], temp_paths: list) -> list:
+    """
+    Split documents into extraction tasks: (doc index, filename, fn, args).
+    PDFs are split into page ranges so one large PDF spreads across workers;
+    each PDF is written to a temp file once so tasks don't pickle the whole file.
+    """
+    tasks = []
+    for doc_index, (filename, file_bytes) in enumerate(documents):
+        page_count = _count_pdf_pages(file_bytes) if filename.lower().endswith('.pdf') else None
+        
+        if page_count is None:
+            tasks.append((doc_index, filename, extract_document, (file_bytes,)))
+            continue
+        
+        fd, pdf_path = tempfile.mkstemp(suffix=".pdf")
+        with os.fdopen(fd, "wb") as f:
+            f.write(file_bytes)
+        temp_paths.append(pdf_path)
+        
+        pages_per_task = max(MIN_PAGES_PER_TASK, math.ceil(page_count / EXTRACTION_WORKERS))
+        for start in range(0, max(page_count, 1), pages_per_task):
+            tasks.append((doc_index, filename, extract_pdf_pages, (pdf_path, start, start + pages_per_task)))
+    
+    return tasks
+
+
+def extract_pages(documents: List[Tuple[str, bytes]], on_file_done=None) -> Iterator[dict]:
+    """
+    Extract (filename, bytes) documents in the process pool and yield one record per
+    page - {"doc_index", "source", "page", "text"} - in document and page order.
+    `on_file_done(filename, characters, pages)` is called once each file is consumed.
+    """
+    temp_paths = []
+    futures = []
+    try:
+        tasks = _plan_tasks(documents, temp_paths)
+        
+        # Only keep a window of tasks in flight so extracted text for the whole
+        # corpus never piles up ahead of the consumer
+        max_in_flight = 2 * EXTRACTION_WORKERS
+        
+        def submit(task_index: int):
+            _, filename, fn, args = tasks[task_index]
+            futures.append(_get_pool().submit(_run_task, filename, fn, *args))
+        
+        for task_index in range(min(max_in_flight, len(tasks))):
+            submit(task_index)
+        
+        file_stats = {}  # doc index -> [characters, pages]
+        for task_index, (doc_index, filename, fn, args) in enumerate(tasks):
+            try:
+                pages = futures[task_index].result()
+                futures[task_index] = None
+            except BrokenProcessPool as e:
+                # A worker died (e.g. out of memory) - rebuild the pool and run this task in-process
+                print(f"⚠️ Extraction pool failed ({e}), extracting {filename} in-process")
+                _reset_pool()
+                pages = _run_task(filename, fn, *args)
+            
+            if task_index + max_in_flight < len(tasks):
+                submit(task_index + max_in_flight)
+            
+            stats = file_stats.setdefault(doc_index, [0, 0])
+            for page_number, text in pages:
+                stats[0] += len(text)
+                stats[1] += 1
+                yield {"doc_index": doc_index, "source": filename, "page": page_number, "text": text}
+            
+            is_last_task = task_index + 1 == len(tasks) or tasks[task_index + 1][0] != doc_index
+            if is_last_task and on_file_done:
+                on_file_done(filename, stats[0], stats[1])
+    
+    finally:
+        # If the consumer stopped early, don't leave queued work behind
+        for future in futures:
+            if future is not None:
+                future.cancel()
+        for path in temp_paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,102 @@
+# flashcard_deck.py - Helpers for building multi-topic flashcard decks
+#
+# The RAG engine generates one topic's cards per LLM call, concurrently; this
+# module drops near-duplicate cards across topics by embedding similarity,
+# derives topics from the material when none are given, and paces LLM calls to
+# a requests-per-minute limit.
+import os
+import re
+import time
+import asyncio
+import threading
+from typing import List
+import numpy as np
+
+DECK_MAX_TOPICS = 20
+DECK_CONCURRENCY = int(os.getenv("DECK_CONCURRENCY", "4"))  # topics generated at once
+DECK_DEDUP_THRESHOLD = float(os.getenv("DECK_DEDUP_THRESHOLD", "0.92"))  # cosine similarity of card fronts
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))  # 0 = no pacing
+TOPIC_SAMPLE_CHUNKS = 40  # excerpts shown to the LLM when deriving topics
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+def parse_topic_list(text: str, limit: int) -> List[str]:
+    """One topic per line, with list markers and numbering stripped"""
+    topics = []
+    for line in (text or "").splitlines():
+        topic = re.sub(r'^\s*(?:[-*•]|\d+[.)])\s*', '', line).strip().strip('"*')
+        if topic and topic.lower() not in (t.lower() for t in topics):
+            topics.append(topic)
+    return topics[:limit]
+
+
+class CardDeduplicator:
+    """Keeps the embeddings of accepted cards; rejects new cards too similar to any of them"""
+    
+    def __init__(self, threshold: float = DECK_DEDUP_THRESHOLD):
+        self.threshold = threshold
+        self._vectors = None  # accepted cards' unit vectors, one row each
+    
+    def filter(self, cards: List[dict], vectors: List[List[float]]) -> List[dict]:
+        """Return the cards that aren't near-duplicates of earlier cards (or of each other)"""
+        unique = []
+        for card, vector in zip(cards, vectors):
+            vector = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            vector = vector / norm if norm > 0 else vector
+            if self._vectors is not None and float(np.max(self._vectors @ vector)) >= self.threshold:
+                continue
+            self._vectors = vector[None, :] if self._vectors is None else np.vstack([self._vectors, vector])
+            unique.append(card)
+        return unique
+
+
+class RequestRateLimiter:
+    """
+    Spaces out request starts to at most `per_minute` per minute (no-op when 0).
+    Thread-safe, so deck builds on the event loop and background jobs in worker
+    threads can share one limiter.
+    """
+    
+    def __init__(self, per_minute: float = LLM_REQUESTS_PER_MINUTE):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next_start = 0.0
+        self._lock = threading.Lock()
+    
+    def _reserve(self) -> float:
+        """Claim the next start slot; returns how long to wait for it"""
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_start - now
+            self._next_start = max(now, self._next_start) + self.interval
+        return delay
+    
+    async def wait(self):
+        if not self.interval:
+            return
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    
+    def wait_blocking(self):
+        """wait() for synchronous callers (background threads)"""
+        if not self.interval:
+            return
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def get_rate_limiter() -> RequestRateLimiter:
+    """The process-wide LLM_REQUESTS_PER_MINUTE limiter, shared by every paced caller"""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RequestRateLimiter()
+        return _rate_limiter
+
+
+def format_excerpts(texts: List[str], chars: int = 300) -> str:
+    """Shortened excerpts as a bullet list for the topic extraction prompt"""
+    return "\n\n".join(f"- {text[:chars].strip()}" for text in texts if text.strip())
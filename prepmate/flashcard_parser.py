@@ -0,0 +1,144 @@
+# flashcard_parser.py - Parse LLM flashcard output into typed cards, once, on the server
+#
+# The model is asked for {"cards": [{"front", "back"}, ...]} (Groq JSON mode where
+# possible). Parsing recovers every well-formed card from partially broken
+# output - a truncated array or one malformed object doesn't cost the whole set -
+# and falls back to the legacy "Card N: / Front: / Back:" text format.
+import re
+import json
+from typing import List, Optional, Tuple
+from pydantic import BaseModel
+
+_CARD_SPLIT = re.compile(r'Card \d+:')
+_FRONT = re.compile(r'Front:\s*(.+?)(?=Back:)', re.DOTALL)
+_BACK = re.compile(r'Back:\s*(.+?)(?=$|Card)', re.DOTALL)
+_FENCE = re.compile(r'^```(?:json)?\s*|\s*```$')
+
+_decoder = json.JSONDecoder()
+
+
+class Flashcard(BaseModel):
+    """One question/answer card"""
+    front: str
+    back: str
+    topic: Optional[str] = None
+
+
+def _to_card(value) -> Optional[Flashcard]:
+    """A card from a decoded JSON object, tolerating question/answer key names"""
+    if not isinstance(value, dict):
+        return None
+    front = value.get("front") or value.get("question")
+    back = value.get("back") or value.get("answer")
+    if not isinstance(front, str) or not isinstance(back, str) or not front.strip() or not back.strip():
+        return None
+    return Flashcard(front=front.strip(), back=back.strip())
+
+
+def _cards_from_json(value) -> Optional[List]:
+    """The list of card objects inside a fully decoded response, if it has one"""
+    if isinstance(value, dict):
+        value = value.get("cards", value.get("flashcards"))
+    return value if isinstance(value, list) else None
+
+
+def parse_legacy_text(text: str) -> List[Flashcard]:
+    """Parse the old "Card N: / Front: / Back:" plain-text format"""
+    cards = []
+    for section in _CARD_SPLIT.split(text or ""):
+        front = _FRONT.search(section)
+        back = _BACK.search(section)
+        if front and back and front.group(1).strip() and back.group(1).strip():
+            cards.append(Flashcard(front=front.group(1).strip(), back=back.group(1).strip()))
+    return cards
+
+
+def _scan_objects(text: str, start: int = 0):
+    """
+    Yield (card or None, end offset) for every JSON object that decodes starting at
+    a '{' at or after `start`; objects that fail to decode are skipped.
+    """
+    position = text.find("{", start)
+    while position != -1:
+        try:
+            value, end = _decoder.raw_decode(text, position)
+        except json.JSONDecodeError:
+            position = text.find("{", position + 1)
+            continue
+        card = _to_card(value)
+        if card is not None or _cards_from_json(value) is None:
+            yield card, end
+            position = text.find("{", end)
+        else:
+            # a complete {"cards": [...]} wrapper - look inside it for the cards
+            position = text.find("{", position + 1)
+
+
+def failed_generation(error: Exception) -> Optional[str]:
+    """
+    The raw output Groq attaches when JSON mode rejects a response as invalid JSON
+    (400 json_validate_failed), so its good cards can still be recovered.
+    """
+    body = getattr(error, "body", None)
+    if isinstance(body, dict):
+        body = body.get("error", body)
+        if isinstance(body, dict) and isinstance(body.get("failed_generation"), str):
+            return body["failed_generation"]
+    return None
+
+
+def parse_flashcards(text: str) -> Tuple[List[Flashcard], int]:
+    """
+    Parse LLM output into cards. Returns (cards, number of malformed card entries).
+    Tries strict JSON, then salvages individual card objects, then the text format.
+    """
+    text = _FENCE.sub("", (text or "").strip())
+    if not text:
+        return [], 0
+    
+    try:
+        entries = _cards_from_json(json.loads(text))
+    except json.JSONDecodeError:
+        entries = None
+    
+    if entries is not None:
+        cards = [card for card in map(_to_card, entries) if card is not None]
+        return cards, len(entries) - len(cards)
+    
+    # Broken JSON (truncated, stray text, one bad object): keep every card that decodes
+    cards = [card for card, _ in _scan_objects(text) if card is not None]
+    if cards:
+        print(f"⚠️ Recovered {len(cards)} cards from malformed flashcard JSON")
+        return cards, max(0, text.count('"front"') - len(cards))
+    
+    return parse_legacy_text(text), 0
+
+
+class FlashcardStreamParser:
+    """
+    Incremental parser for streamed JSON output: feed() text as it arrives and get
+    back the cards that have just been completed.
+    """
+    
+    def __init__(self):
+        self.buffer = ""
+        self.position = 0  # everything before this has been consumed
+        self.cards = 0
+    
+    def feed(self, text: str) -> List[Flashcard]:
+        self.buffer += text
+        cards = []
+        for card, end in _scan_objects(self.buffer, self.position):
+            if card is not None:
+                cards.append(card)
+            self.position = end
+        self.cards += len(cards)
+        return cards
+    
+    def finish(self) -> List[Flashcard]:
+        """Cards only recoverable from the complete output (e.g. the legacy text format)"""
+        if self.cards:
+            return []
+        cards, _ = parse_flashcards(self.buffer)
+        self.cards += len(cards)
+        return cards
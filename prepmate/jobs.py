@@ -0,0 +1,89 @@
+# jobs.py - In-memory registry of background jobs and their status
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+MAX_JOBS = 500  # finished jobs beyond this are forgotten, oldest first
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))  # concurrent heavy jobs (ingestion)
+
+_jobs = {}
+_lock = threading.Lock()
+
+
+def create_job(kind: str, **fields) -> str:
+    """Register a new pending job and return its id"""
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    with _lock:
+        _jobs[job_id] = {
+            "job_id": job_id,
+            "kind": kind,
+            "status": "pending",
+            "created_at": now,
+            "updated_at": now,
+            **fields
+        }
+        _prune()
+    return job_id
+
+
+def update_job(job_id: str, **fields):
+    """Merge fields into a job's status record"""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return
+        job.update(fields)
+        job["updated_at"] = time.time()
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    """Return a snapshot of a job's status, or None if unknown"""
+    with _lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+
+def _run_job(job_id: str, fn, args, kwargs):
+    """Run fn, recording its result or error on the job"""
+    update_job(job_id, status="running")
+    try:
+        result = fn(*args, **kwargs)
+        update_job(job_id, status="completed", result=result)
+    except Exception as e:
+        print(f"❌ Background job {job_id} failed: {e}")
+        update_job(job_id, status="failed", error=str(e))
+
+
+def run_in_background(job_id: str, fn, *args, **kwargs):
+    """Run a lightweight job (e.g. a verification check) on its own daemon thread"""
+    thread = threading.Thread(
+        target=_run_job, args=(job_id, fn, args, kwargs),
+        name=f"job-{job_id[:8]}", daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def submit_job(job_id: str, fn, *args, **kwargs):
+    """Queue a heavy job on the shared worker pool; it stays pending until a worker is free"""
+    return _pool.submit(_run_job, job_id, fn, args, kwargs)
+
+
+_pool = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job-worker")
+
+
+def _prune():
+    """Drop the oldest finished jobs once the registry is full (caller holds the lock)"""
+    if len(_jobs) <= MAX_JOBS:
+        return
+    
+    finished = sorted(
+        (job for job in _jobs.values() if job["status"] in ("completed", "failed")),
+        key=lambda job: job["updated_at"]
+    )
+    for job in finished[:len(_jobs) - MAX_JOBS]:
+        del _jobs[job["job_id"]]
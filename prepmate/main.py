@@ -1,12 +1,20 @@
 # main.py - COMPLETE WITH CHAT ENDPOINT
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Dict
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from typing import List, Dict, Optional
 from upload import router
 from rag_engine import RAGTutor
+from workspaces import get_workspace
+from topic_map import topic_summary
+import prewarm
 from dotenv import load_dotenv
 import logging
+import json
+import time
+import threading
 
 load_dotenv()
 
@@ -49,6 +57,10 @@ async def startup_event():
     print("🚀 Starting PrepMate API...")
     try:
         tutor = RAGTutor()  # Re-enable RAG!
+        prewarm.set_tutor(tutor)
+        if tutor.keyword_index:
+            # load the persisted keyword indexes now rather than on the first search
+            threading.Thread(target=tutor.keyword_index.warm, name="bm25-warm", daemon=True).start()
         print("✅ PrepMate ready!")
     except Exception as e:
         print(f"❌ Failed to initialize RAG: {e}")
@@ -68,19 +80,27 @@ def welcome():
         "service": "PrepMate API",
         "endpoints": {
             "upload": "/upload/multiple",
+            "files": "/upload/files",
             "chat": "/chat/",
+            "chat_stream": "/chat/stream",
+            "teach": "/teach",
+            "topics": "/topics",
+            "qa_batch": "/qa/batch",
+            "flashcards_due": "/flashcards/due",
             "docs": "/docs"
         }
     }
 
 class ChatRequest(BaseModel):
     message: str
-    chat_history: List[Dict] = []
+    session_id: Optional[str] = None  # server-side history; omit to start a new session
+    chat_history: List[Dict] = []  # legacy: full history sent by the client (used without session_id)
+    sources: Optional[List[str]] = None  # restrict retrieval to these uploaded files
 
 @app.post("/chat/")
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest, workspace: str = Depends(get_workspace)):
     """
-    Chat with RAG tutor
+    Chat with RAG tutor over the caller's workspace (X-Workspace-Id header)
     """
     logging.info(f"Chat request: {request.message[:50]}...")
     
@@ -92,8 +112,10 @@ async def chat_endpoint(request: ChatRequest):
                 "error": "RAG Tutor not initialized. Please restart the server."
             }
         
-    
-        result = tutor.chat(request.message, request.chat_history)
+        
+        result = await tutor.achat(
+            request.message, request.chat_history, request.sources, workspace, request.session_id
+        )
         
         logging.info(f"Chat response generated. Sources: {result.get('sources_used', 0)}")
         
@@ -108,23 +130,138 @@ async def chat_endpoint(request: ChatRequest):
             "success": False,
             "error": str(e)
         }
+
+def _sse(event: dict) -> str:
+    """Format one Server-Sent Events message"""
+    return f"data: {json.dumps(event)}\n\n"
+
+
+def _sse_response(events):
+    """Wrap an async generator of event dicts as a text/event-stream response"""
+    async def stream():
+        if tutor is None:
+            yield _sse({"type": "error", "error": "RAG Tutor not initialized. Please restart the server."})
+            return
+        try:
+            async for event in events():
+                yield _sse(event)
+            yield _sse({"type": "done"})
+        except Exception as e:
+            logging.error(f"Error while streaming: {e}", exc_info=True)
+            yield _sse({"type": "error", "error": str(e)})
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest, workspace: str = Depends(get_workspace)):
+    """
+    Chat with RAG tutor, streaming tokens as Server-Sent Events
+    """
+    logging.info(f"Chat stream request: {request.message[:50]}...")
+    return _sse_response(
+        lambda: tutor.astream_chat(
+            request.message, request.chat_history, request.sources, workspace, request.session_id
+        )
+    )
+
+@app.get("/chat/sessions/{session_id}")
+def chat_session_info(session_id: str, workspace: str = Depends(get_workspace)):
+    """Turn count, window size and rolling summary of a server-side chat session"""
+    session = tutor.sessions.get(session_id, workspace) if tutor else None
+    if session is None:
+        return {"success": False, "error": f"Chat session {session_id} not found"}
+    return {"success": True, "session": session.info()}
+
+@app.delete("/chat/sessions/{session_id}")
+def delete_chat_session(session_id: str, workspace: str = Depends(get_workspace)):
+    """Forget a chat session (e.g. when the student starts a new chat)"""
+    if tutor is None or not tutor.sessions.delete(session_id, workspace):
+        return {"success": False, "error": f"Chat session {session_id} not found"}
+    return {"success": True}
+
+class TeachRequest(BaseModel):
+    """A topic to explain: free text, or a topic id from /topics"""
+    topic: str = ""
+    topic_id: Optional[str] = None
+    sources: Optional[List[str]] = None  # restrict retrieval to these uploaded files
+
+@app.post("/teach")
+async def teach_endpoint(request: TeachRequest, workspace: str = Depends(get_workspace)):
+    """
+    Explain a topic from the caller's study materials. With a topic_id the
+    topic's precomputed chunks are used directly, skipping retrieval.
+    """
+    logging.info(f"🧑‍🏫 Teach request: {request.topic_id or request.topic[:50]}")
+    
+    try:
+        if tutor is None:
+            logging.error("RAG Tutor not initialized")
+            return {
+                "success": False,
+                "error": "RAG Tutor not initialized. Please restart the server."
+            }
+        
+        result = await tutor.ateach(request.topic, request.sources, workspace, request.topic_id)
+        return {
+            "success": True,
+            "data": result
+        }
+    
+    except Exception as e:
+        logging.error(f"Error in teach endpoint: {e}", exc_info=True)
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+@app.get("/topics")
+def topics_endpoint(workspace: str = Depends(get_workspace)):
+    """
+    The workspace's topic map, clustered from its chunks at upload time:
+    id, title, keywords, size and source files per topic. Pass a topic's id
+    as topic_id to /teach or /flashcards to reuse its precomputed context.
+    """
+    if tutor is None:
+        return {
+            "success": False,
+            "error": "RAG Tutor not initialized. Please restart the server."
+        }
+    
+    topic_map = tutor.topic_maps.get(workspace)
+    if topic_map is None:
+        return {"success": True, "topics": [], "built_at": None, "chunks": 0}
+    return {
+        "success": True,
+        "topics": [topic_summary(topic) for topic in topic_map["topics"]],
+        "built_at": topic_map["built_at"],
+        "chunks": topic_map["chunks"]
+    }
+
 class FlashcardRequest(BaseModel):
     """Request model for flashcard generation"""
-    topic: str
+    topic: str = ""
+    topic_id: Optional[str] = None  # a topic from /topics, instead of free text
     num_cards: int = 10
+    sources: Optional[List[str]] = None  # restrict retrieval to these uploaded files
+    regenerate: bool = False  # generate new cards even if the topic already has saved ones
 
 @app.post("/flashcards")
-async def flashcards_endpoint(request: FlashcardRequest):
+async def flashcards_endpoint(request: FlashcardRequest, workspace: str = Depends(get_workspace)):
     """
     Generate flashcards on a topic
     
     Args:
         request: FlashcardRequest with topic and number of cards
-        
+        workspace: caller's workspace, from the X-Workspace-Id header
+    
     Returns:
-        JSON with generated flashcards
+        JSON with the parsed cards ([{"front", "back"}]) and a count of malformed ones
     """
-    logging.info(f"🗂️ Flashcard request: {request.topic} ({request.num_cards} cards)")
+    logging.info(f"🗂️ Flashcard request: {request.topic_id or request.topic} ({request.num_cards} cards)")
     
     try:
         if tutor is None:
@@ -135,9 +272,11 @@ async def flashcards_endpoint(request: FlashcardRequest):
             }
         
         # Call RAG engine flashcard generation
-        result = tutor.generate_flashcards(request.topic, request.num_cards)
+        result = await tutor.agenerate_flashcards(
+            request.topic, request.num_cards, request.sources, workspace, request.regenerate, request.topic_id
+        )
         
-        logging.info(f"✅ Flashcards generated: {request.num_cards} cards")
+        logging.info(f"✅ Flashcards generated: {result['cards_generated']} cards ({result['parse_errors']} malformed)")
         
         return {
             "success": True,
@@ -151,15 +290,143 @@ async def flashcards_endpoint(request: FlashcardRequest):
             "error": str(e)
         }
 
+@app.post("/flashcards/stream")
+async def flashcards_stream_endpoint(request: FlashcardRequest, workspace: str = Depends(get_workspace)):
+    """
+    Generate flashcards on a topic, streaming each parsed card as a Server-Sent Event
+    """
+    logging.info(f"🗂️ Flashcard stream request: {request.topic_id or request.topic} ({request.num_cards} cards)")
+    return _sse_response(
+        lambda: tutor.astream_flashcards(
+            request.topic, request.num_cards, request.sources, workspace, request.regenerate, request.topic_id
+        )
+    )
+
+@app.get("/flashcards/due")
+def flashcards_due(limit: int = 20, workspace: str = Depends(get_workspace)):
+    """
+    The saved cards due for review, most overdue first, plus deck stats
+    (total, due, learned, next_due_at) - review without generating anything
+    """
+    if tutor is None:
+        return {
+            "success": False,
+            "error": "RAG Tutor not initialized. Please restart the server."
+        }
+    
+    return {
+        "success": True,
+        "cards": tutor.cards.due_cards(workspace, max(1, min(limit, 200))),
+        "stats": tutor.cards.stats(workspace)
+    }
+
+class ReviewRequest(BaseModel):
+    """How well the student recalled a card: SM-2 grade 0 (blackout) to 5 (perfect)"""
+    quality: int = Field(ge=0, le=5)
+
+@app.post("/flashcards/{card_id}/review")
+def review_flashcard(card_id: int, request: ReviewRequest, workspace: str = Depends(get_workspace)):
+    """Record a review and reschedule the card (SM-2); returns its new due date"""
+    if tutor is None:
+        return {
+            "success": False,
+            "error": "RAG Tutor not initialized. Please restart the server."
+        }
+    
+    card = tutor.cards.review(workspace, card_id, request.quality)
+    if card is None:
+        return {"success": False, "error": f"Flashcard {card_id} not found"}
+    return {"success": True, "card": card}
+
+@app.delete("/flashcards/{card_id}")
+def delete_flashcard(card_id: int, workspace: str = Depends(get_workspace)):
+    """Remove a saved card from the review schedule"""
+    if tutor is None or not tutor.cards.delete_card(workspace, card_id):
+        return {"success": False, "error": f"Flashcard {card_id} not found"}
+    return {"success": True}
+
+class DeckRequest(BaseModel):
+    """Request model for multi-topic deck generation"""
+    topics: Optional[List[str]] = None  # omit to derive topics from the uploaded material
+    num_topics: int = 5  # topics to derive when none are given
+    cards_per_topic: int = 5
+    sources: Optional[List[str]] = None  # restrict retrieval to these uploaded files
+
+@app.post("/flashcards/deck")
+async def flashcard_deck_endpoint(request: DeckRequest, workspace: str = Depends(get_workspace)):
+    """
+    Build a flashcard deck across many topics, streaming Server-Sent Events:
+    "topics" (the deck's topics), then one "cards" event per topic as it finishes,
+    "topic_error" for topics that failed, and a final "deck" summary.
+    """
+    logging.info(f"🗂️ Deck request: {len(request.topics or [])} topics ({request.cards_per_topic} cards each)")
+    return _sse_response(
+        lambda: tutor.astream_flashcard_deck(
+            request.topics, request.cards_per_topic, request.num_topics, request.sources, workspace
+        )
+    )
+
+MAX_BATCH_QUESTIONS = 500
+
+class QABatchRequest(BaseModel):
+    """A problem set to answer in one request"""
+    questions: List[str]
+    sources: Optional[List[str]] = None  # restrict retrieval to these uploaded files
+
+@app.post("/qa/batch")
+async def qa_batch_endpoint(request: QABatchRequest, workspace: str = Depends(get_workspace)):
+    """
+    Answer a list of questions, streaming one NDJSON line per answer as soon as it
+    finishes ({"index", "question", "success", "data" | "error"}), then a final
+    {"done": true, ...} summary line. Answers arrive out of order; use "index".
+    """
+    logging.info(f"📋 Batch Q&A request: {len(request.questions)} questions")
+    
+    async def stream():
+        if tutor is None:
+            yield json.dumps({"done": True, "success": False, "error": "RAG Tutor not initialized. Please restart the server."}) + "\n"
+            return
+        if len(request.questions) > MAX_BATCH_QUESTIONS:
+            yield json.dumps({"done": True, "success": False, "error": f"At most {MAX_BATCH_QUESTIONS} questions per batch"}) + "\n"
+            return
+        
+        started = time.perf_counter()
+        failed = 0
+        try:
+            async for index, result, error in tutor.abatch_answer_questions(request.questions, request.sources, workspace):
+                line = {"index": index, "question": request.questions[index], "success": error is None}
+                if error is None:
+                    line["data"] = result
+                else:
+                    failed += 1
+                    line["error"] = str(error)
+                    logging.error(f"Batch question {index} failed: {error}")
+                yield json.dumps(line) + "\n"
+        except Exception as e:
+            logging.error(f"Error in batch Q&A: {e}", exc_info=True)
+            yield json.dumps({"done": True, "success": False, "error": str(e)}) + "\n"
+            return
+        
+        yield json.dumps({
+            "done": True,
+            "success": True,
+            "answered": len(request.questions) - failed,
+            "failed": failed,
+            "seconds": round(time.perf_counter() - started, 2)
+        }) + "\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
 @app.post("/clear")
-async def clear_documents():
+async def clear_documents(workspace: str = Depends(get_workspace)):
     """
-    Clear all documents from Pinecone
+    Clear all documents of the caller's workspace from Pinecone
     """
     try:
         from converter import clear_pinecone_index
         
-        success = clear_pinecone_index()
+        # Clearing makes blocking Pinecone calls - keep it off the event loop
+        success = await run_in_threadpool(clear_pinecone_index, workspace)
         
         if success:
             return {
@@ -179,6 +446,55 @@ async def clear_documents():
         }
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    if tutor is not None:
+        tutor.embedding_cache.save()
+        tutor.store.flush()
+        if tutor.keyword_index:
+            tutor.keyword_index.flush()
+
+@app.get("/cache/stats")
+def cache_stats(workspace: str = Depends(get_workspace)):
+    """Hit/miss counters for the RAG engine caches"""
+    if tutor is None:
+        return {
+            "success": False,
+            "error": "RAG Tutor not initialized. Please restart the server."
+        }
+    
+    return {
+        "success": True,
+        "embedding_cache": tutor.embedding_cache.stats(),
+        "answer_cache": tutor.answer_cache.stats(workspace)
+    }
+
+@app.get("/embeddings/stats")
+def embedding_stats():
+    """Embedding throughput (ingestion passages and queries) for the configured embedder"""
+    if tutor is None:
+        return {
+            "success": False,
+            "error": "RAG Tutor not initialized. Please restart the server."
+        }
+    
+    return {"success": True, "embeddings": tutor.embedder.stats()}
+
+@app.get("/retrieval/stats")
+def retrieval_stats():
+    """Latency per retrieval stage (embed, search, rerank, pack) to tune RERANK_CANDIDATES vs k"""
+    if tutor is None:
+        return {
+            "success": False,
+            "error": "RAG Tutor not initialized. Please restart the server."
+        }
+    
+    return {
+        "success": True,
+        "stages": tutor.retrieval_timings.stats(),
+        "reranker": tutor.reranker.stats() if tutor.reranker else None
+    }
+
 # Health check
 @app.get("/health")
 def health_check():
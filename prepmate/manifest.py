@@ -0,0 +1,139 @@
+# manifest.py - Local record of what has been ingested, for incremental re-uploads
+#
+# One manifest per workspace: the default workspace uses INGEST_MANIFEST_PATH,
+# others a sibling file named after the workspace.
+#
+# Layout (JSON):
+#   {"version": 1,
+#    "sources": {filename: {"file_hash": sha256 of the file bytes,
+#                           "chunks": {chunk_hash: vector_id, ...},
+#                           "updated_at": unix time}}}
+import os
+import json
+import time
+import hashlib
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+MANIFEST_PATH = os.getenv(
+    "INGEST_MANIFEST_PATH",
+    str(Path(__file__).parent / "ingest_manifest.json")
+)
+MANIFEST_VERSION = 1
+
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+
+def get_manifest(workspace: str = "") -> "IngestManifest":
+    """The (lazily loaded) manifest of one workspace"""
+    with _manifests_lock:
+        if workspace not in _manifests:
+            path = MANIFEST_PATH
+            if workspace:
+                root, ext = os.path.splitext(MANIFEST_PATH)
+                path = f"{root}.{workspace}{ext}"
+            _manifests[workspace] = IngestManifest(path)
+        return _manifests[workspace]
+
+
+def file_hash(file_bytes: bytes) -> str:
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+def chunk_hash(source: str, text: str) -> str:
+    """Content hash of a chunk, scoped to its source file"""
+    return hashlib.sha256(f"{source}\x00{text}".encode("utf-8")).hexdigest()
+
+
+def vector_id_for(chunk_digest: str) -> str:
+    """Vector ids are derived from content, so re-uploads overwrite instead of duplicating"""
+    return chunk_digest[:32]
+
+
+class IngestManifest:
+    """Thread-safe, JSON-persisted map of source file -> file hash -> chunk hashes -> vector ids"""
+    
+    def __init__(self, path: str = MANIFEST_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._sources = {}
+        self._load()
+    
+    def get_source(self, source: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._sources.get(source)
+            return {**entry, "chunks": dict(entry["chunks"])} if entry else None
+    
+    def is_unchanged(self, source: str, digest: str) -> bool:
+        """True if this exact file was already ingested under this name"""
+        with self._lock:
+            entry = self._sources.get(source)
+            return entry is not None and entry["file_hash"] == digest
+    
+    def record_source(self, source: str, digest: str, chunks: Dict[str, str]):
+        """Replace a source's entry after its vectors were stored"""
+        with self._lock:
+            self._sources[source] = {
+                "file_hash": digest,
+                "chunks": dict(chunks),
+                "updated_at": time.time()
+            }
+        self.save()
+    
+    def remove_source(self, source: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._sources.pop(source, None)
+        self.save()
+        return entry
+    
+    def clear(self):
+        with self._lock:
+            self._sources = {}
+        self.save()
+    
+    def sources(self) -> Dict[str, dict]:
+        """Summary of every ingested source: file hash, chunk count, last update"""
+        with self._lock:
+            return {
+                source: {
+                    "file_hash": entry["file_hash"],
+                    "chunks": len(entry["chunks"]),
+                    "updated_at": entry["updated_at"]
+                }
+                for source, entry in self._sources.items()
+            }
+    
+    def vector_ids(self) -> list:
+        """Every vector id recorded for the workspace, across all sources"""
+        with self._lock:
+            return [vector_id for entry in self._sources.values() for vector_id in entry["chunks"].values()]
+    
+    def save(self):
+        """Persist the manifest atomically"""
+        with self._lock:
+            payload = json.dumps({"version": MANIFEST_VERSION, "sources": self._sources})
+        
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"⚠️ Could not save ingest manifest: {e}")
+    
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != MANIFEST_VERSION:
+                print("⚠️ Ingest manifest version changed - starting fresh")
+                return
+            self._sources = data.get("sources", {})
+            print(f"✅ Loaded ingest manifest ({len(self._sources)} sources)")
+        except Exception as e:
+            print(f"⚠️ Could not load ingest manifest: {e}")
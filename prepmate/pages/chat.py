@@ -1,6 +1,7 @@
 import os
 import streamlit as st
 import requests
+import json
 
 # Check if running on Streamlit Cloud or locally
 if hasattr(st, 'secrets') and 'API_URL' in st.secrets:
@@ -8,6 +9,55 @@ if hasattr(st, 'secrets') and 'API_URL' in st.secrets:
 else:
     API_URL = os.getenv("API_URL", "http://localhost:8000")
 
+def stream_chat_response(prompt: str, meta: dict):
+    """
+    Yield response tokens from the /chat/stream Server-Sent Events endpoint.
+    The conversation history lives on the server: only the new message and the
+    session id are sent. Non-token events (e.g. sources used) are recorded into `meta`.
+    """
+    with requests.post(
+        f"{API_URL}/chat/stream",
+        json={
+            "message": prompt,
+            "session_id": st.session_state.get("chat_session_id")
+        },
+        headers={"X-Workspace-Id": st.session_state.workspace_id},
+        stream=True,
+        timeout=(10, 60)
+    ) as response:
+        if response.status_code != 200:
+            raise Exception(f"API Error: {response.status_code}")
+        
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data: "):
+                continue
+            
+            event = json.loads(line[len("data: "):])
+            if event["type"] == "token":
+                yield event["content"]
+            elif event["type"] == "session":
+                st.session_state.chat_session_id = event["session_id"]
+            elif event["type"] == "sources":
+                meta["sources_used"] = event.get("sources_used", 0)
+            elif event["type"] == "error":
+                raise Exception(event.get("error"))
+            elif event["type"] == "done":
+                break
+
+def reset_chat_session():
+    """Clear the visible messages and drop the server-side session"""
+    session_id = st.session_state.pop("chat_session_id", None)
+    if session_id:
+        try:
+            requests.delete(
+                f"{API_URL}/chat/sessions/{session_id}",
+                headers={"X-Workspace-Id": st.session_state.workspace_id},
+                timeout=5
+            )
+        except requests.exceptions.RequestException:
+            pass  # the server expires idle sessions anyway
+    st.session_state.chat_messages = []
+
 def show_chat_interface():
     """
     Render the chat interface with minimalist dark design
@@ -236,57 +286,32 @@ def show_chat_interface():
         
         # Generate response
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                try:
-                    # Prepare chat history
-                    chat_history = [
-                        {"role": msg["role"], "content": msg["content"]}
-                        for msg in st.session_state.chat_messages[:-1]
-                    ]
-                    
-                    # API call
-                    response = requests.post(
-                        f"{API_URL}/chat/",
-                        json={
-                            "message": prompt,
-                            "chat_history": chat_history
-                        },
-                        timeout=60
-                    )
-                    
-                    if response.status_code == 200:
-                        result = response.json()
-                        
-                        if result.get("success"):
-                            data = result["data"]
-                            answer = data["response"]
-                            sources_used = data.get("sources_used", 0)
-                            
-                            # Display answer
-                            st.markdown(answer)
-                            
-                            # Show sources
-                            if sources_used > 0:
-                                with st.expander(f"📚 Sources used: {sources_used} chunks"):
-                                    st.caption("Response generated from your uploaded documents")
-                            
-                            # Add to history
-                            st.session_state.chat_messages.append({
-                                "role": "assistant",
-                                "content": answer,
-                                "sources_used": sources_used
-                            })
-                        else:
-                            st.error(f"Error: {result.get('error')}")
-                    else:
-                        st.error(f"API Error: {response.status_code}")
+            try:
+                # Render tokens as they arrive from the streaming endpoint
+                meta = {"sources_used": 0}
+                answer = st.write_stream(
+                    stream_chat_response(prompt, meta)
+                )
+                sources_used = meta["sources_used"]
+                
+                # Show sources
+                if sources_used > 0:
+                    with st.expander(f"📚 Sources used: {sources_used} chunks"):
+                        st.caption("Response generated from your uploaded documents")
                 
-                except requests.exceptions.Timeout:
-                    st.error("Request timed out. Try a simpler question.")
-                except requests.exceptions.ConnectionError:
-                    st.error("Cannot connect to backend. Is it running?")
-                except Exception as e:
-                    st.error(f"Error: {str(e)}")
+                # Add to history
+                st.session_state.chat_messages.append({
+                    "role": "assistant",
+                    "content": answer,
+                    "sources_used": sources_used
+                })
+            
+            except requests.exceptions.Timeout:
+                st.error("Request timed out. Try a simpler question.")
+            except requests.exceptions.ConnectionError:
+                st.error("Cannot connect to backend. Is it running?")
+            except Exception as e:
+                st.error(f"Error: {str(e)}")
     
     # Action buttons at bottom
     st.markdown("---")
@@ -300,10 +325,10 @@ def show_chat_interface():
     with col2:
         if len(st.session_state.chat_messages) > 0:
             if st.button("🗑️ Clear Chat", use_container_width=True):
-                st.session_state.chat_messages = []
+                reset_chat_session()
                 st.rerun()
     
     with col3:
         if st.button("🔄 New Chat", use_container_width=True):
-            st.session_state.chat_messages = []
+            reset_chat_session()
             st.rerun()
\ No newline at end of file
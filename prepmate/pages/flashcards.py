@@ -1,8 +1,8 @@
 import os
 import streamlit as st
 import requests
-import re
 import html
+import json
 
 # Check if running on Streamlit Cloud or locally
 if hasattr(st, 'secrets') and 'API_URL' in st.secrets:
@@ -10,31 +10,72 @@ if hasattr(st, 'secrets') and 'API_URL' in st.secrets:
 else:
     API_URL = os.getenv("API_URL", "http://localhost:8000")
 
-def parse_flashcards(flashcard_text: str) -> list:
+def stream_deck(topics: list, cards_per_topic: int):
     """
-    Parse the LLM-generated flashcard text into structured data
+    Yield events from the /flashcards/deck Server-Sent Events endpoint
+    ("topics", one "cards" per topic, "topic_error", then the "deck" summary).
     """
-    cards = []
-    
-    if not flashcard_text or len(flashcard_text) < 10:
-        return []
-    # Split by "Card X:" pattern
-    card_pattern = r'Card \d+:'
-    card_sections = re.split(card_pattern, flashcard_text)
-    for idx, section in enumerate(card_sections):
-        if not section.strip():
-            continue
-        # Extract Front and Back
-        front_match = re.search(r'Front:\s*(.+?)(?=Back:)', section, re.DOTALL)
-        back_match = re.search(r'Back:\s*(.+?)(?=$|Card)', section, re.DOTALL)
-        if front_match and back_match:
-            front = front_match.group(1).strip()
-            back = back_match.group(1).strip()
-            cards.append({"front": front, "back": back})
-    return cards
-    
-    return cards
+    with requests.post(
+        f"{API_URL}/flashcards/deck",
+        json={"topics": topics or None, "cards_per_topic": cards_per_topic},
+        headers={"X-Workspace-Id": st.session_state.workspace_id},
+        stream=True,
+        timeout=(10, 120)
+    ) as response:
+        if response.status_code != 200:
+            raise Exception(f"API Error: {response.status_code}")
+        
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data: "):
+                continue
+            
+            event = json.loads(line[len("data: "):])
+            if event["type"] == "error":
+                raise Exception(event.get("error"))
+            if event["type"] == "done":
+                break
+            yield event
+
+def fetch_due_cards(limit: int = 50) -> dict:
+    """Saved cards due for review and the deck stats, from /flashcards/due"""
+    try:
+        response = requests.get(
+            f"{API_URL}/flashcards/due",
+            params={"limit": limit},
+            headers={"X-Workspace-Id": st.session_state.workspace_id},
+            timeout=10
+        )
+        result = response.json() if response.status_code == 200 else {}
+    except Exception:
+        result = {}
+    return result if result.get("success") else {"cards": [], "stats": {}}
 
+def fetch_topics() -> list:
+    """Topics clustered from the uploaded material at upload time (/topics)"""
+    try:
+        response = requests.get(
+            f"{API_URL}/topics",
+            headers={"X-Workspace-Id": st.session_state.workspace_id},
+            timeout=10
+        )
+        result = response.json() if response.status_code == 200 else {}
+    except Exception:
+        result = {}
+    return result.get("topics", []) if result.get("success") else []
+
+def review_card(card: dict, quality: int):
+    """Report how well a saved card was recalled (SM-2 grade 0-5) so it gets rescheduled"""
+    if "id" not in card:
+        return
+    try:
+        requests.post(
+            f"{API_URL}/flashcards/{card['id']}/review",
+            json={"quality": quality},
+            headers={"X-Workspace-Id": st.session_state.workspace_id},
+            timeout=10
+        )
+    except Exception as e:
+        st.warning(f"⚠️ Could not save your review: {e}")
 
 def show_flashcards_interface():
     """
@@ -56,6 +97,19 @@ def show_flashcards_interface():
     
     # ========== GENERATION SECTION ==========
     if not st.session_state.flashcards:
+        # Saved cards that are due come first - no generation needed
+        due = fetch_due_cards()
+        if due["cards"]:
+            st.markdown("#### 📅 Review Due Cards")
+            st.info(f"{len(due['cards'])} saved cards are due for review ({due['stats'].get('total', 0)} saved in total).")
+            if st.button("▶️ Start Review", use_container_width=True):
+                st.session_state.flashcards = due["cards"]
+                st.session_state.current_card_index = 0
+                st.session_state.show_answer = False
+                st.session_state.known_cards = set()
+                st.rerun()
+            st.markdown("---")
+        
         st.markdown("#### 🎯 Generate Flashcards")
         
         col1, col2 = st.columns([3, 1])
@@ -65,6 +119,17 @@ def show_flashcards_interface():
                 "What topic would you like flashcards on?",
                 placeholder="Enter a topic from your uploaded documents"
                 )
+            
+            # Or one of the topics found in the material (its context is precomputed)
+            topics = fetch_topics()
+            topic_id = None
+            if topics:
+                labels = [f"{t['title']} ({t['size']} chunks)" for t in topics]
+                choice = st.selectbox("...or pick a topic from your materials", ["(use the topic above)"] + labels)
+                if choice in labels:
+                    picked = topics[labels.index(choice)]
+                    topic_id = picked["id"]
+                    topic = picked["title"]
         
         with col2:
             num_cards = st.number_input(
@@ -75,6 +140,8 @@ def show_flashcards_interface():
                 step=5
             )
         
+        regenerate = st.checkbox("Generate new cards even if I already have cards on this topic")
+        
         if st.button("🎴 Generate Flashcards", type="primary", use_container_width=True):
             if not topic:
                 st.warning("⚠️ Please enter a topic first!")
@@ -86,8 +153,11 @@ def show_flashcards_interface():
                             f"{API_URL}/flashcards",
                             json={
                                 "topic": topic,
-                                "num_cards": num_cards
+                                "topic_id": topic_id,
+                                "num_cards": num_cards,
+                                "regenerate": regenerate
                             },
+                            headers={"X-Workspace-Id": st.session_state.workspace_id},
                             timeout=60
                         )
                         
@@ -97,12 +167,9 @@ def show_flashcards_interface():
                             
                             if result.get("success"):
                                 data = result["data"]
-                                flashcard_text = data.get("flashcards", "")
-                                
-
                                 
-                                # Parse flashcards
-                                cards = parse_flashcards(flashcard_text)
+                                # Cards arrive already parsed: [{"front", "back"}]
+                                cards = data.get("flashcards", [])
                                 
                                 if cards:
                                     st.session_state.flashcards = cards
@@ -112,7 +179,7 @@ def show_flashcards_interface():
                                     st.success(f"✅ Generated {len(cards)} flashcards!")
                                     st.rerun()
                                 else:
-                                    st.error("❌ Could not parse flashcards. Check debug info above.")
+                                    st.error("❌ No flashcards could be generated from your materials. Try another topic.")
                             else:
                                 st.error(f"❌ Backend error: {result.get('error')}")
                         else:
@@ -128,6 +195,44 @@ def show_flashcards_interface():
                         import traceback
                         st.code(traceback.format_exc())
         
+        # Deck across several topics, generated in parallel on the backend
+        with st.expander("📚 Build a deck from several topics"):
+            deck_topics = st.text_area(
+                "Topics (one per line)",
+                placeholder="Leave empty to pick the main topics of your documents automatically"
+            )
+            cards_per_topic = st.number_input("Cards per topic", min_value=2, max_value=15, value=5)
+            
+            if st.button("📚 Build Deck", use_container_width=True):
+                topics = [line.strip() for line in deck_topics.splitlines() if line.strip()]
+                deck = []
+                progress = st.empty()
+                try:
+                    for event in stream_deck(topics, cards_per_topic):
+                        if event["type"] == "topics":
+                            progress.info(f"Generating cards for {len(event['topics'])} topics...")
+                        elif event["type"] == "cards":
+                            deck.extend(event["cards"])
+                            progress.info(f"✅ {event['topic']}: {len(event['cards'])} cards ({len(deck)} total)")
+                        elif event["type"] == "topic_error":
+                            st.warning(f"⚠️ {event['topic']}: {event['error']}")
+                    
+                    if deck:
+                        st.session_state.flashcards = deck
+                        st.session_state.current_card_index = 0
+                        st.session_state.show_answer = False
+                        st.session_state.known_cards = set()
+                        st.rerun()
+                    else:
+                        st.error("❌ No flashcards were generated.")
+                
+                except requests.exceptions.Timeout:
+                    st.error("⏱️ Request timed out. Try fewer topics.")
+                except requests.exceptions.ConnectionError:
+                    st.error("❌ Cannot connect to backend. Is it running on port 8000?")
+                except Exception as e:
+                    st.error(f"❌ Error: {str(e)}")
+        
         # Tips
         st.markdown("---")
         st.markdown("##### 💡 Tips:")
@@ -203,6 +308,7 @@ def show_flashcards_interface():
             
             with col1:
                 if st.button("❌ Don't Know", use_container_width=True):
+                    review_card(current_card, 1)
                     st.session_state.known_cards.discard(current_idx)
                     st.session_state.show_answer = False
                     if current_idx < len(cards) - 1:
@@ -211,6 +317,7 @@ def show_flashcards_interface():
             
             with col2:
                 if st.button("🤔 Review Again", use_container_width=True):
+                    review_card(current_card, 3)
                     st.session_state.show_answer = False
                     if current_idx < len(cards) - 1:
                         st.session_state.current_card_index += 1
@@ -218,6 +325,7 @@ def show_flashcards_interface():
             
             with col3:
                 if st.button("✅ Know It!", use_container_width=True, type="primary"):
+                    review_card(current_card, 5)
                     st.session_state.known_cards.add(current_idx)
                     st.session_state.show_answer = False
                     if current_idx < len(cards) - 1:
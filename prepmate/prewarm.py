@@ -0,0 +1,72 @@
+# prewarm.py - Pre-generate topic explanations and starter decks after an upload
+#
+# Ingestion ends by clustering the workspace into topics (topic_map.py). With
+# PREWARM=true a background job then generates, for the largest topics, the
+# teaching explanation (kept in the semantic answer cache) and a starter deck
+# (kept in the card store), so the first /teach or /flashcards request for a
+# topic is served from cache instead of waiting on retrieval + Groq.
+import os
+from typing import Optional
+from cache import get_index_generation
+from flashcard_deck import get_rate_limiter
+from jobs import create_job, run_in_background, update_job
+
+PREWARM = os.getenv("PREWARM", "false").lower() in ("1", "true", "yes")
+PREWARM_TOPICS = int(os.getenv("PREWARM_TOPICS", "5"))  # largest topics of the map
+PREWARM_CARDS = int(os.getenv("PREWARM_CARDS", "10"))  # starter deck size (the UI's default request)
+
+_tutor = None
+
+
+def set_tutor(tutor):
+    """Register the RAG engine that generates the content (done at API startup)"""
+    global _tutor
+    _tutor = tutor
+
+
+def schedule_prewarm(workspace: str) -> Optional[str]:
+    """Start pre-generation for a freshly ingested workspace; returns the job id (None when off)"""
+    if not PREWARM or _tutor is None:
+        return None
+    job_id = create_job("prewarm", stage="queued", workspace=workspace)
+    run_in_background(job_id, prewarm_workspace, _tutor, workspace, job_id)
+    return job_id
+
+
+def prewarm_workspace(tutor, workspace: str, job_id: Optional[str] = None) -> dict:
+    """
+    Generate explanations and starter decks for the workspace's largest topics,
+    one LLM call at a time, paced by the LLM_REQUESTS_PER_MINUTE limiter that deck
+    builds share. Stops early if the material changes meanwhile (a newer upload
+    re-clusters the topics and schedules its own pre-generation).
+    """
+    report = (lambda **fields: update_job(job_id, **fields)) if job_id else (lambda **fields: None)
+    pacing = get_rate_limiter()
+    topic_map = tutor.topic_maps.get(workspace)
+    topics = topic_map["topics"][:PREWARM_TOPICS] if topic_map else []
+    generation = get_index_generation(workspace)
+    done = {"topics": 0, "explanations": 0, "cards": 0, "failed": 0}
+    report(stage="prewarming", topics_total=len(topics), **done)
+    print(f"🔥 Pre-generating {len(topics)} topics for '{workspace or 'default'}'")
+    
+    for topic in topics:
+        if get_index_generation(workspace) != generation:
+            print("⏹️ Material changed, stopping pre-generation")
+            break
+        try:
+            pacing.wait_blocking()
+            explanation = tutor.teach(topic["title"], workspace=workspace, topic_id=topic["id"])
+            done["explanations"] += not explanation.get("cached")
+            
+            pacing.wait_blocking()
+            deck = tutor.generate_flashcards(topic["title"], PREWARM_CARDS, workspace=workspace, topic_id=topic["id"])
+            done["cards"] += deck["cards_generated"]
+        except Exception as e:
+            done["failed"] += 1
+            print(f"⚠️ Pre-generation of topic {topic['id']} failed: {e}")
+        done["topics"] += 1
+        report(**done)
+    
+    report(stage="done")
+    print(f"✅ Pre-generation done: {done}")
+    return done
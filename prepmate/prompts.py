@@ -147,17 +147,14 @@ Generate EXACTLY {num_cards} flashcards for active recall and spaced repetition
 
 **CRITICAL: Use ONLY information from the context above. Do NOT use external knowledge or examples.**
 
-**MANDATORY FORMAT** (must be followed exactly):
+**MANDATORY FORMAT** (must be followed exactly): respond with a single JSON object and nothing else:
 
-Card 1:
-Front: [Question or prompt that tests understanding]
-Back: [Clear, complete answer with key details]
+{{"cards": [
+  {{"front": "Question or prompt that tests understanding", "back": "Clear, complete answer with key details"}},
+  {{"front": "Question or prompt", "back": "Clear answer"}}
+]}}
 
-Card 2:
-Front: [Question or prompt]
-Back: [Clear answer]
-
-(Continue for all {num_cards} cards)
+(The "cards" array holds all {num_cards} cards; escape quotes inside strings.)
 
 **FLASHCARD DESIGN PRINCIPLES:**
 
@@ -193,5 +190,45 @@ Back: [Clear answer]
 ✓ Cards progress from fundamental to detailed
 ✓ NO external examples - use only the provided study materials
 
-Now generate {num_cards} high-quality flashcards using ONLY the information from the context above.
+Now generate {num_cards} high-quality flashcards as JSON using ONLY the information from the context above.
+"""
+
+# ============================================================
+# CHAT SUMMARY PROMPT - Rolling summary of older chat turns
+# ============================================================
+
+CHAT_SUMMARY_PROMPT = """You are maintaining a running summary of a tutoring conversation so it can continue without the full transcript.
+
+SUMMARY SO FAR:
+---
+{summary}
+---
+
+NEW EXCHANGES TO FOLD IN:
+---
+{conversation}
+---
+
+Write an updated summary (at most {max_words} words) that keeps:
+- The topics the student asked about and what was explained
+- Facts, definitions or examples the student may refer back to
+- Any confusion or preferences the student expressed
+
+Write it as plain prose in the third person ("The student asked..."). Output only the summary.
+"""
+
+# ============================================================
+# TOPIC EXTRACTION PROMPT - Derive deck topics from the material
+# ============================================================
+
+TOPIC_EXTRACTION_PROMPT = """Below are excerpts sampled from across a student's study materials:
+
+{excerpts}
+
+List the {num_topics} most important distinct topics these materials cover, suitable as flashcard deck sections.
+- Each topic is a short noun phrase (2-6 words)
+- Topics should not overlap
+- Use only topics that appear in the excerpts
+
+Output one topic per line and nothing else.
 """
@@ -1,28 +1,100 @@
 # rag_engine.py - Using Pinecone Inference API with 384-dimension model
 import os
+import time
+import asyncio
+from contextlib import nullcontext
+from typing import List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from pinecone import Pinecone
 from langchain_groq import ChatGroq
+from cache import EmbeddingCache, SemanticAnswerCache, get_index_generation
+from workspaces import DEFAULT_WORKSPACE
+from vector_store import VECTOR_STORE, get_vector_store
+from embeddings import EMBEDDER, get_embedder
+from bm25_index import HYBRID_SEARCH, get_bm25_index, reciprocal_rank_fusion
+from context_packer import CONTEXT_BUDGETS, LLM_CONTEXT_WINDOW, pack_context, trim_history, fit_to_window
+from chat_sessions import ChatSessionStore, SESSION_SUMMARY_WORDS, format_transcript
+from reranker import RERANK_CANDIDATES, StageTimings, get_reranker
+from flashcard_deck import (
+    DECK_MAX_TOPICS, DECK_CONCURRENCY, TOPIC_SAMPLE_CHUNKS, CardDeduplicator, get_rate_limiter,
+    parse_topic_list, format_excerpts
+)
+from flashcard_parser import FlashcardStreamParser, parse_flashcards, failed_generation
+from card_store import get_card_store
+from topic_map import get_topic_maps
 from prompts import (
     TUTOR_SYSTEM_PROMPT,
     TEACHING_PROMPT,
     QA_PROMPT,
-    FLASHCARD_PROMPT
+    FLASHCARD_PROMPT,
+    CHAT_SUMMARY_PROMPT,
+    TOPIC_EXTRACTION_PROMPT
 )
 
 load_dotenv()
 
+# Max concurrent blocking Pinecone calls (embed/query) run off the event loop
+PINECONE_IO_WORKERS = int(os.getenv("PINECONE_IO_WORKERS", "16"))
+
+# Query embedding cache (set EMBED_CACHE_PATH to persist it across restarts)
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "1024"))
+EMBED_CACHE_TTL = float(os.getenv("EMBED_CACHE_TTL", "86400"))
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH")
+
+# Semantic answer cache for teach / answer_question
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "256"))
+
+# Concurrent LLM completions per /qa/batch request
+QA_BATCH_CONCURRENCY = int(os.getenv("QA_BATCH_CONCURRENCY", "8"))
+
+# Hybrid retrieval: each retriever proposes this many candidates per requested chunk
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "3"))
+
 class RAGTutor:
     """RAG-based Tutor System using Pinecone Inference API"""
     
     def __init__(self):
         print("🚀 Initializing RAG Tutor...")
         
-        # Connect to Pinecone
-        print("Connecting to Pinecone...")
-        self.pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-        self.index = self.pc.Index("crammer")
-        print("✅ Connected to Pinecone")
+        # Connect to Pinecone (only needed when the store or the embedder is remote)
+        pc = None
+        if "pinecone" in (VECTOR_STORE, EMBEDDER):
+            print("Connecting to Pinecone...")
+            pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+        self.store = get_vector_store(pc)
+        self.embedder = get_embedder(pc)
+        self.keyword_index = get_bm25_index() if HYBRID_SEARCH else None
+        self.reranker = get_reranker()
+        self.retrieval_timings = StageTimings()
+        print(f"✅ Retrieval ready (vector store: {VECTOR_STORE}, embedder: {self.embedder.name})")
+        
+        # The pinecone SDK only ships a blocking client, so the async path
+        # runs embed/query calls on this bounded pool instead of the event loop
+        self._executor = ThreadPoolExecutor(
+            max_workers=PINECONE_IO_WORKERS,
+            thread_name_prefix="pinecone-io"
+        )
+        
+        self.embedding_cache = EmbeddingCache(
+            max_size=EMBED_CACHE_SIZE,
+            ttl_seconds=EMBED_CACHE_TTL,
+            persist_path=EMBED_CACHE_PATH
+        )
+        self.answer_cache = SemanticAnswerCache(
+            threshold=ANSWER_CACHE_THRESHOLD,
+            max_size=ANSWER_CACHE_SIZE
+        )
+        
+        # Server-side chat state (sliding window + rolling summary per session)
+        self.sessions = ChatSessionStore()
+        self._background_tasks = set()
+        
+        # Generated flashcards are kept with their review schedule
+        self.cards = get_card_store()
+        # Topics clustered at ingestion, each with a precomputed context set
+        self.topic_maps = get_topic_maps()
         
         # Initialize LLM
         print("Initializing Groq LLM...")
@@ -31,88 +103,398 @@ class RAGTutor:
             groq_api_key=os.getenv("GROQ_API_KEY"),
             temperature=0.7
         )
+        # Flashcards use Groq JSON mode so the output parses as {"cards": [...]}
+        self.json_llm = self.llm.bind(response_format={"type": "json_object"})
         print("✅ Groq LLM ready")
         
         print("✅ RAG Tutor ready! Using Pinecone Inference (multilingual-e5-small, 384d)")
     
-    def _get_relevant_context(self, query: str, k: int = 4) -> str:
-        """Retrieve relevant chunks from vector store using Pinecone Inference"""
+    def _embed_query(self, query: str) -> list:
+        """Embed a query, reusing the cached vector for repeated queries"""
+        # keyed by embedder too, so a persisted cache survives switching models
+        cache_key = f"{self.embedder.name} {query}"
+        cached = self.embedding_cache.get(cache_key)
+        if cached is not None:
+            print("⚡ Query embedding cache hit")
+            return cached
+        
+        query_embedding = self.embedder.embed_query(query)
+        
+        self.embedding_cache.put(cache_key, query_embedding)
+        return query_embedding
+    
+    def _embed_queries(self, queries: List[str]):
+        """
+        Embed every uncached query in one batched call and cache the vectors. Only
+        peeks at the cache: the per-query _embed_query lookup that follows is the
+        one counted in the hit rate.
+        """
+        missing = list(dict.fromkeys(
+            query for query in queries
+            if not self.embedding_cache.peek(f"{self.embedder.name} {query}")
+        ))
+        if not missing:
+            return
+        print(f"🔢 Embedding {len(missing)} queries in one batch")
+        for query, vector in zip(missing, self.embedder.embed_queries(missing)):
+            self.embedding_cache.put(f"{self.embedder.name} {query}", vector)
+    
+    def _get_relevant_context(self, query: str, k: int = 4, sources: Optional[List[str]] = None,
+                              workspace: str = DEFAULT_WORKSPACE, mode: Optional[str] = None) -> Tuple[str, int]:
+        """
+        Retrieve relevant chunks from vector store using Pinecone Inference.
+        Searches the workspace's namespace; `sources` restricts the search to
+        chunks of those uploaded files. With HYBRID_SEARCH, dense and BM25
+        keyword results are merged by reciprocal rank fusion; with a re-ranker,
+        RERANK_CANDIDATES chunks are re-scored by the cross-encoder. The top `k`
+        chunks are deduplicated and packed into the `mode`'s context token budget.
+        Returns (context, number of chunks packed). Each stage's latency is recorded in `retrieval_timings`.
+        """
         print(f"🔍 Searching for relevant context (top {k})...")
         
         try:
-            # Embed query using Pinecone Inference API
-            query_embedding = self.pc.inference.embed(
-    model="llama-text-embed-v2",
-    inputs=[query],
-    parameters={"input_type": "query", "truncate": "END"}
-)[0].values
+            started = time.perf_counter()
+            query_embedding = self._embed_query(query)
+            stage_start = self._record_stage("embed", started)
+            
+            search_filter = {"source": {"$in": list(sources)}} if sources else None
+            keep = max(k, RERANK_CANDIDATES) if self.reranker else k
+            candidates = keep * HYBRID_CANDIDATES if self.keyword_index else keep
             
-            # Search Pinecone
-            results = self.index.query(
-                vector=query_embedding,
-                top_k=k,
-                include_metadata=True
+            # Search the vector store
+            matches = self.store.query(
+                query_embedding,
+                top_k=candidates,
+                namespace=workspace,
+                filter=search_filter
             )
+            stage_start = self._record_stage("vector_search", stage_start)
+            
+            # Exact terms (formula names, acronyms) that embeddings blur
+            if self.keyword_index:
+                keyword_matches = self.keyword_index.search(query, candidates, workspace, search_filter)
+                if keyword_matches:
+                    matches = reciprocal_rank_fusion([matches, keyword_matches], top_k=keep)
+                    print(f"  Fused with {len(keyword_matches)} keyword matches")
+                stage_start = self._record_stage("keyword_search", stage_start)
+            matches = matches[:keep]
+            
+            # Re-score the over-fetched candidates and keep the best k
+            if self.reranker and len(matches) > 1:
+                try:
+                    print(f"  Re-ranking {len(matches)} candidates")
+                    matches = self.reranker.rerank(query, matches, k)
+                except Exception as e:
+                    print(f"⚠️ Re-ranking failed, using retrieval order: {e}")
+                stage_start = self._record_stage("rerank", stage_start)
+            matches = matches[:k]
             
             # Extract text from results
             contexts = []
-            for match in results.matches:
-                text = match.metadata.get("text", "")
+            for match in matches:
+                text = match["metadata"].get("text", "")
                 if text:
                     contexts.append(text)
             
-            context = "\n\n".join(contexts)
             print(f"✅ Found {len(contexts)} relevant chunks")
-            return context
-            
+            packed = pack_context(contexts, CONTEXT_BUDGETS.get(mode, LLM_CONTEXT_WINDOW // 2))
+            self._record_stage("pack", stage_start)
+            self._record_stage("total", started)
+            return packed
+        
         except Exception as e:
             print(f"❌ Error retrieving context: {e}")
-            return ""
+            return "", 0
     
-    def teach(self, topic: str) -> dict:
-        """Teaching mode - explain a topic"""
-        print(f"🧑‍🏫 Teaching: {topic}")
+    def _record_stage(self, stage: str, started: float) -> float:
+        """Record a retrieval stage's latency; returns the time it ended (the next stage's start)"""
+        now = time.perf_counter()
+        self.retrieval_timings.record(stage, now - started)
+        return now
+    
+    async def _aget_relevant_context(self, query: str, k: int = 4, sources: Optional[List[str]] = None,
+                                     workspace: str = DEFAULT_WORKSPACE, mode: Optional[str] = None) -> Tuple[str, int]:
+        """Async retrieval - runs the blocking Pinecone calls on the I/O pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, self._get_relevant_context, query, k, sources, workspace, mode
+        )
+    
+    @staticmethod
+    def _cache_mode(mode: str, sources: Optional[List[str]]) -> str:
+        """Answers restricted to some files must not be served for other selections"""
+        return f"{mode}:{'|'.join(sorted(sources))}" if sources else mode
+    
+    def _lookup_answer(self, mode: str, query: str, workspace: str = DEFAULT_WORKSPACE):
+        """Check the semantic answer cache. Returns (hit, query vector, index generation)"""
+        generation = get_index_generation(workspace)
+        try:
+            vector = self._embed_query(query)
+        except Exception as e:
+            print(f"⚠️ Answer cache lookup skipped: {e}")
+            return None, None, generation
         
-        context = self._get_relevant_context(topic, k=5)
+        hit = self.answer_cache.get(mode, vector, generation, workspace)
+        if hit:
+            print(f"⚡ Answer cache hit (similarity {hit[1]:.3f})")
+        return hit, vector, generation
+    
+    async def _alookup_answer(self, mode: str, query: str, workspace: str = DEFAULT_WORKSPACE):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, self._lookup_answer, mode, query, workspace
+        )
+    
+    async def _ablocking(self, fn, *args):
+        """Run a blocking call (SQLite card store, topic map files) on the I/O pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+    
+    def _store_answer(self, mode: str, vector, generation: int, result: dict,
+                      workspace: str = DEFAULT_WORKSPACE):
+        if vector is not None:
+            self.answer_cache.put(mode, vector, generation, result, workspace)
+    
+    def _from_cache(self, hit, **fields) -> dict:
+        result, similarity = hit
+        return {**result, **fields, "cached": True, "cache_similarity": round(similarity, 4)}
+    
+    # ========== TOPIC MAP ==========
+    
+    def _map_topic(self, topic: str, topic_id: Optional[str], workspace: str):
+        """(topic text, topic map entry or None) - a topic id from /topics replaces retrieval"""
+        if not topic_id:
+            if not topic:
+                raise ValueError("Give a topic or a topic_id from /topics")
+            return topic, None
+        entry = self.topic_maps.get_topic(workspace, topic_id)
+        if entry is None:
+            raise ValueError(f"Unknown topic id '{topic_id}' - see /topics for the current topics")
+        return topic or entry["title"], entry
+    
+    def _topic_context(self, entry: dict, mode: str, sources: Optional[List[str]] = None) -> Tuple[str, int]:
+        """Pack a topic's precomputed chunks into the mode's budget - no embed or search"""
+        texts = [chunk["text"] for chunk in entry["chunks"] if not sources or chunk["source"] in sources]
+        print(f"🧭 Using {len(texts)} precomputed chunks of topic {entry['id']} ({entry['title']})")
+        return pack_context(texts, CONTEXT_BUDGETS.get(mode, LLM_CONTEXT_WINDOW // 2))
+    
+    # ========== PROMPT BUILDERS (shared by sync and async paths) ==========
+    
+    def _teach_messages(self, topic: str, context: str) -> list:
         prompt = TEACHING_PROMPT.format(context=context, question=topic)
-        
-        messages = [
+        return fit_to_window([
             {"role": "system", "content": TUTOR_SYSTEM_PROMPT},
             {"role": "user", "content": prompt}
-        ]
+        ])
+    
+    def _qa_messages(self, question: str, context: str) -> list:
+        prompt = QA_PROMPT.format(context=context, question=question)
+        return fit_to_window([
+            {"role": "system", "content": TUTOR_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ])
+    
+    def _flashcard_messages(self, context: str, num_cards: int) -> list:
+        prompt = FLASHCARD_PROMPT.format(
+            context=context,
+            num_cards=num_cards
+        )
+        print(f"\n📝 Prompt created: {len(prompt)} characters")
+        return fit_to_window([
+            {"role": "system", "content": "You are a flashcard generator for students. You answer in JSON."},
+            {"role": "user", "content": prompt}
+        ])
+    
+    def _chat_messages(self, message: str, context: str, chat_history: list = None,
+                       summary: str = "") -> list:
+        messages = [{"role": "system", "content": TUTOR_SYSTEM_PROMPT}]
+        
+        if summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation: {summary}"})
         
-        response = self.llm.invoke(messages)
+        if chat_history:
+            # only the most recent turns that fit the history budget
+            messages.extend(trim_history(chat_history))
         
+        user_message = f"""Based on this content:
+{context}
+
+Student says: {message}"""
+
+        messages.append({"role": "user", "content": user_message})
+        return fit_to_window(messages)
+    
+    def _summary_messages(self, summary: str, folded: list) -> list:
+        prompt = CHAT_SUMMARY_PROMPT.format(
+            summary=summary or "(nothing yet)",
+            conversation=format_transcript(folded),
+            max_words=SESSION_SUMMARY_WORDS
+        )
+        return fit_to_window([{"role": "user", "content": prompt}])
+    
+    # ========== FLASHCARD OUTPUT ==========
+    
+    def _invoke_flashcards(self, messages: list) -> str:
+        """Raw JSON-mode output; when Groq rejects it as invalid JSON, the rejected text"""
+        try:
+            return self.json_llm.invoke(messages).content
+        except Exception as e:
+            rejected = failed_generation(e)
+            if rejected is None:
+                raise
+            print("⚠️ Flashcard JSON failed validation, recovering the cards that parse")
+            return rejected
+    
+    async def _ainvoke_flashcards(self, messages: list) -> str:
+        try:
+            return (await self.json_llm.ainvoke(messages)).content
+        except Exception as e:
+            rejected = failed_generation(e)
+            if rejected is None:
+                raise
+            print("⚠️ Flashcard JSON failed validation, recovering the cards that parse")
+            return rejected
+    
+    def _flashcard_result(self, topic: str, num_cards: int, output: str, workspace: str) -> dict:
+        """Parse the LLM output once, here, into typed cards and save them for review"""
+        cards, malformed = parse_flashcards(output)
+        print(f"✅ Parsed {len(cards)} cards ({malformed} malformed)")
+        stored = self.cards.add_cards(workspace, [card.model_dump() for card in cards], topic)
         return {
+            "mode": "flashcards",
+            "topic": topic,
+            "num_cards": num_cards,
+            "cards_generated": len(cards),
+            "parse_errors": malformed,
+            "flashcards": stored
+        }
+    
+    def _stored_flashcards(self, topic: str, num_cards: int, sources: Optional[List[str]],
+                           workspace: str) -> Optional[dict]:
+        """The topic's saved cards when there are enough of them, so the LLM isn't called again"""
+        if sources:
+            return None
+        stored = self.cards.cards_for_topic(workspace, topic, num_cards)
+        if len(stored) < num_cards:
+            return None
+        print(f"🗃️ Reusing {len(stored)} saved cards for '{topic}'")
+        return {
+            "mode": "flashcards",
+            "topic": topic,
+            "num_cards": num_cards,
+            "cards_generated": 0,
+            "parse_errors": 0,
+            "flashcards": stored,
+            "from_store": True
+        }
+    
+    # ========== CHAT SESSIONS ==========
+    
+    def _chat_session(self, session_id: Optional[str], chat_history: list, workspace: str):
+        """
+        The server-side session for this chat, or None for legacy clients that send
+        their own chat_history without a session id.
+        """
+        if session_id or not chat_history:
+            return self.sessions.get_or_create(session_id, workspace)
+        return None
+    
+    def _summarize_session(self, session):
+        """Fold messages that slid out of the window into the session's rolling summary"""
+        folded = session.claim_overflow()
+        if not folded:
+            return
+        summary = None
+        try:
+            summary = self.llm.invoke(self._summary_messages(session.summary, folded)).content.strip()
+            print(f"🧾 Summarized {len(folded)} messages of chat session {session.session_id[:8]}")
+        except Exception as e:
+            print(f"⚠️ Chat summary failed, keeping the messages: {e}")
+        finally:
+            session.fold(summary, folded)
+    
+    async def _asummarize_session(self, session):
+        folded = session.claim_overflow()
+        if not folded:
+            return
+        summary = None
+        try:
+            response = await self.llm.ainvoke(self._summary_messages(session.summary, folded))
+            summary = response.content.strip()
+            print(f"🧾 Summarized {len(folded)} messages of chat session {session.session_id[:8]}")
+        except Exception as e:
+            print(f"⚠️ Chat summary failed, keeping the messages: {e}")
+        finally:
+            session.fold(summary, folded)
+    
+    def _schedule_summary(self, session):
+        """Summarize in the background so the reply isn't held up by a second LLM call"""
+        task = asyncio.create_task(self._asummarize_session(session))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+    
+    # ========== SYNC API ==========
+    
+    def teach(self, topic: str = "", sources: Optional[List[str]] = None,
+              workspace: str = DEFAULT_WORKSPACE, topic_id: Optional[str] = None) -> dict:
+        """Teaching mode - explain a topic (or a topic map entry, by `topic_id`)"""
+        topic, entry = self._map_topic(topic, topic_id, workspace)
+        print(f"🧑‍🏫 Teaching: {topic}")
+        
+        cache_mode = self._cache_mode(f"teaching@{topic_id}" if entry else "teaching", sources)
+        hit, vector, generation = self._lookup_answer(cache_mode, topic, workspace)
+        if hit:
+            return self._from_cache(hit, topic=topic)
+        
+        if entry:
+            context, sources_used = self._topic_context(entry, "teaching", sources)
+        else:
+            context, sources_used = self._get_relevant_context(topic, k=5, sources=sources, workspace=workspace, mode="teaching")
+        response = self.llm.invoke(self._teach_messages(topic, context))
+        
+        result = {
             "mode": "teaching",
             "topic": topic,
             "explanation": response.content,
-            "sources_used": len(context.split("\n\n"))
+            "sources_used": sources_used
         }
+        self._store_answer(cache_mode, vector, generation, result, workspace)
+        return result
     
-    def answer_question(self, question: str) -> dict:
+    def answer_question(self, question: str, sources: Optional[List[str]] = None,
+                        workspace: str = DEFAULT_WORKSPACE) -> dict:
         """Q&A mode - answer specific questions"""
         print(f"❓ Answering: {question}")
         
-        context = self._get_relevant_context(question, k=3)
-        prompt = QA_PROMPT.format(context=context, question=question)
-        
-        messages = [
-            {"role": "system", "content": TUTOR_SYSTEM_PROMPT},
-            {"role": "user", "content": prompt}
-        ]
+        cache_mode = self._cache_mode("qa", sources)
+        hit, vector, generation = self._lookup_answer(cache_mode, question, workspace)
+        if hit:
+            return self._from_cache(hit, question=question)
         
-        response = self.llm.invoke(messages)
+        context, sources_used = self._get_relevant_context(question, k=3, sources=sources, workspace=workspace, mode="qa")
+        response = self.llm.invoke(self._qa_messages(question, context))
         
-        return {
+        result = {
             "mode": "qa",
             "question": question,
             "answer": response.content,
-            "sources_used": len(context.split("\n\n"))
+            "sources_used": sources_used
         }
-     
-    def generate_flashcards(self, topic: str, num_cards: int = 15) -> dict:
-        """Generate flashcards for revision"""
+        self._store_answer(cache_mode, vector, generation, result, workspace)
+        return result
+    
+    def generate_flashcards(self, topic: str = "", num_cards: int = 15, sources: Optional[List[str]] = None,
+                            workspace: str = DEFAULT_WORKSPACE, regenerate: bool = False,
+                            topic_id: Optional[str] = None) -> dict:
+        """
+        Generate flashcards for revision, on a topic or a topic map entry (`topic_id`).
+        Saved cards for the topic are reused unless `regenerate`.
+        """
+        topic, entry = self._map_topic(topic, topic_id, workspace)
+        stored = None if regenerate else self._stored_flashcards(topic, num_cards, sources, workspace)
+        if stored:
+            return stored
+        
         print(f"\n{'='*70}")
         print(f"🗂️ FLASHCARD GENERATION START")
         print(f"{'='*70}")
@@ -120,61 +502,318 @@ class RAGTutor:
         print(f"Num cards requested: {num_cards}")
         
         # Get comprehensive context
-        print("\n📚 Retrieving context from Pinecone...")
-        context = self._get_relevant_context(topic, k=8)
-        
-        # Create prompt
-        prompt = FLASHCARD_PROMPT.format(
-            context=context,
-            num_cards=num_cards
-        )
-        
-        print(f"\n📝 Prompt created: {len(prompt)} characters")
-        
-        # Add system message
-        messages = [
-            {"role": "system", "content": "You are a flashcard generator for students."},
-            {"role": "user", "content": prompt}
-        ]
+        if entry:
+            context, _ = self._topic_context(entry, "flashcards", sources)
+        else:
+            print("\n📚 Retrieving context from Pinecone...")
+            context, _ = self._get_relevant_context(topic, k=8, sources=sources, workspace=workspace, mode="flashcards")
+        messages = self._flashcard_messages(context, num_cards)
         
         # Get response
         print("\n🤖 Calling Groq LLM...")
-        response = self.llm.invoke(messages)
+        output = self._invoke_flashcards(messages)
         print("✅ LLM response received")
         
-        print(f"📏 Total response length: {len(response.content)} characters")
+        print(f"📏 Total response length: {len(output)} characters")
         print("="*70 + "\n")
         
-        return {
-            "mode": "flashcards",
+        return self._flashcard_result(topic, num_cards, output, workspace)
+    
+    def chat(self, message: str, chat_history: list = None, sources: Optional[List[str]] = None,
+             workspace: str = DEFAULT_WORKSPACE, session_id: Optional[str] = None) -> dict:
+        """
+        Interactive chat with context awareness. Pass `session_id` to continue a
+        server-side session (chat_history is then ignored); a new one is started
+        when neither is given.
+        """
+        print(f"💬 Chat: {message}")
+        
+        session = self._chat_session(session_id, chat_history, workspace)
+        summary, history = session.prompt_history() if session else ("", chat_history)
+        
+        context, sources_used = self._get_relevant_context(message, k=5, sources=sources, workspace=workspace, mode="chat")
+        response = self.llm.invoke(self._chat_messages(message, context, history, summary))
+        
+        result = {
+            "mode": "chat",
+            "message": message,
+            "response": response.content,
+            "sources_used": sources_used
+        }
+        if session:
+            session.add_turn(message, response.content)
+            self._summarize_session(session)
+            result["session_id"] = session.session_id
+        return result
+    
+    # ========== ASYNC API (used by the FastAPI endpoints) ==========
+    
+    async def ateach(self, topic: str = "", sources: Optional[List[str]] = None,
+                     workspace: str = DEFAULT_WORKSPACE, topic_id: Optional[str] = None) -> dict:
+        """Async teaching mode - explain a topic (or a topic map entry, by `topic_id`)"""
+        topic, entry = await self._ablocking(self._map_topic, topic, topic_id, workspace)
+        print(f"🧑‍🏫 Teaching: {topic}")
+        
+        cache_mode = self._cache_mode(f"teaching@{topic_id}" if entry else "teaching", sources)
+        hit, vector, generation = await self._alookup_answer(cache_mode, topic, workspace)
+        if hit:
+            return self._from_cache(hit, topic=topic)
+        
+        if entry:
+            context, sources_used = self._topic_context(entry, "teaching", sources)
+        else:
+            context, sources_used = await self._aget_relevant_context(topic, k=5, sources=sources, workspace=workspace, mode="teaching")
+        response = await self.llm.ainvoke(self._teach_messages(topic, context))
+        
+        result = {
+            "mode": "teaching",
             "topic": topic,
-            "num_cards": num_cards,
-            "flashcards": response.content
+            "explanation": response.content,
+            "sources_used": sources_used
         }
+        self._store_answer(cache_mode, vector, generation, result, workspace)
+        return result
     
-    def chat(self, message: str, chat_history: list = None) -> dict:
-        """Interactive chat with context awareness"""
-        print(f"💬 Chat: {message}")
+    async def aanswer_question(self, question: str, sources: Optional[List[str]] = None,
+                               workspace: str = DEFAULT_WORKSPACE,
+                               llm_slots: Optional[asyncio.Semaphore] = None) -> dict:
+        """Async Q&A mode - answer specific questions; `llm_slots` caps concurrent LLM calls"""
+        print(f"❓ Answering: {question}")
         
-        context = self._get_relevant_context(message, k=5)
+        cache_mode = self._cache_mode("qa", sources)
+        hit, vector, generation = await self._alookup_answer(cache_mode, question, workspace)
+        if hit:
+            return self._from_cache(hit, question=question)
         
-        messages = [{"role": "system", "content": TUTOR_SYSTEM_PROMPT}]
+        context, sources_used = await self._aget_relevant_context(question, k=3, sources=sources, workspace=workspace, mode="qa")
+        async with llm_slots or nullcontext():
+            response = await self.llm.ainvoke(self._qa_messages(question, context))
         
-        if chat_history:
-            messages.extend(chat_history)
+        result = {
+            "mode": "qa",
+            "question": question,
+            "answer": response.content,
+            "sources_used": sources_used
+        }
+        self._store_answer(cache_mode, vector, generation, result, workspace)
+        return result
+    
+    async def agenerate_flashcards(self, topic: str = "", num_cards: int = 15, sources: Optional[List[str]] = None,
+                                   workspace: str = DEFAULT_WORKSPACE, regenerate: bool = False,
+                                   topic_id: Optional[str] = None) -> dict:
+        """Async flashcard generation for revision (see generate_flashcards)"""
+        topic, entry = await self._ablocking(self._map_topic, topic, topic_id, workspace)
+        print(f"🗂️ Flashcards: {topic} ({num_cards} cards)")
         
-        user_message = f"""Based on this content:
-{context}
-
-Student says: {message}"""
+        stored = None if regenerate else await self._ablocking(
+            self._stored_flashcards, topic, num_cards, sources, workspace
+        )
+        if stored:
+            return stored
         
-        messages.append({"role": "user", "content": user_message})
+        if entry:
+            context, _ = self._topic_context(entry, "flashcards", sources)
+        else:
+            context, _ = await self._aget_relevant_context(topic, k=8, sources=sources, workspace=workspace, mode="flashcards")
+        output = await self._ainvoke_flashcards(self._flashcard_messages(context, num_cards))
+        print(f"✅ LLM response received ({len(output)} characters)")
+        
+        return await self._ablocking(self._flashcard_result, topic, num_cards, output, workspace)
+    
+    async def achat(self, message: str, chat_history: list = None, sources: Optional[List[str]] = None,
+                    workspace: str = DEFAULT_WORKSPACE, session_id: Optional[str] = None) -> dict:
+        """Async interactive chat with context awareness (see chat() for sessions)"""
+        print(f"💬 Chat: {message}")
         
-        response = self.llm.invoke(messages)
+        session = self._chat_session(session_id, chat_history, workspace)
+        summary, history = session.prompt_history() if session else ("", chat_history)
         
-        return {
+        context, sources_used = await self._aget_relevant_context(message, k=5, sources=sources, workspace=workspace, mode="chat")
+        response = await self.llm.ainvoke(self._chat_messages(message, context, history, summary))
+        
+        result = {
             "mode": "chat",
             "message": message,
             "response": response.content,
-            "sources_used": len(context.split("\n\n"))
-        }
\ No newline at end of file
+            "sources_used": sources_used
+        }
+        if session:
+            session.add_turn(message, response.content)
+            self._schedule_summary(session)
+            result["session_id"] = session.session_id
+        return result
+    
+    async def abatch_answer_questions(self, questions: List[str], sources: Optional[List[str]] = None,
+                                      workspace: str = DEFAULT_WORKSPACE):
+        """
+        Answer a whole problem set, yielding (index, result, error) as each question
+        finishes. All questions are embedded in one batched call up front, retrieval
+        runs concurrently on the I/O pool, and at most QA_BATCH_CONCURRENCY LLM
+        completions are in flight.
+        """
+        print(f"📋 Batch Q&A: {len(questions)} questions")
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._embed_queries, questions)
+        
+        llm_slots = asyncio.Semaphore(QA_BATCH_CONCURRENCY)
+        
+        async def answer(index: int, question: str):
+            try:
+                return index, await self.aanswer_question(question, sources, workspace, llm_slots), None
+            except Exception as e:
+                return index, None, e
+        
+        tasks = [asyncio.create_task(answer(index, question)) for index, question in enumerate(questions)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            # the client went away: don't keep spending LLM calls on unread answers
+            for task in tasks:
+                task.cancel()
+    
+    async def aderive_topics(self, num_topics: int = 5, sources: Optional[List[str]] = None,
+                             workspace: str = DEFAULT_WORKSPACE) -> List[str]:
+        """Ask the LLM for the main topics of the workspace's material, from excerpts spread across it"""
+        texts = get_bm25_index().sample_texts(TOPIC_SAMPLE_CHUNKS, workspace, sources)
+        if not texts:
+            raise ValueError("No uploaded material to derive topics from - upload documents or list topics")
+        
+        prompt = TOPIC_EXTRACTION_PROMPT.format(excerpts=format_excerpts(texts), num_topics=num_topics)
+        response = await self.llm.ainvoke(fit_to_window([{"role": "user", "content": prompt}]))
+        topics = parse_topic_list(response.content, num_topics)
+        print(f"🧭 Derived {len(topics)} topics: {topics}")
+        return topics
+    
+    async def astream_flashcard_deck(self, topics: Optional[List[str]] = None, cards_per_topic: int = 5,
+                                     num_topics: int = 5, sources: Optional[List[str]] = None,
+                                     workspace: str = DEFAULT_WORKSPACE):
+        """
+        Build a deck over many topics (derived from the material when none are given),
+        yielding each topic's cards as soon as they are generated. Topic contexts share
+        one batched embed call, generation runs DECK_CONCURRENCY topics at a time (paced
+        by the process-wide LLM_REQUESTS_PER_MINUTE limiter), and cards nearly identical
+        to an earlier card are dropped.
+        """
+        if not topics:
+            topics = await self.aderive_topics(num_topics, sources, workspace)
+        topics = list(dict.fromkeys(topic.strip() for topic in topics if topic.strip()))[:DECK_MAX_TOPICS]
+        print(f"🗂️ Flashcard deck: {len(topics)} topics x {cards_per_topic} cards")
+        yield {"type": "topics", "topics": topics}
+        if not topics:
+            return
+        
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._embed_queries, topics)
+        
+        llm_slots = asyncio.Semaphore(DECK_CONCURRENCY)
+        pacing = get_rate_limiter()
+        deduplicator = CardDeduplicator()
+        
+        async def generate(topic: str):
+            try:
+                context, _ = await self._aget_relevant_context(
+                    topic, k=8, sources=sources, workspace=workspace, mode="flashcards"
+                )
+                async with llm_slots:
+                    await pacing.wait()
+                    output = await self._ainvoke_flashcards(self._flashcard_messages(context, cards_per_topic))
+                cards, _ = parse_flashcards(output)
+                cards = [{"front": card.front, "back": card.back} for card in cards]
+                vectors = await loop.run_in_executor(
+                    self._executor, self.embedder.embed_queries, [card["front"] for card in cards]
+                ) if cards else []
+                return topic, cards, vectors, None
+            except Exception as e:
+                return topic, [], [], e
+        
+        tasks = [asyncio.create_task(generate(topic)) for topic in topics]
+        kept = removed = 0
+        try:
+            for finished in asyncio.as_completed(tasks):
+                topic, cards, vectors, error = await finished
+                if error is not None:
+                    print(f"❌ Deck topic '{topic}' failed: {error}")
+                    yield {"type": "topic_error", "topic": topic, "error": str(error)}
+                    continue
+                
+                unique = await self._ablocking(
+                    self.cards.add_cards, workspace, deduplicator.filter(cards, vectors), topic
+                )
+                kept += len(unique)
+                removed += len(cards) - len(unique)
+                yield {
+                    "type": "cards",
+                    "topic": topic,
+                    "cards": unique,
+                    "duplicates_removed": len(cards) - len(unique)
+                }
+        finally:
+            for task in tasks:
+                task.cancel()
+        
+        print(f"✅ Deck ready: {kept} cards, {removed} duplicates removed")
+        yield {"type": "deck", "topics": len(topics), "cards": kept, "duplicates_removed": removed}
+    
+    # ========== STREAMING API (token-by-token, used by the SSE endpoints) ==========
+    
+    async def astream_chat(self, message: str, chat_history: list = None, sources: Optional[List[str]] = None,
+                           workspace: str = DEFAULT_WORKSPACE, session_id: Optional[str] = None):
+        """Async chat that yields response tokens as the LLM produces them"""
+        print(f"💬 Chat (stream): {message}")
+        
+        session = self._chat_session(session_id, chat_history, workspace)
+        summary, history = session.prompt_history() if session else ("", chat_history)
+        if session:
+            yield {"type": "session", "session_id": session.session_id}
+        
+        context, sources_used = await self._aget_relevant_context(message, k=5, sources=sources, workspace=workspace, mode="chat")
+        yield {"type": "sources", "sources_used": sources_used}
+        
+        parts = []
+        async for chunk in self.llm.astream(self._chat_messages(message, context, history, summary)):
+            if chunk.content:
+                parts.append(chunk.content)
+                yield {"type": "token", "content": chunk.content}
+        
+        if session:
+            session.add_turn(message, "".join(parts))
+            self._schedule_summary(session)
+    
+    async def astream_flashcards(self, topic: str = "", num_cards: int = 15, sources: Optional[List[str]] = None,
+                                 workspace: str = DEFAULT_WORKSPACE, regenerate: bool = False,
+                                 topic_id: Optional[str] = None):
+        """
+        Async flashcard generation that yields each card ({"type": "card"}) as soon as
+        its JSON object is complete, then a "cards_done" count
+        """
+        topic, entry = await self._ablocking(self._map_topic, topic, topic_id, workspace)
+        print(f"🗂️ Flashcards (stream): {topic} ({num_cards} cards)")
+        
+        stored = None if regenerate else await self._ablocking(
+            self._stored_flashcards, topic, num_cards, sources, workspace
+        )
+        if stored:
+            for card in stored["flashcards"]:
+                yield {"type": "card", "card": card}
+            yield {"type": "cards_done", "cards_generated": 0, "from_store": True}
+            return
+        
+        if entry:
+            context, _ = self._topic_context(entry, "flashcards", sources)
+        else:
+            context, _ = await self._aget_relevant_context(topic, k=8, sources=sources, workspace=workspace, mode="flashcards")
+        
+        # Groq doesn't stream in JSON mode; the prompt alone asks for JSON here
+        parser = FlashcardStreamParser()
+        async for chunk in self.llm.astream(self._flashcard_messages(context, num_cards)):
+            cards = parser.feed(chunk.content) if chunk.content else []
+            if cards:
+                for card in await self._ablocking(self.cards.add_cards, workspace, [c.model_dump() for c in cards], topic):
+                    yield {"type": "card", "card": card}
+        
+        cards = parser.finish()
+        if cards:
+            for card in await self._ablocking(self.cards.add_cards, workspace, [c.model_dump() for c in cards], topic):
+                yield {"type": "card", "card": card}
+        yield {"type": "cards_done", "cards_generated": parser.cards}
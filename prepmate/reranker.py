@@ -0,0 +1,137 @@
+# reranker.py - Optional re-rank stage: re-score retrieved chunks with a local cross-encoder
+#
+# Enable with RERANKER=local. Retrieval then over-fetches RERANK_CANDIDATES chunks,
+# the cross-encoder scores each (query, chunk) pair on the CPU in batches, and
+# only the best k reach the prompt. Scores are cached per (query, chunk id), so
+# repeated topics cost nothing after the first request.
+import os
+import time
+import threading
+from collections import OrderedDict, deque
+from typing import List, Optional
+from cache import normalize_query
+
+RERANKER = os.getenv("RERANKER", "none").lower()
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))  # N chunks fetched before re-ranking to k
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "32"))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "20000"))  # (query, chunk) scores
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+class CrossEncoderReranker:
+    """
+    sentence-transformers CrossEncoder on the CPU, loaded once per process.
+    Calls are serialized like the local embedder: one batch already uses every core.
+    """
+    
+    def __init__(self, model: str = RERANK_MODEL, batch_size: int = RERANK_BATCH_SIZE,
+                 cache_size: int = RERANK_CACHE_SIZE):
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError:
+            raise ImportError("❌ RERANKER=local needs sentence-transformers: pip install sentence-transformers")
+        
+        print(f"Loading re-rank model {model}...")
+        self.model = CrossEncoder(model, device="cpu")
+        self.name = f"local/{model}"
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._scores = OrderedDict()  # (normalized query, chunk id) -> score
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "pairs_scored": 0, "cache_hits": 0, "seconds": 0.0}
+        print("✅ Re-ranker ready")
+    
+    def rerank(self, query: str, matches: List[dict], top_k: int) -> List[dict]:
+        """
+        Re-order matches ({"id", "metadata": {"text"}, ...}) by cross-encoder score
+        and keep the best top_k; each kept match gets a "rerank_score".
+        """
+        if not matches:
+            return []
+        
+        key = normalize_query(query)
+        with self._lock:
+            scores = {match["id"]: self._scores.get((key, match["id"])) for match in matches}
+            self._stats["cache_hits"] += sum(score is not None for score in scores.values())
+            for match_id, score in scores.items():
+                if score is not None:
+                    self._scores.move_to_end((key, match_id))
+        
+        missing = [match for match in matches if scores[match["id"]] is None]
+        if missing:
+            started = time.perf_counter()
+            with self._lock:
+                predicted = self.model.predict(
+                    [(query, match["metadata"].get("text", "")) for match in missing],
+                    batch_size=self.batch_size,
+                    show_progress_bar=False
+                )
+                for match, score in zip(missing, predicted):
+                    scores[match["id"]] = float(score)
+                    self._scores[(key, match["id"])] = float(score)
+                while len(self._scores) > self.cache_size:
+                    self._scores.popitem(last=False)
+                self._stats["calls"] += 1
+                self._stats["pairs_scored"] += len(missing)
+                self._stats["seconds"] += time.perf_counter() - started
+        
+        ranked = sorted(matches, key=lambda match: scores[match["id"]], reverse=True)[:top_k]
+        return [{**match, "rerank_score": scores[match["id"]]} for match in ranked]
+    
+    def stats(self) -> dict:
+        with self._lock:
+            pairs = self._stats["pairs_scored"]
+            return {
+                "reranker": self.name,
+                **self._stats,
+                "seconds": round(self._stats["seconds"], 3),
+                "ms_per_pair": round(1000 * self._stats["seconds"] / pairs, 2) if pairs else 0.0,
+                "cached_scores": len(self._scores)
+            }
+
+
+class StageTimings:
+    """Rolling latency per retrieval stage (embed, search, rerank, ...) for tuning N vs k"""
+    
+    def __init__(self, window: int = 200):
+        self._samples = {}  # stage -> deque of recent milliseconds
+        self._totals = {}  # stage -> (count, total ms)
+        self._window = window
+        self._lock = threading.Lock()
+    
+    def record(self, stage: str, seconds: float):
+        ms = 1000 * seconds
+        with self._lock:
+            self._samples.setdefault(stage, deque(maxlen=self._window)).append(ms)
+            count, total = self._totals.get(stage, (0, 0.0))
+            self._totals[stage] = (count + 1, total + ms)
+    
+    def stats(self) -> dict:
+        """count, mean and recent p50/p95 in milliseconds per stage"""
+        with self._lock:
+            result = {}
+            for stage, samples in self._samples.items():
+                count, total = self._totals[stage]
+                ordered = sorted(samples)
+                result[stage] = {
+                    "count": count,
+                    "avg_ms": round(total / count, 2),
+                    "p50_ms": round(ordered[len(ordered) // 2], 2),
+                    "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2)
+                }
+            return result
+
+
+def get_reranker() -> Optional[CrossEncoderReranker]:
+    """The process-wide re-ranker, or None when RERANKER is 'none'"""
+    global _reranker
+    with _reranker_lock:
+        if _reranker is None and RERANKER != "none":
+            if RERANKER == "local":
+                _reranker = CrossEncoderReranker()
+            else:
+                raise ValueError(f"❌ Unknown RERANKER '{RERANKER}' (use 'none' or 'local')")
+        return _reranker
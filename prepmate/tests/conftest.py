@@ -0,0 +1,15 @@
+# The app's modules are flat files in prepmate/, imported by bare name
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Keep the runtime data modules open at import (converter's keyword index,
+# topic maps, card store, manifest) out of the working tree
+_scratch = tempfile.mkdtemp(prefix="prepmate_tests_")
+os.environ.setdefault("BM25_INDEX_PATH", os.path.join(_scratch, "bm25_index"))
+os.environ.setdefault("TOPIC_MAP_PATH", os.path.join(_scratch, "topic_maps"))
+os.environ.setdefault("CARD_STORE_PATH", os.path.join(_scratch, "flashcards.db"))
+os.environ.setdefault("INGEST_MANIFEST_PATH", os.path.join(_scratch, "ingest_manifest.json"))
@@ -0,0 +1,80 @@
+import pytest
+import bm25_index
+from bm25_index import BM25Index, reciprocal_rank_fusion
+
+DOCS = {
+    "a": "mitochondria produce ATP through cellular respiration",
+    "b": "photosynthesis in chloroplasts converts light into chemical energy",
+    "c": "the krebs cycle is part of cellular respiration in mitochondria",
+    "d": "sonnets have fourteen lines in iambic pentameter",
+}
+
+
+def vectors(ids, source="bio.pdf"):
+    return [{"id": i, "metadata": {"text": DOCS[i], "source": source}} for i in ids]
+
+
+def scores(index, query, namespace=""):
+    return {match["id"]: round(match["score"], 5) for match in index.search(query, 10, namespace)}
+
+
+def test_ranks_by_term_matches_and_filters(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.add(vectors(["a", "b", "c"]) + vectors(["d"], source="poems.pdf"))
+    
+    assert [match["id"] for match in index.search("cellular respiration mitochondria", 2)] in (["a", "c"], ["c", "a"])
+    assert index.search("sonnets", 5, filter={"source": {"$eq": "bio.pdf"}}) == []
+    assert index.search("the of in", 5) == []  # stopwords only
+    assert index.search("respiration", 5, namespace="other") == []
+
+
+def test_scores_follow_adds_and_deletes(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.add(vectors(["a", "b"]))
+    index.search("mitochondria respiration", 5)  # caches term weights
+    index.add(vectors(["c", "d"]))
+    index.delete(["b"])
+    
+    fresh = BM25Index(str(tmp_path / "fresh"))
+    fresh.add(vectors(["a", "c", "d"]))
+    for query in ("mitochondria respiration", "light energy", "fourteen lines"):
+        assert scores(index, query) == scores(fresh, query)
+
+
+def test_flush_round_trips_postings_without_retokenizing(tmp_path, monkeypatch):
+    index = BM25Index(str(tmp_path))
+    index.add(vectors(["a", "b", "c", "d"]), namespace="ws")
+    index.delete(["b"], namespace="ws")
+    index.flush()
+    expected = scores(index, "cellular respiration energy lines", "ws")
+    
+    def no_tokenizing(text):
+        raise AssertionError("postings should be loaded, not rebuilt")
+    monkeypatch.setattr(bm25_index, "tokenize", no_tokenizing)
+    reopened = BM25Index(str(tmp_path))
+    reopened.warm()
+    assert reopened.count("ws") == 3
+    monkeypatch.undo()
+    
+    assert scores(reopened, "cellular respiration energy lines", "ws") == expected
+    reopened.add(vectors(["b"]), namespace="ws")  # extends postings loaded from disk
+    assert "b" in scores(reopened, "photosynthesis", "ws")
+
+
+def test_missing_postings_file_falls_back_to_rebuild(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.add(vectors(["a", "d"]))
+    index.flush()
+    (tmp_path / "@default.npz").unlink()
+    
+    assert scores(BM25Index(str(tmp_path)), "sonnets mitochondria") == scores(index, "sonnets mitochondria")
+
+
+def test_reciprocal_rank_fusion():
+    dense = [{"id": "x", "metadata": {}}, {"id": "y", "metadata": {}}]
+    keyword = [{"id": "y", "metadata": {}}, {"id": "z", "metadata": {}}]
+    fused = reciprocal_rank_fusion([dense, keyword], top_k=3, k=60)
+    
+    assert [entry["id"] for entry in fused] == ["y", "x", "z"]
+    assert fused[0]["score"] == pytest.approx(1 / 62 + 1 / 61)
+    assert len(reciprocal_rank_fusion([dense, keyword], top_k=1)) == 1
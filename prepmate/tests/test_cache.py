@@ -0,0 +1,88 @@
+import time
+
+from cache import EmbeddingCache, SemanticAnswerCache, bump_index_generation, get_index_generation
+
+
+def test_embedding_cache_normalizes_queries_and_counts_lookups():
+    cache = EmbeddingCache()
+    cache.put("What is  Entropy?", [1.0, 2.0])
+    
+    assert cache.get("what is entropy?") == [1.0, 2.0]
+    assert cache.get("what is enthalpy?") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_embedding_cache_evicts_least_recently_used():
+    cache = EmbeddingCache(max_size=2)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    cache.get("a")  # "b" is now the oldest
+    cache.put("c", [3.0])
+    
+    assert cache.get("b") is None
+    assert cache.get("a") == [1.0]
+    assert cache.get("c") == [3.0]
+
+
+def test_embedding_cache_expires_entries(monkeypatch):
+    cache = EmbeddingCache(ttl_seconds=10)
+    cache.put("a", [1.0])
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 11)
+    
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_embedding_cache_persists_to_npz(tmp_path):
+    path = str(tmp_path / "embeddings.npz")
+    cache = EmbeddingCache(persist_path=path, persist_interval=3600)
+    cache.put("a", [0.5, 0.25])
+    cache.save()
+    
+    reloaded = EmbeddingCache(persist_path=path, persist_interval=3600)
+    assert reloaded.get("a") == [0.5, 0.25]
+
+
+def test_semantic_cache_matches_similar_queries_of_the_same_mode_and_workspace():
+    cache = SemanticAnswerCache(threshold=0.95)
+    generation = get_index_generation("ws-match")
+    cache.put("qa", [1.0, 0.0], generation, {"answer": "42"}, workspace="ws-match")
+    
+    result, similarity = cache.get("qa", [0.99, 0.05], generation, workspace="ws-match")
+    assert result == {"answer": "42"}
+    assert similarity > 0.95
+    assert cache.get("explain", [1.0, 0.0], generation, workspace="ws-match") is None
+    assert cache.get("qa", [1.0, 0.0], generation, workspace="ws-other") is None
+    assert cache.get("qa", [0.0, 1.0], generation, workspace="ws-match") is None
+
+
+def test_semantic_cache_drops_answers_from_an_older_index_generation():
+    cache = SemanticAnswerCache()
+    cache.put("qa", [1.0, 0.0], get_index_generation("ws-stale"), {"answer": "old"}, workspace="ws-stale")
+    cache.put("qa", [1.0, 0.0], get_index_generation("ws-kept"), {"answer": "kept"}, workspace="ws-kept")
+    
+    generation = bump_index_generation("ws-stale")
+    assert cache.get("qa", [1.0, 0.0], generation, workspace="ws-stale") is None
+    # another workspace's upload leaves this one's answers alone
+    assert cache.get("qa", [1.0, 0.0], get_index_generation("ws-kept"), workspace="ws-kept")[0] == {"answer": "kept"}
+
+
+def test_semantic_cache_ignores_answers_generated_before_an_upload():
+    cache = SemanticAnswerCache()
+    generation = get_index_generation("ws-race")
+    bump_index_generation("ws-race")  # the material changed while the answer was generated
+    cache.put("qa", [1.0, 0.0], generation, {"answer": "outdated"}, workspace="ws-race")
+    
+    assert cache.stats()["size"] == 0
+
+
+def test_embedding_cache_peek_is_not_counted():
+    cache = EmbeddingCache()
+    cache.put("a", [1.0])
+    
+    assert cache.peek("A")
+    assert not cache.peek("b")
+    assert cache.stats()["hits"] == 0
+    assert cache.stats()["misses"] == 0
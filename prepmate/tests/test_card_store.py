@@ -0,0 +1,56 @@
+import pytest
+from card_store import CardStore, DAY, LAPSE_DELAY, SM2_INITIAL_EASE, SM2_MIN_EASE, normalize_topic, sm2_schedule
+
+
+def test_first_reviews_use_fixed_intervals():
+    repetitions, interval, ease, delay = sm2_schedule(4, 0, 0.0, SM2_INITIAL_EASE)
+    assert (repetitions, interval, delay) == (1, 1.0, DAY)
+    assert ease == pytest.approx(SM2_INITIAL_EASE)
+    
+    repetitions, interval, ease, delay = sm2_schedule(4, repetitions, interval, ease)
+    assert (repetitions, interval, delay) == (2, 6.0, 6 * DAY)
+
+
+def test_later_intervals_grow_by_the_ease():
+    repetitions, interval, ease, delay = sm2_schedule(5, 2, 6.0, 2.5)
+    assert repetitions == 3
+    assert ease == pytest.approx(2.6)
+    assert interval == 15.6
+    assert delay == pytest.approx(15.6 * DAY)
+
+
+def test_failed_recall_lapses():
+    repetitions, interval, ease, delay = sm2_schedule(1, 5, 30.0, 2.5)
+    assert (repetitions, interval, delay) == (0, 0.0, LAPSE_DELAY)
+    assert ease < 2.5
+
+
+def test_ease_never_drops_below_minimum():
+    ease = SM2_INITIAL_EASE
+    for _ in range(20):
+        _, _, ease, _ = sm2_schedule(0, 0, 0.0, ease)
+    assert ease == SM2_MIN_EASE
+
+
+def test_normalize_topic():
+    assert normalize_topic("  Cell \n Biology ") == "Cell Biology"
+    assert normalize_topic(None) == ""
+
+
+def test_stored_cards_follow_topic_and_material(tmp_path):
+    store = CardStore(str(tmp_path / "cards.db"))
+    first = store.add_cards("ws", [{"front": "What is ATP?", "back": "Energy"}], "Cells")
+    assert [card["id"] for card in store.cards_for_topic("ws", " cells ", 5)] == [first[0]["id"]]
+    
+    again = store.add_cards("ws", [{"front": "What is ATP?", "back": "Energy"}], "Metabolism")
+    assert again[0]["id"] == first[0]["id"]
+    assert store.cards_for_topic("ws", "Cells", 5) == []
+    assert len(store.cards_for_topic("ws", "Metabolism", 5)) == 1
+    
+    store.bump_material("ws")
+    assert store.cards_for_topic("ws", "Metabolism", 5) == []
+    store.add_cards("ws", [{"front": "What is ATP?", "back": "Energy"}])  # no topic: keeps Metabolism
+    assert len(store.cards_for_topic("ws", "Metabolism", 5)) == 1
+    
+    assert store.delete_workspace("ws") == 1
+    assert store.due_cards("ws") == []
@@ -0,0 +1,74 @@
+import chat_sessions
+from chat_sessions import ChatSession, ChatSessionStore, SESSION_SUMMARY_BATCH, SESSION_WINDOW_MESSAGES
+
+
+def summarize(session, summary="summary"):
+    """Run one claim/fold cycle the way RAGTutor does; returns the folded messages"""
+    folded = session.claim_overflow()
+    if folded:
+        session.fold(summary, folded)
+    return folded
+
+
+def test_full_window_is_summarized_in_batches():
+    session = ChatSession("s", "ws")
+    for turn in range(SESSION_WINDOW_MESSAGES // 2 - 1):
+        session.add_turn(f"question {turn}", f"answer {turn}")
+        assert session.claim_overflow() is None
+    
+    session.add_turn("last question", "last answer")
+    folded = summarize(session)
+    
+    assert len(folded) == SESSION_SUMMARY_BATCH
+    assert folded[0]["content"] == "question 0"
+    summary, history = session.prompt_history()
+    assert summary == "summary"
+    assert len(history) == SESSION_WINDOW_MESSAGES - SESSION_SUMMARY_BATCH
+    assert session.info()["summarized_messages"] == SESSION_SUMMARY_BATCH
+
+
+def test_every_message_is_in_the_prompt_or_the_summary(monkeypatch):
+    # a tight token budget so long answers push several messages out at once
+    monkeypatch.setattr(chat_sessions, "HISTORY_TOKEN_BUDGET", 60)
+    session = ChatSession("s", "ws")
+    summarized = []
+    for turn in range(12):
+        session.add_turn(f"question {turn}", f"answer {turn} " + "word " * (turn % 4) * 10)
+        summarized += summarize(session) or []
+        
+        _, history = session.prompt_history()
+        assert summarized + history == session_messages(turn)
+
+
+def session_messages(last_turn):
+    return [
+        message
+        for turn in range(last_turn + 1)
+        for message in (
+            {"role": "user", "content": f"question {turn}"},
+            {"role": "assistant", "content": f"answer {turn} " + "word " * (turn % 4) * 10}
+        )
+    ]
+
+
+def test_failed_summary_keeps_the_messages():
+    session = ChatSession("s", "ws")
+    for turn in range(SESSION_WINDOW_MESSAGES // 2):
+        session.add_turn(f"question {turn}", f"answer {turn}")
+    
+    folded = session.claim_overflow()
+    assert session.claim_overflow() is None  # one summary at a time
+    session.fold(None, folded)
+    
+    assert session.info()["window_messages"] == SESSION_WINDOW_MESSAGES
+    assert session.summary == ""
+    assert session.claim_overflow() == folded
+
+
+def test_sessions_are_scoped_to_their_workspace():
+    store = ChatSessionStore()
+    session = store.get_or_create(None, "ws-a")
+    
+    assert store.get_or_create(session.session_id, "ws-a") is session
+    assert store.get(session.session_id, "ws-b") is None
+    assert store.get_or_create(session.session_id, "ws-b") is not session
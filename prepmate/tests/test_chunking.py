@@ -0,0 +1,46 @@
+from chunking import iter_batches, iter_chunks
+
+
+def pages(doc_index: int, source: str, texts):
+    return [{"doc_index": doc_index, "source": source, "page": number, "text": text}
+            for number, text in enumerate(texts, start=1)]
+
+
+def sentences(prefix: str, count: int) -> str:
+    return " ".join(f"{prefix} sentence number {i} about a topic." for i in range(count))
+
+
+def test_chunks_respect_size_and_record_their_page():
+    records = pages(0, "a.pdf", [sentences("first", 60), sentences("second", 60)])
+    chunks = list(iter_chunks(records, chunk_size=500, overlap=100, window=1500))
+    
+    assert chunks
+    assert all(len(chunk["text"]) <= 500 for chunk in chunks)
+    assert all(chunk["source"] == "a.pdf" and chunk["doc_index"] == 0 for chunk in chunks)
+    assert chunks[0]["page"] == 1
+    assert chunks[-1]["page"] == 2
+    assert [chunk["page"] for chunk in chunks] == sorted(chunk["page"] for chunk in chunks)
+
+
+def test_streaming_matches_a_single_split():
+    text = sentences("word", 200)
+    windowed = [chunk["text"] for chunk in iter_chunks(pages(0, "a.txt", [text]), 400, 80, window=1200)]
+    whole = [chunk["text"] for chunk in iter_chunks(pages(0, "a.txt", [text]), 400, 80, window=10 ** 9)]
+    assert windowed == whole
+
+
+def test_chunks_never_span_documents():
+    records = pages(0, "a.txt", ["alpha " * 50]) + pages(1, "b.txt", ["beta " * 50])
+    chunks = list(iter_chunks(records, chunk_size=1000, overlap=100))
+    
+    assert [(chunk["source"], chunk["doc_index"]) for chunk in chunks] == [("a.txt", 0), ("b.txt", 1)]
+    assert "beta" not in chunks[0]["text"] and "alpha" not in chunks[1]["text"]
+
+
+def test_blank_input_yields_nothing():
+    assert list(iter_chunks(pages(0, "a.txt", ["", "   "]))) == []
+
+
+def test_iter_batches():
+    assert list(iter_batches(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(iter_batches([], 3)) == []
@@ -0,0 +1,39 @@
+import context_packer
+from chunking import CHUNK_SIZE
+from context_packer import CONTEXT_BUDGETS, MIN_OVERLAP, dedupe_chunks, pack_context
+
+SHARED = "the shared sentence kept by the splitter's chunk overlap. " * 2
+
+
+def test_drops_chunks_contained_in_better_ranked_ones():
+    assert dedupe_chunks(["alpha beta gamma delta", "beta gamma", "epsilon"]) == ["alpha beta gamma delta", "epsilon"]
+
+
+def test_trims_overlap_with_the_preceding_chunk():
+    first = "Intro text of the first chunk. " + SHARED
+    second = SHARED + "Continuation only in the second chunk."
+    assert dedupe_chunks([first, second]) == [first.strip(), "Continuation only in the second chunk."]
+
+
+def test_trims_overlap_with_the_following_chunk():
+    later = SHARED + "Text after the overlap."
+    earlier = "Text before the overlap. " + SHARED
+    assert dedupe_chunks([later, earlier]) == [later.strip(), "Text before the overlap."]
+
+
+def test_short_coincidental_overlap_is_kept():
+    shared = "x" * (MIN_OVERLAP - 1)
+    chunks = ["first " + shared, shared + " second"]
+    assert dedupe_chunks(chunks) == chunks
+
+
+def test_blank_and_duplicate_chunks_are_dropped():
+    assert dedupe_chunks(["  ", "same text", "same text", ""]) == ["same text"]
+
+
+def test_qa_budget_fits_three_full_chunks_without_tiktoken(monkeypatch):
+    monkeypatch.setattr(context_packer, "_encoding", None)  # the ~4 characters/token estimate
+    chunks = [f"{i} " + "x" * (CHUNK_SIZE - 2) for i in range(3)]
+    context, used = pack_context(chunks, CONTEXT_BUDGETS["qa"])
+    assert used == 3
+    assert context.count("\n\n") == 2
@@ -0,0 +1,141 @@
+import pytest
+
+pytest.importorskip("unstructured")  # extraction.py partitions documents with unstructured
+
+import converter
+
+
+class FakeEmbedder:
+    name = "fake"
+    
+    def embed_passages(self, texts):
+        return [[float(len(text)), 1.0, 0.5] for text in texts]
+
+
+class FlakyStore:
+    """Fails the first `failures` upserts of every batch, then acknowledges them"""
+    
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.attempts = {}
+        self.upserted = []
+    
+    def upsert(self, vectors, namespace: str = "") -> int:
+        first_id = vectors[0]["id"]
+        self.attempts[first_id] = self.attempts.get(first_id, 0) + 1
+        if self.attempts[first_id] <= self.failures:
+            raise ConnectionError("upsert timed out")
+        self.upserted.extend(vectors)
+        return len(vectors)
+
+
+class NullKeywordIndex:
+    def add(self, vectors, namespace: str = ""):
+        pass
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    monkeypatch.setattr(converter, "RETRY_BASE_DELAY", 0)
+    monkeypatch.setattr(converter, "EMBED_BATCH_SIZE", 2)
+    monkeypatch.setattr(converter, "keyword_index", NullKeywordIndex())
+
+
+def test_pipelined_upload_retries_failed_upserts(pipeline):
+    store = FlakyStore(failures=converter.MAX_BATCH_RETRIES)
+    chunks = [f"chunk {n}" for n in range(7)]
+    
+    uploaded = converter.upload_chunks_pipelined(store, iter(chunks), "notes.txt", embedder=FakeEmbedder())
+    
+    assert uploaded["chunks"] == 7
+    assert uploaded["vectors_upserted"] == 7
+    assert uploaded["failed_batches"] == []
+    assert sorted(vector["metadata"]["text"] for vector in store.upserted) == sorted(chunks)
+    assert all(attempts == converter.MAX_BATCH_RETRIES + 1 for attempts in store.attempts.values())
+
+
+def test_pipelined_upload_reports_batches_that_exhaust_their_retries(pipeline):
+    store = FlakyStore(failures=converter.MAX_BATCH_RETRIES + 1)
+    
+    uploaded = converter.upload_chunks_pipelined(
+        store, [f"chunk {n}" for n in range(5)], "notes.txt", embedder=FakeEmbedder()
+    )
+    
+    assert uploaded["chunks"] == 5
+    assert uploaded["vectors_upserted"] == 0
+    assert sorted(uploaded["failed_batches"]) == [1, 2, 3]
+
+
+def fake_extract_pages(documents, on_file_done=None):
+    """One page per document, paragraphs split on blank lines like plain text"""
+    for doc_index, (filename, file_bytes) in enumerate(documents):
+        text = file_bytes.decode()
+        yield {"doc_index": doc_index, "source": filename, "page": 1, "text": text}
+        if on_file_done:
+            on_file_done(filename, len(text), 1)
+
+
+class NoTopicMaps:
+    def get(self, workspace: str):
+        return None
+
+
+@pytest.fixture
+def workspace_backend(monkeypatch, tmp_path):
+    """A local store, BM25 index, card store and manifest under tmp_path"""
+    from bm25_index import BM25Index
+    from card_store import CardStore
+    from manifest import IngestManifest
+    from vector_store import LocalVectorStore
+    
+    store = LocalVectorStore(str(tmp_path / "vectors"))
+    manifests = {}
+    monkeypatch.setattr(converter, "_backend", lambda: (store, FakeEmbedder()))
+    monkeypatch.setattr(converter, "extract_pages", fake_extract_pages)
+    monkeypatch.setattr(converter, "keyword_index", BM25Index(str(tmp_path / "bm25")))
+    monkeypatch.setattr(converter, "card_store", CardStore(str(tmp_path / "cards.db")))
+    monkeypatch.setattr(converter, "topic_maps", NoTopicMaps())
+    monkeypatch.setattr(converter, "rebuild_topic_map", lambda workspace: None)
+    monkeypatch.setattr(
+        converter, "get_manifest",
+        lambda workspace: manifests.setdefault(workspace, IngestManifest(str(tmp_path / f"{workspace}.json")))
+    )
+    return store
+
+
+def paragraphs(*texts) -> bytes:
+    return "\n\n".join(texts).encode()
+
+
+def test_reingest_skips_unchanged_files_and_embeds_only_new_chunks(workspace_backend):
+    first = converter.ingest_documents([("notes.txt", paragraphs("alpha " * 150, "beta " * 150))], workspace="ws")
+    assert first["vectors_upserted"] == first["chunks_created"] > 0
+    
+    again = converter.ingest_documents([("notes.txt", paragraphs("alpha " * 150, "beta " * 150))], workspace="ws")
+    assert again["files_unchanged"] == 1
+    assert again["vectors_upserted"] == 0
+    
+    edited = converter.ingest_documents([("notes.txt", paragraphs("alpha " * 150, "gamma " * 150))], workspace="ws")
+    assert edited["chunks_unchanged"] > 0
+    assert 0 < edited["vectors_upserted"] < edited["chunks_created"]
+    assert edited["vectors_deleted"] > 0
+    stored = workspace_backend.query([1.0, 1.0, 1.0], top_k=100, namespace="ws")
+    assert len(stored) == edited["chunks_created"]
+    assert not any("beta" in match["metadata"]["text"] for match in stored)
+
+
+def test_chunks_are_attributed_to_their_file_and_deleted_per_file(workspace_backend):
+    documents = [("a.txt", paragraphs("alpha " * 150)), ("b.txt", paragraphs("alpha " * 150, "beta " * 150))]
+    converter.ingest_documents(documents, workspace="ws")
+    
+    sources = converter.list_sources("ws")
+    assert set(sources) == {"a.txt", "b.txt"}
+    # identical text in two files is two chunks, one per source
+    stored = workspace_backend.query([1.0, 1.0, 1.0], top_k=100, namespace="ws")
+    assert sorted(match["metadata"]["source"] for match in stored) == ["a.txt", "b.txt", "b.txt"]
+    
+    assert converter.delete_source("b.txt", "ws") == 2
+    assert converter.delete_source("b.txt", "ws") is None
+    stored = workspace_backend.query([1.0, 1.0, 1.0], top_k=100, namespace="ws")
+    assert [match["metadata"]["source"] for match in stored] == ["a.txt"]
+    assert set(converter.list_sources("ws")) == {"a.txt"}
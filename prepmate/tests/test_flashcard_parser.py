@@ -0,0 +1,65 @@
+import json
+from flashcard_parser import FlashcardStreamParser, failed_generation, parse_flashcards, parse_legacy_text
+
+
+def test_parses_json_cards():
+    output = json.dumps({"cards": [{"front": "What is ATP?", "back": "Energy currency"},
+                                   {"question": "Q2", "answer": "A2"}]})
+    cards, malformed = parse_flashcards(output)
+    assert [(card.front, card.back) for card in cards] == [("What is ATP?", "Energy currency"), ("Q2", "A2")]
+    assert malformed == 0
+
+
+def test_counts_malformed_entries():
+    output = json.dumps({"cards": [{"front": "F", "back": "B"}, {"front": "no back"}, "junk"]})
+    cards, malformed = parse_flashcards(output)
+    assert len(cards) == 1
+    assert malformed == 2
+
+
+def test_strips_code_fences():
+    cards, _ = parse_flashcards('```json\n[{"front": "F", "back": "B"}]\n```')
+    assert [card.front for card in cards] == ["F"]
+
+
+def test_salvages_cards_from_truncated_json():
+    output = '{"cards": [{"front": "F1", "back": "B1"}, {"front": "F2", "back": "B2"}, {"front": "F3", "ba'
+    cards, malformed = parse_flashcards(output)
+    assert [card.front for card in cards] == ["F1", "F2"]
+    assert malformed == 1
+
+
+def test_falls_back_to_legacy_text():
+    output = "Card 1:\nFront: What is osmosis?\nBack: Diffusion of water\n\nCard 2:\nFront: F2\nBack: B2"
+    cards, malformed = parse_flashcards(output)
+    assert [(card.front, card.back) for card in cards] == [("What is osmosis?", "Diffusion of water"), ("F2", "B2")]
+    assert malformed == 0
+    assert parse_legacy_text("no cards here") == []
+
+
+def test_empty_output():
+    assert parse_flashcards("") == ([], 0)
+    assert parse_flashcards(None) == ([], 0)
+
+
+def test_stream_parser_yields_cards_as_they_complete():
+    parser = FlashcardStreamParser()
+    assert parser.feed('{"cards": [{"front": "F1", "ba') == []
+    assert [card.front for card in parser.feed('ck": "B1"}, {"front": "F2", ')] == ["F1"]
+    assert [card.front for card in parser.feed('"back": "B2"}]}')] == ["F2"]
+    assert parser.finish() == []
+    assert parser.cards == 2
+
+
+def test_stream_parser_finish_recovers_legacy_text():
+    parser = FlashcardStreamParser()
+    assert parser.feed("Card 1:\nFront: F\nBack: B") == []
+    assert [card.front for card in parser.finish()] == ["F"]
+
+
+def test_failed_generation_from_groq_error():
+    class GroqError(Exception):
+        body = {"error": {"code": "json_validate_failed", "failed_generation": '{"cards": []'}}
+    
+    assert failed_generation(GroqError()) == '{"cards": []'
+    assert failed_generation(ValueError("other")) is None
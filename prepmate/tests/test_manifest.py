@@ -0,0 +1,32 @@
+from manifest import IngestManifest, chunk_hash, file_hash, vector_id_for
+
+
+def test_file_is_unchanged_only_for_the_same_name_and_bytes(tmp_path):
+    manifest = IngestManifest(str(tmp_path / "manifest.json"))
+    manifest.record_source("notes.txt", file_hash(b"v1"), {})
+    
+    assert manifest.is_unchanged("notes.txt", file_hash(b"v1"))
+    assert not manifest.is_unchanged("notes.txt", file_hash(b"v2"))
+    assert not manifest.is_unchanged("other.txt", file_hash(b"v1"))
+
+
+def test_chunk_ids_depend_only_on_content():
+    digest = chunk_hash("notes.txt", "Entropy always increases.")
+    
+    assert digest == chunk_hash("notes.txt", "Entropy always increases.")
+    assert digest != chunk_hash("notes.txt", "Entropy never decreases.")
+    assert vector_id_for(digest) == digest[:32]
+
+
+def test_manifest_round_trips_through_json(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    manifest = IngestManifest(path)
+    manifest.record_source("a.txt", "hash-a", {"c1": "v1", "c2": "v2"})
+    manifest.record_source("b.txt", "hash-b", {"c3": "v3"})
+    manifest.remove_source("b.txt")
+    
+    reloaded = IngestManifest(path)
+    assert reloaded.get_source("a.txt")["chunks"] == {"c1": "v1", "c2": "v2"}
+    assert reloaded.get_source("b.txt") is None
+    assert reloaded.sources()["a.txt"]["chunks"] == 2
+    assert reloaded.vector_ids() == ["v1", "v2"]
@@ -0,0 +1,42 @@
+import numpy as np
+import topic_map
+from topic_map import build_topic_map, kmeans, merge_clusters
+
+
+def test_kmeans_recovers_separated_clusters():
+    rng = np.random.default_rng(1)
+    centers = np.eye(4, 16, dtype=np.float32)
+    vectors = np.vstack([center + 0.05 * rng.standard_normal((30, 16)) for center in centers]).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    
+    _, labels = kmeans(vectors, 4)
+    groups = [set(labels[i * 30:(i + 1) * 30]) for i in range(4)]
+    assert all(len(group) == 1 for group in groups)
+    assert len(set.union(*groups)) == 4
+
+
+def test_merge_ignores_keyword_order_and_keeps_the_larger_title():
+    clusters = [np.array([0, 1]), np.array([2, 3, 4]), np.array([5])]
+    keywords = [["poem", "meter", "sonnet"], ["sonnet", "meter", "poem"], ["cell", "atp", "enzyme"]]
+    
+    topics = merge_clusters(clusters, keywords)
+    assert [sorted(rows.tolist()) for rows, _ in topics] == [[0, 1, 2, 3, 4], [5]]
+    assert topics[0][1] == ["sonnet", "meter", "poem"]
+
+
+def test_build_topic_map_lists_each_theme_once(monkeypatch):
+    themes = {"poem meter sonnet": np.eye(8)[0], "cell enzyme atp": np.eye(8)[1]}
+    vectors = [
+        {"id": f"{i}-{j}", "values": (vector + 0.01 * j).tolist(),
+         "metadata": {"text": text, "source": "notes.pdf"}}
+        for i, (text, vector) in enumerate(themes.items()) for j in range(6)
+    ]
+    # force an over-split with permuted keyword order, as k-means + TF-IDF can produce
+    monkeypatch.setattr(topic_map, "choose_k", lambda chunks: 4)
+    monkeypatch.setattr(topic_map, "_keywords", lambda texts_by_topic: [
+        (texts[0].split() * 2)[i % 3:i % 3 + 3] for i, texts in enumerate(texts_by_topic)
+    ])
+    
+    result = build_topic_map(vectors)
+    assert sorted(topic["size"] for topic in result["topics"]) == [6, 6]
+    assert result["chunks"] == 12
@@ -0,0 +1,49 @@
+from vector_store import LocalVectorStore
+
+
+def vector(i: int, dim: int = 4):
+    values = [0.0] * dim
+    values[i] = 1.0
+    return values
+
+
+def test_query_ranks_by_cosine_and_filters(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    store.upsert([
+        {"id": "a", "values": vector(0), "metadata": {"source": "x.pdf"}},
+        {"id": "b", "values": [0.9, 0.1, 0, 0], "metadata": {"source": "y.pdf"}},
+        {"id": "c", "values": vector(2), "metadata": {"source": "x.pdf"}},
+    ], namespace="ws")
+    
+    assert [match["id"] for match in store.query(vector(0), top_k=2, namespace="ws")] == ["a", "b"]
+    filtered = store.query(vector(0), top_k=3, namespace="ws", filter={"source": {"$eq": "y.pdf"}})
+    assert [match["id"] for match in filtered] == ["b"]
+    assert store.query(vector(0), top_k=3, namespace="other") == []
+
+
+def test_upsert_replaces_and_delete_compacts(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    store.upsert([{"id": "a", "values": vector(0)}, {"id": "b", "values": vector(1)}])
+    store.upsert([{"id": "a", "values": vector(3), "metadata": {"v": 2}}])
+    assert store.count() == 2
+    assert store.query(vector(3), top_k=1)[0] == {"id": "a", "score": 1.0, "metadata": {"v": 2}}
+    
+    store.delete(["a", "missing"])
+    assert store.count() == 1
+    assert store.fetch(["a", "b"]) == ["b"]
+
+
+def test_flush_persists_namespaces_separately(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    store.upsert([{"id": "a", "values": vector(0), "metadata": {"text": "t"}}], namespace="ws1")
+    store.upsert([{"id": "b", "values": vector(1)}], namespace="")
+    store.flush()
+    
+    reopened = LocalVectorStore(str(tmp_path))
+    assert reopened.total_count() == 2
+    assert reopened.fetch_vectors(["a"], namespace="ws1") == [{"id": "a", "values": vector(0), "metadata": {"text": "t"}}]
+    
+    reopened.upsert([{"id": "c", "values": vector(2)}], namespace="ws1")  # writes to a loaded memmap
+    reopened.delete_namespace("")
+    assert reopened.count("ws1") == 2
+    assert LocalVectorStore(str(tmp_path)).count("") == 0
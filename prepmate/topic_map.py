@@ -0,0 +1,226 @@
+# topic_map.py - Topic map of each workspace, built at ingestion time
+#
+# After an upload the workspace's chunk embeddings are clustered with spherical
+# k-means (NumPy, on the CPU) into topics. Each topic keeps a keyword title and
+# the chunks closest to its centroid, so teaching and flashcards can target a
+# topic id and reuse that precomputed context instead of retrieving for a
+# free-text topic. Maps are stored as one JSON file per workspace.
+#
+# Layout (JSON):
+#   {"version": 1, "built_at": unix time, "chunks": chunks clustered,
+#    "topics": [{"id", "title", "keywords", "size", "sources": {file: chunks},
+#                "chunks": [{"id", "text", "source", "page"}, ...]}, ...]}
+import os
+import json
+import math
+import time
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import List, Optional
+import numpy as np
+from bm25_index import tokenize
+from vector_store import _file_stem
+
+TOPIC_MAP = os.getenv("TOPIC_MAP", "true").lower() in ("1", "true", "yes")
+TOPIC_MAP_PATH = os.getenv("TOPIC_MAP_PATH", str(Path(__file__).parent / "topic_maps"))
+TOPIC_MAP_MAX_TOPICS = int(os.getenv("TOPIC_MAP_MAX_TOPICS", "12"))
+TOPIC_MAP_MAX_CHUNKS = int(os.getenv("TOPIC_MAP_MAX_CHUNKS", "5000"))  # chunks sampled for clustering
+TOPIC_CHUNKS = 8  # representative chunks kept per topic (its precomputed context)
+TOPIC_TITLE_TERMS = 3
+KMEANS_ITERATIONS = 50
+TOPIC_MAP_VERSION = 1
+
+_maps = None
+_maps_lock = threading.Lock()
+
+
+def choose_k(chunks: int) -> int:
+    """About one topic per few dozen chunks, capped at TOPIC_MAP_MAX_TOPICS"""
+    return max(1, min(TOPIC_MAP_MAX_TOPICS, chunks, round(math.sqrt(chunks / 4))))
+
+
+def sample_ids(ids: List[str], limit: int = TOPIC_MAP_MAX_CHUNKS) -> List[str]:
+    """An evenly spread, deterministic subset of at most `limit` ids"""
+    ids = sorted(ids)  # content-hash ids, so sorted order is effectively shuffled
+    if len(ids) <= limit:
+        return ids
+    step = len(ids) / limit
+    return [ids[int(i * step)] for i in range(limit)]
+
+
+def kmeans(vectors: np.ndarray, k: int, iterations: int = KMEANS_ITERATIONS, seed: int = 0):
+    """
+    Spherical k-means on unit vectors (cosine similarity), k-means++ seeding.
+    Returns (unit centroids [k, dim], label per row).
+    """
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    centroids = np.empty((k, vectors.shape[1]), dtype=np.float32)
+    centroids[0] = vectors[rng.integers(n)]
+    distance = 1.0 - vectors @ centroids[0]
+    for i in range(1, k):
+        weights = np.maximum(distance, 0.0)
+        total = float(weights.sum())
+        centroids[i] = vectors[rng.choice(n, p=weights / total) if total > 0 else rng.integers(n)]
+        distance = np.minimum(distance, 1.0 - vectors @ centroids[i])
+    
+    labels = None
+    for _ in range(iterations):
+        similarity = vectors @ centroids.T
+        new_labels = similarity.argmax(axis=1)
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        
+        members = (labels[:, None] == np.arange(k)).astype(np.float32)
+        sums = members.T @ vectors
+        empty = np.flatnonzero(members.sum(axis=0) == 0)
+        if len(empty):
+            # re-seed empty clusters with the rows that fit their own cluster worst
+            worst = np.argsort(similarity[np.arange(n), labels])[:len(empty)]
+            sums[empty] = vectors[worst]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+    return centroids, labels
+
+
+def _keywords(texts_by_topic: List[List[str]], limit: int = TOPIC_TITLE_TERMS) -> List[List[str]]:
+    """Most distinctive terms per topic by class-based TF-IDF"""
+    counts = [Counter(token for text in texts for token in tokenize(text)
+                      if len(token) > 2 and not token.isdigit())
+              for texts in texts_by_topic]
+    overall = Counter()
+    for count in counts:
+        overall.update(count)
+    average = sum(overall.values()) / max(1, len(counts))
+    
+    keywords = []
+    for count in counts:
+        total = sum(count.values()) or 1
+        scored = sorted(
+            count,
+            key=lambda term: count[term] / total * math.log(1 + average / overall[term]),
+            reverse=True
+        )
+        keywords.append(scored[:limit])
+    return keywords
+
+
+def merge_clusters(clusters: List[np.ndarray], keywords: List[List[str]]) -> list:
+    """
+    k is a guess: clusters a student couldn't tell apart (the same title terms, in
+    any order) become one topic, titled by its largest cluster. Returns
+    (rows, terms) pairs, largest topic first.
+    """
+    merged = {}
+    for rows, terms in sorted(zip(clusters, keywords), key=lambda cluster: len(cluster[0]), reverse=True):
+        key = frozenset(terms)
+        if key in merged:
+            merged[key] = (np.concatenate([merged[key][0], rows]), merged[key][1])
+        else:
+            merged[key] = (rows, list(terms))
+    return sorted(merged.values(), key=lambda topic: len(topic[0]), reverse=True)
+
+
+def build_topic_map(vectors: List[dict]) -> dict:
+    """Cluster stored chunk vectors ({"id", "values", "metadata"}) into a topic map"""
+    vectors = [vector for vector in vectors if vector.get("values")]
+    topic_map = {"version": TOPIC_MAP_VERSION, "built_at": time.time(), "chunks": len(vectors), "topics": []}
+    if not vectors:
+        return topic_map
+    
+    matrix = np.asarray([vector["values"] for vector in vectors], dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    centroids, labels = kmeans(matrix, choose_k(len(vectors)))
+    
+    clusters = [np.flatnonzero(labels == topic) for topic in range(len(centroids))]
+    clusters = [rows for rows in clusters if len(rows)]
+    keywords = _keywords([[vectors[row]["metadata"].get("text", "") for row in rows] for rows in clusters])
+    
+    for number, (rows, terms) in enumerate(merge_clusters(clusters, keywords), start=1):
+        centroid = matrix[rows].mean(axis=0)
+        closest = rows[np.argsort(-(matrix[rows] @ centroid))[:TOPIC_CHUNKS]]
+        topic_map["topics"].append({
+            "id": f"t{number}",
+            "title": " · ".join(term.capitalize() for term in terms) or f"Topic {number}",
+            "keywords": terms,
+            "size": len(rows),
+            "sources": dict(Counter(vectors[row]["metadata"].get("source", "unknown") for row in rows)),
+            "chunks": [
+                {
+                    "id": vectors[row]["id"],
+                    "text": vectors[row]["metadata"].get("text", ""),
+                    "source": vectors[row]["metadata"].get("source"),
+                    "page": vectors[row]["metadata"].get("page")
+                }
+                for row in closest
+            ]
+        })
+    return topic_map
+
+
+def topic_summary(topic: dict) -> dict:
+    """A topic without its chunk texts, for listings"""
+    return {key: value for key, value in topic.items() if key != "chunks"}
+
+
+class TopicMapStore:
+    """Per-workspace topic maps, cached in memory and persisted as JSON"""
+    
+    def __init__(self, path: str = TOPIC_MAP_PATH):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._maps = {}
+        self._lock = threading.Lock()
+    
+    def get(self, workspace: str = "") -> Optional[dict]:
+        with self._lock:
+            if workspace not in self._maps:
+                self._maps[workspace] = self._load(workspace)
+            return self._maps[workspace]
+    
+    def get_topic(self, workspace: str, topic_id: str) -> Optional[dict]:
+        topic_map = self.get(workspace)
+        return next((t for t in topic_map["topics"] if t["id"] == topic_id), None) if topic_map else None
+    
+    def save(self, workspace: str, topic_map: dict):
+        file = self._file(workspace)
+        with self._lock:
+            self._maps[workspace] = topic_map
+            try:
+                with open(f"{file}.tmp", "w", encoding="utf-8") as f:
+                    json.dump(topic_map, f)
+                os.replace(f"{file}.tmp", file)
+            except Exception as e:
+                print(f"⚠️ Could not persist topic map for '{workspace or 'default'}': {e}")
+    
+    def delete(self, workspace: str = ""):
+        with self._lock:
+            self._maps[workspace] = None
+            file = self._file(workspace)
+            if file.exists():
+                file.unlink()
+    
+    def _file(self, workspace: str) -> Path:
+        return self.path / f"{_file_stem(workspace)}.json"
+    
+    def _load(self, workspace: str) -> Optional[dict]:
+        file = self._file(workspace)
+        if not file.exists():
+            return None
+        try:
+            with open(file, encoding="utf-8") as f:
+                topic_map = json.load(f)
+            return topic_map if topic_map.get("version") == TOPIC_MAP_VERSION else None
+        except Exception as e:
+            print(f"⚠️ Could not load topic map for '{workspace or 'default'}': {e}")
+            return None
+
+
+def get_topic_maps() -> TopicMapStore:
+    """The process-wide topic map store, shared by ingestion and the RAG engine"""
+    global _maps
+    with _maps_lock:
+        if _maps is None:
+            _maps = TopicMapStore(TOPIC_MAP_PATH)
+        return _maps
@@ -1,24 +1,109 @@
 
-from fastapi import APIRouter, UploadFile, File
+from fastapi import APIRouter, UploadFile, File, Depends
+from starlette.concurrency import run_in_threadpool
 from typing import List
 import logging
-from converter import process_uploaded_files
+from converter import ingest_documents, read_upload_files, list_sources, delete_source
+from jobs import create_job, get_job, submit_job, update_job
+from prewarm import schedule_prewarm
+from workspaces import get_workspace
 
 router = APIRouter(prefix="/upload", tags=["Upload"])
 
+
+def _run_ingestion(job_id: str, documents, workspace: str, clear_existing: bool = False):
+    """Worker-pool entry point: run the pipeline, streaming progress into the job record"""
+    result = ingest_documents(
+        documents,
+        clear_existing=clear_existing,
+        on_progress=lambda **fields: update_job(job_id, **fields),
+        workspace=workspace
+    )
+    if result.get("error"):
+        raise Exception(result["message"])
+    if result.get("vectors_upserted") or result.get("vectors_deleted"):
+        # Explanations + starter decks for the new topics, so the first request hits the cache
+        result["prewarm_job_id"] = schedule_prewarm(workspace)
+    update_job(job_id, stage="done")
+    logging.info(f"Processing complete. Chunks created: {result.get('chunks_created')}")
+    return result
+
 @router.post("/multiple")
-async def upload_multiple(files: List[UploadFile] = File(...)):
+async def upload_multiple(files: List[UploadFile] = File(...), clear_existing: bool = False,
+                          workspace: str = Depends(get_workspace)):
     """
-    Accept multiple uploaded files and return the vector format output, with logging for testing.
+    Accept multiple uploaded files and start ingesting them into the caller's
+    workspace (X-Workspace-Id header) in the background.
+    Ingestion is incremental: unchanged files and chunks are skipped, and re-uploaded
+    files replace their previous version. Pass ?clear_existing=true to wipe the workspace first.
+    Returns a job id immediately; poll /upload/jobs/{job_id} for progress.
     """
     logging.info(f"Received {len(files)} file(s) for processing.")
     for file in files:
         logging.info(f"Processing file: {file.filename}")
     try:
-        result = await process_uploaded_files(files)
-        logging.info(f"Processing complete. Chunks created: {result.get('chunks_created')}")
-        logging.info(f"Vectorstore saved at: {result.get('vectorstore_path')}")
-        return result
+        documents = await read_upload_files(files)
+        job_id = create_job(
+            "ingestion",
+            stage="queued",
+            files=[filename for filename, _ in documents],
+            workspace=workspace
+        )
+        submit_job(job_id, _run_ingestion, job_id, documents, workspace, clear_existing)
+        logging.info(f"Ingestion job {job_id} queued")
+        return {"job_id": job_id, "status": "pending"}
     except Exception as e:
         logging.error(f"Error during file processing: {e}")
         return {"error": str(e)}
+
+
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: str, workspace: str = Depends(get_workspace)):
+    """
+    Report the status of a background job (ingestion progress or post-upload verification).
+    Only jobs of the caller's workspace are visible; others report as not found.
+    """
+    job = get_job(job_id)
+    if job is None or job.get("workspace") != workspace:
+        return {"success": False, "error": f"Job {job_id} not found"}
+    return {"success": True, "job": job}
+
+
+@router.get("/files")
+async def uploaded_files(workspace: str = Depends(get_workspace)):
+    """
+    List the files currently in the workspace's knowledge base.
+    """
+    return {"success": True, "files": list_sources(workspace)}
+
+
+@router.delete("/files/{filename}")
+async def delete_file(filename: str, workspace: str = Depends(get_workspace)):
+    """
+    Remove a single file's chunks from the workspace; other files are untouched.
+    """
+    try:
+        deleted = await run_in_threadpool(delete_source, filename, workspace)
+        if deleted is None:
+            return {"success": False, "error": f"File {filename} not found"}
+        return {"success": True, "filename": filename, "vectors_deleted": deleted}
+    except Exception as e:
+        logging.error(f"Error deleting {filename}: {e}")
+        return {"success": False, "error": str(e)}
+
+
+@router.put("/files/{filename}")
+async def replace_file(filename: str, file: UploadFile = File(...), workspace: str = Depends(get_workspace)):
+    """
+    Replace a file with a new version in the background. Only the chunks that
+    changed are embedded; chunks no longer in the file are deleted.
+    """
+    try:
+        documents = [(filename, await file.read())]
+        job_id = create_job("ingestion", stage="queued", files=[filename], workspace=workspace)
+        submit_job(job_id, _run_ingestion, job_id, documents, workspace)
+        logging.info(f"Replacement job {job_id} queued for {filename}")
+        return {"job_id": job_id, "status": "pending"}
+    except Exception as e:
+        logging.error(f"Error replacing {filename}: {e}")
+        return {"error": str(e)}
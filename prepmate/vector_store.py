@@ -0,0 +1,348 @@
+# vector_store.py - Pluggable vector storage: Pinecone (default) or a local NumPy store
+#
+# Select with VECTOR_STORE=pinecone|local. The local backend keeps one float32
+# matrix per namespace, persisted as .npy files that are memory-mapped on load,
+# and answers queries with a brute-force cosine search - no network round trip.
+import os
+import json
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+
+VECTOR_STORE = os.getenv("VECTOR_STORE", "pinecone").lower()
+INDEX_NAME = "crammer"
+LOCAL_VECTOR_STORE_PATH = os.getenv(
+    "LOCAL_VECTOR_STORE_PATH",
+    str(Path(__file__).parent / "vector_store")
+)
+FETCH_BATCH_SIZE = 100  # ids per Pinecone fetch (they travel in the URL)
+
+_store = None
+_store_lock = threading.Lock()
+
+
+class VectorStore:
+    """
+    Interface shared by the backends. Vectors are {"id", "values", "metadata"}
+    dicts; query results are {"id", "score", "metadata"} dicts, best first.
+    """
+    
+    def upsert(self, vectors: List[dict], namespace: str = "") -> int:
+        """Insert or overwrite vectors; returns how many were written"""
+        raise NotImplementedError
+    
+    def query(self, vector: List[float], top_k: int, namespace: str = "",
+              filter: Optional[dict] = None) -> List[dict]:
+        raise NotImplementedError
+    
+    def fetch(self, ids: List[str], namespace: str = "") -> List[str]:
+        """Return the subset of `ids` that is currently readable"""
+        raise NotImplementedError
+    
+    def fetch_vectors(self, ids: List[str], namespace: str = "") -> List[dict]:
+        """The stored {"id", "values", "metadata"} of those `ids` that exist"""
+        raise NotImplementedError
+    
+    def delete(self, ids: List[str], namespace: str = ""):
+        raise NotImplementedError
+    
+    def delete_namespace(self, namespace: str = ""):
+        raise NotImplementedError
+    
+    def count(self, namespace: str = "") -> int:
+        raise NotImplementedError
+    
+    def total_count(self) -> int:
+        raise NotImplementedError
+    
+    def flush(self):
+        """Persist pending writes (no-op for remote backends)"""
+
+
+class PineconeVectorStore(VectorStore):
+    """Thin adapter over a Pinecone index"""
+    
+    def __init__(self, index):
+        self.index = index
+    
+    def upsert(self, vectors: List[dict], namespace: str = "") -> int:
+        response = self.index.upsert(vectors=vectors, namespace=namespace, show_progress=False)
+        return response.upserted_count
+    
+    def query(self, vector: List[float], top_k: int, namespace: str = "",
+              filter: Optional[dict] = None) -> List[dict]:
+        results = self.index.query(
+            vector=vector,
+            top_k=top_k,
+            include_metadata=True,
+            namespace=namespace,
+            filter=filter
+        )
+        return [
+            {"id": match.id, "score": match.score, "metadata": match.metadata or {}}
+            for match in results.matches
+        ]
+    
+    def fetch(self, ids: List[str], namespace: str = "") -> List[str]:
+        return list(self.index.fetch(ids=ids, namespace=namespace).vectors)
+    
+    def fetch_vectors(self, ids: List[str], namespace: str = "") -> List[dict]:
+        vectors = []
+        for start in range(0, len(ids), FETCH_BATCH_SIZE):
+            fetched = self.index.fetch(ids=ids[start:start + FETCH_BATCH_SIZE], namespace=namespace).vectors
+            vectors.extend(
+                {"id": vector.id, "values": list(vector.values), "metadata": vector.metadata or {}}
+                for vector in fetched.values()
+            )
+        return vectors
+    
+    def delete(self, ids: List[str], namespace: str = ""):
+        self.index.delete(ids=ids, namespace=namespace)
+    
+    def delete_namespace(self, namespace: str = ""):
+        from pinecone.exceptions import NotFoundException
+        try:
+            self.index.delete(delete_all=True, namespace=namespace)
+        except NotFoundException:
+            pass  # the namespace doesn't exist (anymore): nothing to delete
+    
+    def count(self, namespace: str = "") -> int:
+        summary = self.index.describe_index_stats().get('namespaces', {}).get(namespace)
+        return summary.get('vector_count', 0) if summary else 0
+    
+    def total_count(self) -> int:
+        return self.index.describe_index_stats().get('total_vector_count', 0)
+
+
+class _Namespace:
+    """Rows of one local namespace: unit vectors + parallel id/metadata lists"""
+    
+    def __init__(self, vectors: Optional[np.ndarray] = None, ids: list = None, metadata: list = None):
+        self.vectors = vectors  # may be a read-only memmap until the first write
+        self.size = len(ids) if ids else 0
+        self.ids = ids or []
+        self.metadata = metadata or []
+        self.rows = {vector_id: row for row, vector_id in enumerate(self.ids)}
+        self.dirty = False
+    
+    def writable(self, extra_rows: int, dim: int):
+        """Make sure the matrix is an in-memory array with room for `extra_rows` more rows"""
+        needed = self.size + extra_rows
+        if self.vectors is None or self.size == 0:
+            self.vectors = np.empty((max(needed, 64), dim), dtype=np.float32)
+        elif isinstance(self.vectors, np.memmap) or needed > len(self.vectors):
+            # grow geometrically so a long ingestion doesn't copy the matrix per batch
+            grown = np.empty((max(needed, 2 * len(self.vectors), 64), self.vectors.shape[1]), dtype=np.float32)
+            grown[:self.size] = self.vectors[:self.size]
+            self.vectors = grown
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process vector store for small deployments and tests. Each namespace is a
+    float32 matrix of unit vectors searched by a single matrix-vector product.
+    Writes are kept in memory until flush(), which atomically rewrites
+    `{namespace}.npy` + `{namespace}.json` under `path`.
+    """
+    
+    def __init__(self, path: str = LOCAL_VECTOR_STORE_PATH):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._namespaces: Dict[str, _Namespace] = {}
+        self._lock = threading.RLock()
+    
+    def upsert(self, vectors: List[dict], namespace: str = "") -> int:
+        if not vectors:
+            return 0
+        
+        values = np.asarray([vector["values"] for vector in vectors], dtype=np.float32)
+        norms = np.linalg.norm(values, axis=1, keepdims=True)
+        values = values / np.where(norms > 0, norms, 1)
+        
+        with self._lock:
+            ns = self._get(namespace)
+            ns.writable(len(vectors), values.shape[1])
+            for vector, row_values in zip(vectors, values):
+                row = ns.rows.get(vector["id"])
+                if row is None:
+                    row = ns.size
+                    ns.size += 1
+                    ns.rows[vector["id"]] = row
+                    ns.ids.append(vector["id"])
+                    ns.metadata.append(vector.get("metadata") or {})
+                else:
+                    ns.metadata[row] = vector.get("metadata") or {}
+                ns.vectors[row] = row_values
+            ns.dirty = True
+        return len(vectors)
+    
+    def query(self, vector: List[float], top_k: int, namespace: str = "",
+              filter: Optional[dict] = None) -> List[dict]:
+        with self._lock:
+            ns = self._get(namespace)
+            if ns.size == 0:
+                return []
+            # snapshot: deletes build new arrays, so these stay consistent after unlocking
+            matrix, ids, metadata, size = ns.vectors, ns.ids, ns.metadata, ns.size
+        
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        scores = matrix[:size] @ (query / norm if norm > 0 else query)
+        
+        if filter:
+            allowed = np.fromiter((_matches(metadata[row], filter) for row in range(size)), bool, size)
+            scores = np.where(allowed, scores, -np.inf)
+        
+        top_k = min(top_k, size)
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [
+            {"id": ids[row], "score": float(scores[row]), "metadata": metadata[row]}
+            for row in best if scores[row] != -np.inf
+        ]
+    
+    def fetch(self, ids: List[str], namespace: str = "") -> List[str]:
+        with self._lock:
+            rows = self._get(namespace).rows
+            return [vector_id for vector_id in ids if vector_id in rows]
+    
+    def fetch_vectors(self, ids: List[str], namespace: str = "") -> List[dict]:
+        with self._lock:
+            ns = self._get(namespace)
+            rows = [ns.rows[vector_id] for vector_id in ids if vector_id in ns.rows]
+            return [
+                {"id": ns.ids[row], "values": ns.vectors[row].tolist(), "metadata": ns.metadata[row]}
+                for row in rows
+            ]
+    
+    def delete(self, ids: Iterable[str], namespace: str = ""):
+        with self._lock:
+            ns = self._get(namespace)
+            drop = {ns.rows[vector_id] for vector_id in ids if vector_id in ns.rows}
+            if not drop:
+                return
+            
+            keep = [row for row in range(ns.size) if row not in drop]
+            compacted = _Namespace(
+                np.array(ns.vectors[keep], dtype=np.float32),
+                [ns.ids[row] for row in keep],
+                [ns.metadata[row] for row in keep]
+            )
+            compacted.dirty = True
+            self._namespaces[namespace] = compacted
+    
+    def delete_namespace(self, namespace: str = ""):
+        with self._lock:
+            self._namespaces[namespace] = _Namespace()
+            for path in self._files(namespace):
+                if path.exists():
+                    path.unlink()
+    
+    def count(self, namespace: str = "") -> int:
+        with self._lock:
+            return self._get(namespace).size
+    
+    def total_count(self) -> int:
+        with self._lock:
+            names = set(self._namespaces) | {
+                _namespace_for(path.stem) for path in self.path.glob("*.json")
+            }
+            return sum(self._get(name).size for name in names)
+    
+    def flush(self):
+        with self._lock:
+            for namespace, ns in self._namespaces.items():
+                if ns.dirty:
+                    self._save(namespace, ns)
+                    ns.dirty = False
+    
+    def _get(self, namespace: str) -> _Namespace:
+        """Namespace rows, loaded (memory-mapped) from disk on first use; caller holds the lock"""
+        ns = self._namespaces.get(namespace)
+        if ns is None:
+            ns = self._load(namespace)
+            self._namespaces[namespace] = ns
+        return ns
+    
+    def _files(self, namespace: str):
+        stem = _file_stem(namespace)
+        return self.path / f"{stem}.npy", self.path / f"{stem}.json"
+    
+    def _load(self, namespace: str) -> _Namespace:
+        vectors_path, meta_path = self._files(namespace)
+        if not (vectors_path.exists() and meta_path.exists()):
+            return _Namespace()
+        
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            vectors = np.load(vectors_path, mmap_mode="r")
+            print(f"✅ Loaded {len(meta['ids'])} local vectors for namespace '{namespace or 'default'}'")
+            return _Namespace(vectors, meta["ids"], meta["metadata"])
+        except Exception as e:
+            print(f"⚠️ Could not load local vectors for '{namespace or 'default'}': {e}")
+            return _Namespace()
+    
+    def _save(self, namespace: str, ns: _Namespace):
+        vectors_path, meta_path = self._files(namespace)
+        try:
+            # the .npy may be memory-mapped by this namespace, so write to temp files first
+            with open(f"{vectors_path}.tmp", "wb") as f:
+                np.save(f, np.ascontiguousarray(ns.vectors[:ns.size]) if ns.size else np.empty((0, 0), np.float32))
+            with open(f"{meta_path}.tmp", "w", encoding="utf-8") as f:
+                json.dump({"ids": ns.ids[:ns.size], "metadata": ns.metadata[:ns.size]}, f)
+            os.replace(f"{vectors_path}.tmp", vectors_path)
+            os.replace(f"{meta_path}.tmp", meta_path)
+        except Exception as e:
+            print(f"⚠️ Could not persist local vectors for '{namespace or 'default'}': {e}")
+
+
+def _file_stem(namespace: str) -> str:
+    # workspace ids are [A-Za-z0-9_-], so "@default" can't collide with one
+    return namespace or "@default"
+
+
+def _namespace_for(stem: str) -> str:
+    return "" if stem == "@default" else stem
+
+
+def _matches(metadata: dict, filter: dict) -> bool:
+    """Evaluate the subset of Pinecone's metadata filter language used here ($eq/$ne/$in/$nin/$and)"""
+    for field, condition in filter.items():
+        if field == "$and":
+            if not all(_matches(metadata, sub) for sub in condition):
+                return False
+            continue
+        
+        value = metadata.get(field)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, operand in condition.items():
+            if op == "$eq" and value != operand:
+                return False
+            if op == "$ne" and value == operand:
+                return False
+            if op == "$in" and value not in operand:
+                return False
+            if op == "$nin" and value in operand:
+                return False
+    return True
+
+
+def get_vector_store(pc=None) -> VectorStore:
+    """
+    The process-wide vector store selected by VECTOR_STORE. Shared so ingestion and
+    retrieval see the same local data; `pc` is the Pinecone client for that backend.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            if VECTOR_STORE == "local":
+                print(f"✅ Using local vector store at {LOCAL_VECTOR_STORE_PATH}")
+                _store = LocalVectorStore(LOCAL_VECTOR_STORE_PATH)
+            elif VECTOR_STORE == "pinecone":
+                _store = PineconeVectorStore(pc.Index(INDEX_NAME))
+            else:
+                raise ValueError(f"❌ Unknown VECTOR_STORE '{VECTOR_STORE}' (use 'pinecone' or 'local')")
+        return _store
@@ -0,0 +1,26 @@
+# workspaces.py - Per-user workspaces, each stored in its own Pinecone namespace
+import re
+from typing import Optional
+from fastapi import Header, HTTPException
+
+WORKSPACE_HEADER = "X-Workspace-Id"
+DEFAULT_WORKSPACE = ""  # Pinecone's default namespace (material uploaded before workspaces)
+
+_WORKSPACE_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def normalize_workspace(workspace_id: Optional[str]) -> str:
+    """Validate a workspace id; it doubles as the namespace and the manifest file name"""
+    if not workspace_id:
+        return DEFAULT_WORKSPACE
+    if not _WORKSPACE_PATTERN.match(workspace_id):
+        raise ValueError("Workspace id must be 1-64 letters, digits, '-' or '_'")
+    return workspace_id
+
+
+def get_workspace(x_workspace_id: Optional[str] = Header(None)) -> str:
+    """FastAPI dependency: the caller's workspace from the X-Workspace-Id header"""
+    try:
+        return normalize_workspace(x_workspace_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))